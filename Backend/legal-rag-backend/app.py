@@ -12,7 +12,6 @@ from google.cloud import documentai
 from vertexai.generative_models import GenerativeModel
 import vertexai
 import config
-from pinecone import Pinecone, ServerlessSpec
 from fastapi.responses import StreamingResponse
 from fastapi.responses import PlainTextResponse
 import io
@@ -24,6 +23,10 @@ import traceback
 from pydantic import BaseModel
 from typing import List
 import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+import time
 import tempfile
 import shutil
 # Import the function that wraps rag.upload_file
@@ -31,13 +34,28 @@ from rag.prepare_corpus_and_data import upload_pdf_to_corpus
 
 # --- Utils ---
 #from utils.text_processing import split_into_clauses
-from utils.embeddings import embed_texts_batch
-from utils.retrieval import retrieve_top_k_pinecone
+from utils.embedding_cache import embedding_cache
+from utils.embedding_batcher import embedding_batcher
+from utils.retrieval import (retrieve_top_k_pinecone, fan_out_retrieval, reciprocal_rank_fusion,
+                             RetrievalHit, RetrievalTarget)
+from utils.lexical_index import lexical_indexes, exact_references, chunks_fingerprint
+from utils.answer_cache import answer_cache
+from utils.hedging import HedgedCall
+from utils import clients
+from utils.local_doc_index import LocalDocIndexStore
+from utils.rulebook_mirror import RulebookMirror
+from utils.static_queries import static_queries
+from utils.term_explanations import normalize_term, term_explanations
 from utils.pdf_extraction import extract_text_from_pdf
 from utils.firestore_utils import save_processed_data, get_processed_data
 from utils.chunker import chunk_text
+from utils.tokens import pack_chunks
 from utils.pdf_generator.pdf_gen import create_pdf_from_json
 from utils.masking_pdf import mask_pdf
+from utils.upload_stream import spool_upload
+from utils.ingest_cache import ingest_cache, sha256_file
+from utils.ingest_pipeline import IngestPipeline, STAGES
+from utils.ingest_jobs import IngestWorkerPool, QueueFullError, make_job_queue
 #from utils.vertex_rag import upload_to_vertex_rag
 
 import os, tempfile, shutil, uuid, traceback
@@ -77,9 +95,7 @@ load_dotenv()
 #     raise ValueError("GOOGLE_APPLICATION_CREDENTIALS environment variable not set.")
 
 vertexai.init(project=config.PROJECT_ID, location=config.VERTEX_AI_LOCATION)
-gemini = GenerativeModel("gemini-2.5-flash")
-
-documentai_client = documentai.DocumentProcessorServiceClient()
+documentai_client = clients.documentai_client()
 processor_name = documentai_client.processor_path(
     config.PROJECT_ID, config.DOCUMENT_AI_LOCATION, config.PROCESSOR_ID
 )
@@ -93,33 +109,30 @@ if USE_PINECONE and not PINECONE_API_KEY:
     # If user asked to use Pinecone but didn't set API key, fail early
     raise ValueError("PINECONE_API_KEY environment variable not set but USE_PINECONE is enabled.")
 
-pc = Pinecone(api_key=PINECONE_API_KEY) if USE_PINECONE else None
-
-# Document index (user uploaded docs) - create if enabled
-if USE_PINECONE:
-    if config.RAG_INDEX_NAME not in pc.list_indexes().names():
-        pc.create_index(
-            name=config.RAG_INDEX_NAME,
-            dimension=768,
-            metric='cosine',
-            spec=ServerlessSpec(cloud='aws', region='us-east-1')
-        )
-    rag_index = pc.Index(config.RAG_INDEX_NAME)
-else:
-    rag_index = None
+# Document index (user uploaded docs) - created if missing
+rag_index = clients.pinecone_index(config.RAG_INDEX_NAME, dimension=768) if USE_PINECONE else None
 
 # Rulebook index (kept for retrieval tasks)
-if USE_PINECONE:
-    if "legal-doc-index" not in pc.list_indexes().names():
-        pc.create_index(
-            name="legal-doc-index",
-            dimension=1536,
-            metric='cosine',
-            spec=ServerlessSpec(cloud='aws', region='us-east-1')
-        )
-    rulebook_index = pc.Index("legal-doc-index")
-else:
-    rulebook_index = None
+rulebook_index = clients.pinecone_index(config.RULEBOOK_INDEX_NAME, dimension=1536) if USE_PINECONE else None
+
+# Local copy of the rulebook (written by rulebook_snapshot.py), loaded at startup
+rulebook_mirror = RulebookMirror() if config.RULEBOOK_MIRROR_ENABLED else None
+
+def rulebook_search_index():
+    """Rulebook index to query: the local mirror when a snapshot is loaded, else Pinecone."""
+    local = rulebook_mirror.get() if rulebook_mirror else None
+    return local if local is not None else rulebook_index
+
+def rulebook_version():
+    """Identifies the rulebook contents being served: the mirror snapshot, or the Pinecone index."""
+    local, info = rulebook_mirror.current() if rulebook_mirror else (None, None)
+    if local is not None:
+        return f"mirror:{info.get('created_at')}"
+    return f"pinecone:{config.RULEBOOK_INDEX_NAME}" if rulebook_index is not None else None
+
+# Rulebook context for /summarize: the query never changes, so its results are
+# computed once per rulebook version instead of on every call
+static_queries.register("summary_key_terms", "Identify key legal terms", k=5)
 
 app = FastAPI(title="Legal RAG Backend")
 app.add_middleware(
@@ -129,14 +142,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-SKIP_KEYWORDS = ["aadhaar", "passport", "voter id", "pan card", "self attested"]
+SKIP_KEYWORDS = config.SKIP_KEYWORDS
+
+# --- Ingest jobs ---
+# Vectors of documents ingested by this process (saved to disk), for local per-document retrieval in /query
+local_doc_index = LocalDocIndexStore() if config.LOCAL_DOC_INDEX_ENABLED and config.INGEST_RUN_WORKERS_IN_API else None
+
+ingest_pipeline = IngestPipeline(
+    documentai_client=documentai_client,
+    processor_name=processor_name,
+    rag_index=rag_index if USE_PINECONE else None,
+    skip_keywords=SKIP_KEYWORDS,
+    local_index=local_doc_index,
+)
+
+def run_ingest_job(params: dict, on_stage) -> dict:
+    """Job handler for /upload: runs the whole ingest pipeline for one queued PDF."""
+    return ingest_pipeline.run(
+        params["file_path"], params["doc_type"], params["user_id"],
+        doc_id=params["doc_id"], on_stage=on_stage, version_of=params.get("version_of")
+    )
+
+ingest_jobs = make_job_queue(stages=STAGES)
+ingest_workers = IngestWorkerPool(ingest_jobs, run_ingest_job)
 
 # --- Helpers ---
 def clean_gemini_response(text: str) -> str:
     return re.sub(r"```(?:json)?\s*|\s*```", "", text).strip()
 
 def generate_json_from_gemini(prompt: str) -> dict:
-    response = gemini.generate_content(prompt)
+    response = clients.gemini_model().generate_content(prompt)
     cleaned = clean_gemini_response(response.text)
     try:
         return json.loads(cleaned)
@@ -171,6 +206,25 @@ def extract_chunk_texts(chunks):
             texts.append(str(c))
     return texts
 
+def pack_doc_context(chunks, chunk_texts, endpoint: str, budget_tokens: int = None) -> str:
+    """
+    Join the document's chunks for a Gemini prompt, stopping at the token
+    budget (config.PROMPT_CONTEXT_TOKENS). Uses each chunk's stored
+    token_count, so nothing is re-measured.
+    """
+    budget_tokens = budget_tokens or config.PROMPT_CONTEXT_TOKENS
+    packed, used, tokens = pack_chunks(chunks, chunk_texts, budget_tokens)
+    if used < len(chunk_texts):
+        print(f"[TOKENS] {endpoint}: packed {used}/{len(chunk_texts)} chunks (~{tokens} tokens, budget {budget_tokens})")
+    return packed
+
+
+async def warm_static_queries():
+    await static_queries.warm(rulebook_search_index(), rulebook_version())
+
+def log_warm_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"[STATIC QUERY] Warm-up failed: {task.exception()!r}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -187,10 +241,23 @@ async def lifespan(app: FastAPI):
         print(f"❌ FATAL: Error during Vertex AI initialization: {e}")
         # Decide if you want the app to fail startup if this happens
         # raise  # Uncomment to stop the app if initialization fails
+
+    if config.INGEST_RUN_WORKERS_IN_API:
+        ingest_workers.start()
+
+    # Precompute the static rulebook queries without holding up startup
+    warm_task = asyncio.create_task(warm_static_queries())
+    warm_task.add_done_callback(log_warm_failure)
     
     yield # The application runs while yielded
     
     # Code to run on shutdown (if any)
+    warm_task.cancel()
+    try:
+        await warm_task
+    except (asyncio.CancelledError, Exception):
+        pass  # already logged by log_warm_failure
+    await ingest_workers.stop()
     print("ℹ️ Shutting down FastAPI application.")
 
 # --- FastAPI App Setup ---
@@ -205,8 +272,14 @@ UPLOAD_DIR = "uploads/masked_docs"
 async def upload_doc(
     file_name: str,
     doc_type: str,
-    user_id: str
+    user_id: str,
+    version_of: Optional[str] = None
 ):
+    """
+    Queue a PDF from uploads/masked_docs for ingest. Pass `version_of=<doc_id>`
+    to ingest it as a revised version of that document: only changed chunks
+    are re-embedded and stale analysis sections are flagged.
+    """
 
     # ✅ Build file path
     file_path = os.path.join(UPLOAD_DIR, file_name)
@@ -220,59 +293,56 @@ async def upload_doc(
     if not file_name.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Invalid file type. Only PDF allowed.")
 
-    # ✅ Read file content
-    with open(file_path, "rb") as f:
-        content = f.read()
-
-    # ✅ Extract text based on document type
-    if doc_type.lower() == "electronic":
-        text = extract_text_from_pdf(None, None, content, method="pymupdf", skip_keywords=SKIP_KEYWORDS)
-
-    elif doc_type.lower() == "scanned":
-        text = extract_text_from_pdf(documentai_client, processor_name, content, method="document_ai",
-                                     skip_keywords=SKIP_KEYWORDS)
-    else:
-        raise HTTPException(status_code=400, detail="doc_type must be 'scanned' or 'electronic'.")
+    if doc_type.lower() not in ("electronic", "scanned", "auto"):
+        raise HTTPException(status_code=400, detail="doc_type must be 'scanned', 'electronic' or 'auto'.")
 
-    print(f"\n[PARSER DEBUG] Extracted Text Length: {len(text)} characters.")
-    print(f"[PARSER DEBUG] Text Starts With: {text[:300]}...\n")
+    if version_of and not fetch_doc_chunks(user_id, version_of):
+        raise HTTPException(status_code=404, detail="Document to version not found.")
 
-    # ✅ Chunk the text
-    chunks = chunk_text(text, chunk_size=1500, chunk_overlap=200)
-    chunk_texts = [c["content"] for c in chunks]
+    # ✅ Queue the ingest (extract -> chunk -> diff -> embed -> upsert -> persist); poll /upload/status/{job_id}
+    doc_id = version_of or str(uuid.uuid4())
+    try:
+        job = await ingest_jobs.submit({
+            "file_path": file_path,
+            "doc_type": doc_type.lower(),
+            "user_id": user_id,
+            "doc_id": doc_id,
+            "version_of": version_of,
+        })
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
-    # ✅ Generate a new doc_id
-    doc_id = str(uuid.uuid4())
+    return {
+        "message": "Document queued for processing.",
+        "job_id": job["job_id"],
+        "doc_id": doc_id,
+        "status": job["status"],
+        "source": file_path
+    }
 
-    # ✅ Optional: Store embeddings to Pinecone
-    if USE_PINECONE:
-        try:
-            embeddings = embed_texts_batch(chunk_texts)
-            vectors = [
-                {
-                    "id": f"{user_id}_{doc_id}_chunk_{i}",
-                    "values": emb,
-                    "metadata": {"user_id": user_id, "doc_id": doc_id, "chunk_id": i, "snippet": chunk_texts[i][:150]},
-                }
-                for i, emb in enumerate(embeddings)
-            ]
-            rag_index.upsert(vectors=vectors)
-            print(f"[PINECONE] SUCCESS: Upserted {len(vectors)} vectors")
-        except Exception as e:
-            print(f"[PINECONE ERROR]: {e}")
 
-    # ✅ Store normalized chunks to Firestore
-    store_chunks = [
-        {"content": c.get("content", ""), "chunk_id": c.get("chunk_id"), "type": c.get("type")}
-        for c in chunks
-    ]
+@app.get("/upload/status/{job_id}")
+async def upload_status(job_id: str):
+    """Status of an ingest job: overall state, progress and per-stage status/timings."""
+    job = await ingest_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
 
-    save_processed_data(user_id, doc_id, "full_text_chunks", store_chunks)
 
+@app.get("/metrics")
+async def metrics():
+    """Runtime counters: embedding cache hit rates per tier, embedding batch sizes, static query cache."""
     return {
-        "message": f"Document processed successfully ({len(store_chunks)} chunks).",
-        "doc_id": doc_id,
-        "source": file_path
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "embedding_batcher": embedding_batcher.stats(),
+        "rulebook_mirror": rulebook_mirror.info if rulebook_mirror else None,
+        "local_doc_index": local_doc_index.stats() if local_doc_index else None,
+        "static_queries": static_queries.stats(),
+        "term_explanations": term_explanations.stats(),
+        "answer_cache": answer_cache.stats() if answer_cache else None,
+        "query_rag_hedge": query_rag_hedge.stats(),
+        "clients": clients.registry.stats(),
     }
 
 
@@ -296,14 +366,11 @@ async def upload_doc_to_rag_local(
     if not os.path.exists(file_path):
         print(f"[UPLOAD DEBUG] File not found locally, attempting to download from RAG bucket...")
         try:
-            from google.cloud import storage
-            
             rag_bucket_name = os.getenv("RAG_GCS_BUCKET_NAME")
             if not rag_bucket_name:
                 raise HTTPException(status_code=500, detail="RAG_GCS_BUCKET_NAME not configured.")
             
-            storage_client = storage.Client()
-            bucket = storage_client.bucket(rag_bucket_name)
+            bucket = clients.storage_client().bucket(rag_bucket_name)
             
             # Try to download from masked_docs/ folder
             blob_name = f"masked_docs/{file_name}"
@@ -333,37 +400,64 @@ async def upload_doc_to_rag_local(
         raise HTTPException(status_code=500, detail="RAG_CORPUS environment variable not set.")
 
     try:
-        # ✅ Read file content
-        with open(file_path, "rb") as f:
-            content = f.read()
-
-        # ✅ Extract text depending on type
-        if doc_type.lower() == "scanned":
-            extracted_text = extract_text_from_pdf(
+        # ✅ Same content-addressed cache as /upload: skip extraction on re-uploads
+        cache_key = None
+        cached = None
+        if ingest_cache and doc_type.lower() in ("scanned", "electronic", "auto"):
+            pdf_sha = await asyncio.to_thread(sha256_file, file_path)
+            cache_key = ingest_cache.document_key(pdf_sha, doc_type=doc_type.lower(), skip_keywords=SKIP_KEYWORDS,
+                                                  **ingest_pipeline.chunk_params)
+            cached = ingest_cache.get_document(cache_key)
+
+        # ✅ Extract text depending on type (extraction reads the file from disk)
+        skipped_pages = []
+        if cached:
+            print(f"[INGEST CACHE] HIT for {file_name}: reusing extracted text and chunks")
+            extracted_text = cached["text"]
+            skipped_pages = cached.get("skipped_pages")
+        elif doc_type.lower() == "scanned":
+            extracted_text = await asyncio.to_thread(
+                extract_text_from_pdf,
                 documentai_client,
                 processor_name,
-                content,
+                file_path,
                 method="document_ai",
-                skip_keywords=SKIP_KEYWORDS
+                skip_keywords=SKIP_KEYWORDS,
+                page_cache=ingest_cache,
+                skip_report=skipped_pages
             )
         elif doc_type.lower() == "electronic":
-            extracted_text = extract_text_from_pdf(
+            extracted_text = await asyncio.to_thread(
+                extract_text_from_pdf,
                 None,
                 None,
-                content,
+                file_path,
                 method="pymupdf",
-                skip_keywords=SKIP_KEYWORDS
+                skip_keywords=SKIP_KEYWORDS,
+                skip_report=skipped_pages
+            )
+        elif doc_type.lower() == "auto":
+            # Mixed PDF: text layer where present, Document AI only for the scanned pages
+            extracted_text = await asyncio.to_thread(
+                extract_text_from_pdf,
+                documentai_client,
+                processor_name,
+                file_path,
+                method="auto",
+                skip_keywords=SKIP_KEYWORDS,
+                page_cache=ingest_cache,
+                skip_report=skipped_pages
             )
         else:
-            raise HTTPException(status_code=400, detail="doc_type must be 'scanned' or 'electronic'.")
+            raise HTTPException(status_code=400, detail="doc_type must be 'scanned', 'electronic' or 'auto'.")
 
         print(f"[RAG DEBUG] Extracted text length: {len(extracted_text)} chars.")
 
         upload_display_name = file_name
         doc_id = str(uuid.uuid4())
 
-        # ✅ Upload to RAG
-        if doc_type.lower() == "scanned":
+        # ✅ Upload to RAG (auto may contain image-only pages, so it goes up as text like scanned)
+        if doc_type.lower() in ("scanned", "auto"):
             # Convert text to .txt for RAG
             with tempfile.NamedTemporaryFile(delete=False, suffix=".txt", mode='w', encoding='utf-8') as temp_txt:
                 temp_txt.write(extracted_text)
@@ -388,10 +482,15 @@ async def upload_doc_to_rag_local(
         rag_file_id = rag_file_result.name.split("/")[-1]
 
         # ✅ Chunk text for retrieval
-        chunks = chunk_text(extracted_text, chunk_size=1500, chunk_overlap=200)
+        if cached:
+            chunks = cached["chunks"]
+        else:
+            chunks = chunk_text(extracted_text, **ingest_pipeline.chunk_params)
+            if ingest_cache:
+                ingest_cache.put_document(cache_key, extracted_text, chunks, skipped_pages)
         chunk_texts = [c["content"] if isinstance(c, dict) else str(c) for c in chunks]
 
-        # ✅ Store RAG mapping
+        # ✅ Store RAG mapping (scopes /query-rag retrieval to this file)
         save_processed_data(
             user_id=user_id,
             doc_id=doc_id,
@@ -422,7 +521,8 @@ async def upload_doc_to_rag_local(
             "doc_id": doc_id,
             "status": "indexing",
             "user_id": user_id,
-            "chunks_stored": len(chunk_texts)
+            "chunks_stored": len(chunk_texts),
+            "skipped_pages": skipped_pages
         }
 
     except Exception as e:
@@ -471,24 +571,50 @@ vertexai.init(project=RAG_PROJECT_ID, location=RAG_LOCATION)
 
 
 
-async def query_vertex_rag(corpus_name: str, query: str, doc_id: str) -> str:
-    """Query the RAG corpus for contextual answer."""
+# (user_id, doc_id) -> (corpus, rag_file_id) from the rag_file_mapping saved by /upload-rag.
+# A mapping is written once, for a new doc_id, and never updated or deleted, so
+# cached scopes cannot go stale; code that changes or removes a mapping must
+# pop its key here too. Documents without a mapping are not cached.
+rag_file_scopes = OrderedDict()
+rag_file_scopes_lock = threading.Lock()
+
+def rag_file_scope(user_id: str, doc_id: str):
+    """(corpus, rag_file_id) of the user's document in the RAG corpus, or None if it was never uploaded."""
+    key = (user_id, doc_id)
+    with rag_file_scopes_lock:
+        if key in rag_file_scopes:
+            rag_file_scopes.move_to_end(key)
+            return rag_file_scopes[key]
+    mapping = get_processed_data(user_id, doc_id, "rag_file_mapping")
+    if not mapping or not mapping.get("rag_file_id") or mapping.get("user_id", user_id) != user_id:
+        return None
+    # rag_file_name is "<corpus resource name>/ragFiles/<id>"
+    corpus = (mapping.get("rag_file_name") or "").split("/ragFiles/")[0] or None
+    scope = (corpus, mapping["rag_file_id"])
+    with rag_file_scopes_lock:
+        rag_file_scopes[key] = scope
+        while len(rag_file_scopes) > config.RAG_FILE_SCOPE_CACHE_SIZE:
+            rag_file_scopes.popitem(last=False)
+    return scope
+
+async def query_vertex_rag(corpus_name: str, query: str, doc_id: str, user_id: str) -> str:
+    """Query the user's document in the RAG corpus for contextual answer."""
     try:
-        enhanced_query = f"For document ID {doc_id}: {query}"
-
-        rag_tool = Tool.from_retrieval(
-            retrieval=rag.Retrieval(
-                source=rag.VertexRagStore(
-                    rag_resources=[rag.RagResource(rag_corpus=corpus_name)],
-                    similarity_top_k=5,
-                    vector_distance_threshold=0.5
-                )
-            )
-        )
-
-        model = GenerativeModel("gemini-2.5-flash", tools=[rag_tool])
-        response = model.generate_content(enhanced_query)
+        # Retrieve only from this document's file, so results never come from other
+        # users' uploads and top-k work depends on one document, not the corpus
+        scope = await asyncio.to_thread(rag_file_scope, user_id, doc_id)
+        if scope:
+            corpus, rag_file_id = scope
+            model = clients.gemini_model(rag_corpus=corpus or corpus_name, similarity_top_k=5,
+                                         vector_distance_threshold=0.5, rag_file_ids=(rag_file_id,))
+        elif config.RAG_REQUIRE_FILE_SCOPE:
+            return "[RAG] No response: document is not in the RAG corpus"
+        else:
+            model = clients.gemini_model(rag_corpus=corpus_name, similarity_top_k=5, vector_distance_threshold=0.5)
+        response = await model.generate_content_async(query)
         return response.text.strip() if hasattr(response, "text") else "[RAG] No response"
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
         traceback.print_exc()
         return f"[RAG Error] {str(e)}"
@@ -513,11 +639,22 @@ User Query:
 {query}
 """
 
-    model = GenerativeModel("gemini-2.5-flash")
-    response = model.generate_content(prompt)
+    model = clients.gemini_model()
+    response = await model.generate_content_async(prompt)
     return response.text.strip() if hasattr(response, "text") else "[LLM] No response"
     
 
+def usable_rag_answer(answer: str) -> bool:
+    """False for empty, error and "document does not contain" answers."""
+    if not answer or answer.startswith(("[RAG", "[LLM")):
+        return False
+    lowered = answer.lower()
+    return "no response" not in lowered and "not contain" not in lowered
+
+query_rag_hedge = HedgedCall("vertex_rag", "clauses_llm", timeouts={
+    "vertex_rag": config.QUERY_RAG_TIMEOUT_SECONDS,
+    "clauses_llm": config.QUERY_LLM_TIMEOUT_SECONDS,
+})
 
 @app.post("/query-rag")
 async def query_rag_parallel(
@@ -527,40 +664,50 @@ async def query_rag_parallel(
     clauses_json: str = Form(...)
 ):
     """
-    Query both Vertex RAG and local LLM fallback (using provided clauses JSON).
-    Runs in parallel and returns the first valid response.
+    Query Vertex RAG, hedged with an LLM answer from the provided clauses JSON,
+    and return the first valid response.
     """
     try:
+        start = time.perf_counter()
         corpus_name = RAG_CORPUS
         if not corpus_name:
             raise HTTPException(status_code=500, detail="RAG_CORPUS not configured.")
 
-        rag_task = asyncio.create_task(query_vertex_rag(corpus_name, query, doc_id))
-        llm_task = asyncio.create_task(query_llm_from_clauses(query, clauses_json))
-
-        done, pending = await asyncio.wait(
-            [rag_task, llm_task],
-            return_when=asyncio.FIRST_COMPLETED
-        )
+        # Answers depend on the question and the clauses sent with it
+        cache_scope = (user_id, doc_id, "query-rag:" + hashlib.sha256(clauses_json.encode("utf-8")).hexdigest())
+        query_emb = None
+        if answer_cache:
+            cached = answer_cache.get(cache_scope, query)
+            if not cached:
+                query_emb = await embedding_batcher.embed(query)
+                cached = answer_cache.get(cache_scope, query, query_emb)
+            if cached:
+                answer_cache.record_latency(True, time.perf_counter() - start)
+                return {
+                    "answer": cached[0],
+                    "user_id": user_id,
+                    "doc_id": doc_id,
+                    "answer_cache": {"similarity": round(cached[1], 4)},
+                }
 
-        # Take whichever completes first
-        first_result = list(done)[0].result()
-        for t in pending:
-            t.cancel()
+        # Vertex RAG first; the clauses-only LLM is started if RAG is slower than
+        # its p95 or gives no usable answer. The first usable answer wins.
+        first_result, answered_by = await query_rag_hedge.run({
+            "vertex_rag": lambda: query_vertex_rag(corpus_name, query, doc_id, user_id),
+            "clauses_llm": lambda: query_llm_from_clauses(query, clauses_json),
+        }, usable_rag_answer)
 
-        # If RAG failed or empty, fallback to LLM
-        if (
-            not first_result
-            or "no response" in first_result.lower()
-            or "not contain" in first_result.lower()
-        ):
-            other_result = await (llm_task if rag_task in done else rag_task)
-            first_result = other_result
+        if answer_cache:
+            if answered_by:
+                answer_cache.put(cache_scope, query, first_result, query_emb)
+            answer_cache.record_latency(False, time.perf_counter() - start)
 
         return {
             "answer": first_result or "No relevant response generated.",
             "user_id": user_id,
-            "doc_id": doc_id
+            "doc_id": doc_id,
+            "answered_by": answered_by,
+            "answer_cache": None,
         }
 
     except Exception as e:
@@ -574,17 +721,15 @@ async def summarize_doc(doc_id: str = Form(...), user_id: str = Form(...), analy
         raise HTTPException(status_code=404, detail="Document not found.")
 
     chunk_texts = extract_chunk_texts(chunks)
-    user_doc_clauses_str = "\n\n".join(chunk_texts)
+    user_doc_clauses_str = pack_doc_context(chunks, chunk_texts, "/summarize")
 
     
 
 
     language_instruction = basic_instruction if analysis_type.lower() == "basic" else pro_instruction
     # Retrieve rulebook contexts (if rulebook index exists)
-    rulebook_chunks_str = ""
-    if rulebook_index:
-        rulebook_texts = retrieve_top_k_pinecone(embed_texts_batch(["Identify key legal terms"])[0], rulebook_index, k=5)
-        rulebook_chunks_str = "\n\n".join(rulebook_texts)
+    rulebook_hits = await static_queries.get("summary_key_terms", rulebook_search_index(), rulebook_version())
+    rulebook_chunks_str = "\n\n".join(h.text for h in rulebook_hits)
 
     prompt = f"""
     **Generate clean json for the below**
@@ -616,7 +761,7 @@ async def get_clauses(doc_id: str = Form(...), user_id: str = Form(...),analysis
         raise HTTPException(status_code=404, detail="Document not found.")
 
     chunk_texts = extract_chunk_texts(chunks)
-    clauses_str = "\n\n".join(chunk_texts)
+    clauses_str = pack_doc_context(chunks, chunk_texts, "/clauses")
     
 
 
@@ -661,7 +806,7 @@ async def classify_risks(doc_id: str = Form(...), user_id: str = Form(...),analy
         raise HTTPException(status_code=404, detail="Document not found.")
 
     chunk_texts = extract_chunk_texts(chunks)
-    clauses_str = "\n\n".join(chunk_texts)
+    clauses_str = pack_doc_context(chunks, chunk_texts, "/risks")
 
     
 
@@ -701,21 +846,65 @@ Clauses:
 @app.post("/query")
 async def query_doc(question: str = Form(...), doc_id: str = Form(...), user_id: str = Form(...)):
     """
-    (Kept as-is from your original app; this endpoint relies on Pinecone retrieval.)
+    Retrieves the document chunks by BM25 + vector search (fused by reciprocal rank),
+    or by BM25 alone when the question names a clause or quotes a term.
     Answers user's question based *strictly* on provided context and generates follow-ups.
     """
-    if not fetch_doc_chunks(user_id, doc_id): # Check if doc exists
+    start = time.perf_counter()
+    chunks = fetch_doc_chunks(user_id, doc_id)
+    if not chunks: # Check if doc exists
         raise HTTPException(status_code=404, detail="Document not found.")
 
-    # if Pinecone disabled, return helpful message
-    if not USE_PINECONE or rag_index is None:
-        return {
-            "error": "Retrieval via Pinecone is disabled. Enable USE_PINECONE=true to use /query."
+    # Answers are cached per version of the document's chunks
+    cache_scope = (user_id, doc_id, "query:" + chunks_fingerprint(chunks))
+    cached = answer_cache.get(cache_scope, question) if answer_cache else None
+    if cached:
+        answer_cache.record_latency(True, time.perf_counter() - start)
+        return {**cached[0], "answer_cache": {"hit": "exact", "similarity": 1.0}}
+
+    # BM25 over the document's own chunks (built at ingest; rebuilt here if missing)
+    lexical = await asyncio.to_thread(lexical_indexes.get, user_id, doc_id, chunks)
+    refs = exact_references(question)
+    exact = lexical.exact_matches(refs, question, k=5) if refs["clauses"] or refs["quoted"] else []
+
+    if exact:
+        # The question names a clause or quotes a term: answer from the matching
+        # chunks alone, without embedding the question or any vector lookup
+        retrieval_mode = "lexical_exact"
+        hits = {
+            "doc": [RetrievalHit(id=f"{doc_id}_{lexical.chunk_ids[i]}", score=score, chunk_id=lexical.chunk_ids[i],
+                                 text=lexical.texts[i], source="lexical") for i, score in exact],
+            "rulebook": [],
         }
-
-    query_emb = embed_texts_batch([question])[0]
-    retrieved_doc_texts = retrieve_top_k_pinecone(query_emb, rag_index, k=5, filter_dict={"user_id":{"$eq":user_id}, "doc_id":{"$eq":doc_id}})
-    retrieved_rulebook_texts = retrieve_top_k_pinecone(query_emb, rulebook_index, k=5) if rulebook_index else []
+    else:
+        retrieval_mode = "hybrid"
+        query_emb = await embedding_batcher.embed(question)
+        cached = answer_cache.get(cache_scope, question, query_emb) if answer_cache else None
+        if cached:
+            answer_cache.record_latency(True, time.perf_counter() - start)
+            return {**cached[0], "answer_cache": {"hit": "semantic", "similarity": round(cached[1], 4)}}
+        doc_filter = {"user_id": {"$eq": user_id}, "doc_id": {"$eq": doc_id}}
+        # Documents ingested by this process are ranked in-process; others go to Pinecone
+        doc_index = await asyncio.to_thread(local_doc_index.get, user_id, doc_id) if local_doc_index else None
+        if doc_index is None:
+            doc_index = rag_index if USE_PINECONE else None
+        # Document and rulebook lookups run concurrently
+        hits = await fan_out_retrieval([query_emb], {
+            "doc": RetrievalTarget(doc_index, k=10, filter_dict=doc_filter),
+            "rulebook": RetrievalTarget(rulebook_search_index(), k=5),
+        })
+        # Vector and BM25 rankings of the document's chunks, fused by reciprocal rank
+        vector_hits = {h.chunk_id: h for h in hits["doc"]}
+        bm25_ranking = [lexical.chunk_ids[i] for i, _ in lexical.search(question, k=10)]
+        fused = reciprocal_rank_fusion([list(vector_hits), bm25_ranking], k=config.RRF_K, limit=5)
+        hits["doc"] = []
+        for chunk_id, score in fused:
+            position = lexical.positions.get(chunk_id)
+            text = lexical.texts[position] if position is not None else vector_hits[chunk_id].text
+            hits["doc"].append(RetrievalHit(id=f"{doc_id}_{chunk_id}", score=score, chunk_id=chunk_id,
+                                            text=text, source="hybrid"))
+    retrieved_doc_texts = [h.text for h in hits["doc"]]
+    retrieved_rulebook_texts = [h.text for h in hits["rulebook"]]
 
     doc_context_str = "\n\n".join(retrieved_doc_texts)
     rulebook_context_str = "\n\n".join(retrieved_rulebook_texts)
@@ -752,7 +941,8 @@ User Question:
     response_data = generate_json_from_gemini(prompt)
 
     # Validate response structure (optional but recommended)
-    if not isinstance(response_data, dict) or not all(k in response_data for k in ["answer", "source", "suggested_questions"]):
+    well_formed = isinstance(response_data, dict) and all(k in response_data for k in ["answer", "source", "suggested_questions"])
+    if not well_formed:
          print(f"Warning: Gemini returned malformed JSON for query: {question}. Raw: {response_data}")
          response_data = {
              "answer": "There was an issue generating the response. Please try rephrasing your question.",
@@ -760,13 +950,23 @@ User Question:
              "suggested_questions": []
          }
 
-    return {
+    result = {
         "response_json": response_data,
         "retrieved_clauses_doc_count": len(retrieved_doc_texts),
         "retrieved_clauses_rulebook_count": len(retrieved_rulebook_texts),
+        "retrieval_mode": retrieval_mode,
+        "retrieval_hits": {
+            name: [{"id": h.id, "score": round(h.score, 4), "chunk_id": h.chunk_id} for h in source_hits]
+            for name, source_hits in hits.items()
+        },
         "DEBUG_DOC_CONTEXT": retrieved_doc_texts,
         "DEBUG_RULEBOOK_CONTEXT": retrieved_rulebook_texts
     }
+    if answer_cache:
+        if well_formed:
+            answer_cache.put(cache_scope, question, result, query_emb if retrieval_mode == "hybrid" else None)
+        answer_cache.record_latency(False, time.perf_counter() - start)
+    return {**result, "answer_cache": None}
 
 @app.post("/query")
 async def query_rag_endpoint(user_query: str = Form(...)):
@@ -934,23 +1134,29 @@ async def masking_data(
     """
     Upload a PDF and perform masking.
     If 'scanned', the extracted OCR text replaces the file content before masking.
+    The upload is streamed to disk (never held in memory whole) and rejected
+    early once it passes config.MAX_UPLOAD_BYTES.
     """
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    content = await file.read()
+    if doc_type.lower() not in ("electronic", "scanned"):
+        raise HTTPException(status_code=400, detail="Invalid doc_type. Use 'electronic' or 'scanned'.")
 
-    with open(file_path, "wb") as f:
-        f.write(content)
+    file_path = os.path.join(UPLOAD_DIR, os.path.basename(file.filename))
+    spooled = await spool_upload(file, file_path)
+    skipped_pages = []
+    print(f"[UPLOAD] Spooled {spooled.size} bytes to {spooled.path} (sha256={spooled.sha256[:12]})")
 
     if doc_type.lower() == "scanned":
         print("🧠 Using Document AI for scanned PDF OCR...")
 
-        # Extract text via Document AI
-        extracted_text = extract_text_from_pdf(
+        # Extract text via Document AI, reading the spooled file by path
+        extracted_text = await asyncio.to_thread(
+            extract_text_from_pdf,
             documentai_client=documentai_client,
             processor_name=processor_name,
-            content=content,
+            content=spooled.path,
             method="document_ai",
-            skip_keywords=SKIP_KEYWORDS
+            skip_keywords=SKIP_KEYWORDS,
+            skip_report=skipped_pages
         )
 
         # Replace the stored local PDF with OCR text as actual PDF
@@ -982,6 +1188,7 @@ async def masking_data(
     return {
         "message": "File uploaded & masked successfully!",
         "original_path": file_path,
+        "skipped_pages": skipped_pages,
         **result,
     }
 
@@ -991,26 +1198,7 @@ from fastapi.responses import JSONResponse
 from utils.retrieval import retrieve_top_k_pinecone
 import pinecone
 
-# Make sure you have initialized Pinecone and have the index object
-USE_PINECONE = os.getenv("USE_PINECONE", "true").lower() not in ("0", "false", "no")
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-
-if USE_PINECONE and not PINECONE_API_KEY:
-    # If user asked to use Pinecone but didn't set API key, fail early
-    raise ValueError("PINECONE_API_KEY environment variable not set but USE_PINECONE is enabled.")
-
-pc = Pinecone(api_key=PINECONE_API_KEY) if USE_PINECONE else None
-if USE_PINECONE:
-    if "legal-doc-index" not in pc.list_indexes().names():
-        pc.create_index(
-            name="legal-doc-index",
-            dimension=1536,
-            metric='cosine',
-            spec=ServerlessSpec(cloud='aws', region='us-east-1')
-        )
-    rulebook_index = pc.Index("legal-doc-index")
-else:
-    rulebook_index = None
+# Pinecone clients and rulebook_index are set up once, at the top of this module (utils/clients.py)
 
 from fastapi import Form, FastAPI, HTTPException, Request
 from typing import List
@@ -1023,10 +1211,12 @@ async def view_rulebook_source(
 ):
     """
     Extracts data["summary"]["key_terms"] from the input JSON.
-    For each key term, retrieves the most relevant rulebook chunk from Pinecone and
-    generates an explanation via the LLM.
+    For each key term, retrieves the most relevant rulebook chunk and generates an
+    explanation via the LLM. Terms are embedded together and looked up and explained
+    concurrently; explanations are cached per (term, rulebook version).
     """
-    if not USE_PINECONE or rulebook_index is None:
+    rb_index = rulebook_search_index()
+    if rb_index is None:
         return {
             "error": "Rulebook retrieval via Pinecone is disabled. Enable USE_PINECONE=true to use /view-rulebook-source."
         }
@@ -1043,19 +1233,35 @@ async def view_rulebook_source(
                 detail="Missing or invalid data['summary']['key_terms']. Expected a non-empty list of strings."
             )
 
-        results = []
-
-        # Loop through each key term
-        for term in key_terms_list:
-            # 1️⃣ Embed the term
-            query_emb = embed_texts_batch([term])[0]
-
-            # 2️⃣ Retrieve top chunk(s) from Pinecone
-            retrieved_chunks = retrieve_top_k_pinecone(query_emb, rulebook_index, k=top_k)
-            context = "\n\n".join(retrieved_chunks)
-
-            # 3️⃣ Prompt LLM for explanation
-            prompt = f"""
+        terms = [str(t) for t in key_terms_list]
+        version = rulebook_version()
+        # Case/whitespace variants of a term share one key: one lookup, one LLM call
+        unique_terms = {}  # normalized key -> first spelling seen
+        for term in terms:
+            unique_terms.setdefault(normalize_term(term), term)
+        explanations = {}
+        for key in unique_terms:
+            cached = term_explanations.get(key, version, top_k)
+            if cached is not None:
+                explanations[key] = cached
+        missing = [key for key in unique_terms if key not in explanations]
+
+        if missing:
+            # 1️⃣ Embed all new terms (coalesced into one Vertex call)
+            term_embs = await embedding_batcher.embed_many([unique_terms[key] for key in missing])
+
+            # 2️⃣ Retrieve top chunk(s) for every term concurrently
+            contexts = await asyncio.gather(*(
+                asyncio.to_thread(retrieve_top_k_pinecone, query_emb, rb_index, top_k) for query_emb in term_embs
+            ))
+
+            # 3️⃣ Prompt LLM for explanations, a bounded number at a time
+            llm_slots = asyncio.Semaphore(config.TERM_EXPLANATION_MAX_CONCURRENCY)
+
+            async def explain(key, retrieved_chunks):
+                term = unique_terms[key]
+                context = "\n\n".join(retrieved_chunks)
+                prompt = f"""
 You are a legal assistant for a professional law person.
 Use "Rulebook context" to clarify terms found in the document context.
 Given the following rulebook excerpt, explain the meaning or relevance of the term in professional, clear language. 
@@ -1068,16 +1274,24 @@ Rulebook Context:
 
 Return ONLY a valid JSON object: {{"term": "<term>", "explanation": "<explanation or Not found in context.>"}}
 """
-            llm_resp = generate_json_from_gemini(prompt)
-
-            # 4️⃣ Fallback if LLM fails or returns invalid JSON
-            if not isinstance(llm_resp, dict) or "explanation" not in llm_resp:
-                llm_resp = {
-                    "term": term,
-                    "explanation": "Not found in context." if not context else context
-                }
-
-            results.append(llm_resp)
+                async with llm_slots:
+                    llm_resp = await asyncio.to_thread(generate_json_from_gemini, prompt)
+
+                # 4️⃣ Fallback if LLM fails or returns invalid JSON (not cached)
+                if not isinstance(llm_resp, dict) or "explanation" not in llm_resp:
+                    return {
+                        "term": term,
+                        "explanation": "Not found in context." if not context else context
+                    }
+                term_explanations.put(key, version, top_k, llm_resp)
+                return llm_resp
+
+            for key, llm_resp in zip(missing, await asyncio.gather(*(
+                explain(key, chunks) for key, chunks in zip(missing, contexts)
+            ))):
+                explanations[key] = llm_resp
+
+        results = [explanations[normalize_term(term)] for term in terms]
 
         return {"results": results}
 
@@ -0,0 +1,80 @@
+# bench_chunker.py
+# Chunking throughput on the sample PDFs in uploads/masked_docs:
+# streaming utils.chunker vs the previous re.split + RecursiveCharacterTextSplitter version.
+# (iter_chunks also estimates each chunk's token_count, which the legacy version did not.)
+#   python bench_chunker.py [--repeat 20]
+import argparse
+import glob
+import re
+import time
+
+from utils.chunker import iter_chunks
+
+
+def legacy_chunk_text(text, chunk_size=1500, chunk_overlap=200):
+    """The chunker as it was before the streaming rewrite (needs langchain-text-splitters)."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    pattern = r'(\n\d+\)|\n\d+\.\s|\n[a-z]\.\s|\n[A-Z]\.\s|\n\(\w+\)\s)'
+    parts = re.split(pattern, text)
+    clauses = []
+    if parts and parts[0].strip():
+        clauses.append(parts[0].strip())
+    for i in range(1, len(parts), 2):
+        heading = parts[i].strip() if i < len(parts) else ""
+        body = parts[i + 1].strip() if i + 1 < len(parts) else ""
+        if heading or body:
+            clauses.append(f"{heading} {body}".strip())
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=["\n\n", "\n", ". ", "! ", "? "]
+    )
+    chunks = []
+    for content in clauses:
+        chunks.extend(splitter.split_text(content) if len(content) > chunk_size else [content])
+    return chunks
+
+
+def load_texts():
+    texts = []
+    try:
+        import fitz
+        for path in sorted(glob.glob("uploads/masked_docs/*.pdf")):
+            try:
+                with fitz.open(path) as doc:
+                    texts.append((path, "\n".join(p.get_text("text") for p in doc)))
+            except Exception as e:
+                print(f"skipping unreadable {path}: {e}")
+    except ImportError:
+        print("PyMuPDF not installed; using a synthetic contract instead of uploads/masked_docs")
+    if not texts:
+        clause = "The Tenant shall pay the rent on or before the fifth day of each month. " * 30
+        texts.append(("synthetic", "AGREEMENT\n" + "".join(f"\n{i}. {clause}\n(a) notice period applies." for i in range(1, 400))))
+    return texts
+
+
+def bench(label, fn, texts, repeat):
+    total_chars = sum(len(t) for _, t in texts) * repeat
+    start = time.perf_counter()
+    n_chunks = 0
+    for _ in range(repeat):
+        for _, text in texts:
+            n_chunks += sum(1 for _ in fn(text))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {elapsed * 1000:9.1f} ms  {total_chars / elapsed / 1e6:7.2f} MB/s  "
+          f"{n_chunks // repeat} chunks/pass")
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    texts = load_texts()
+    print(f"{len(texts)} documents, {sum(len(t) for _, t in texts) / 1e6:.2f} M chars per pass, {args.repeat} passes")
+    new = bench("streaming iter_chunks", iter_chunks, texts, args.repeat)
+    try:
+        old = bench("legacy chunk_text", legacy_chunk_text, texts, args.repeat)
+        print(f"speedup: {old / new:.1f}x")
+    except ImportError:
+        print("langchain-text-splitters not installed; skipping the legacy comparison")
@@ -0,0 +1,71 @@
+# bench_skip_keywords.py
+# Micro-benchmark: the old per-keyword `kw.lower() in text.lower()` loop vs the
+# compiled KeywordMatcher used by utils/pdf_extraction.
+#   python bench_skip_keywords.py [--keywords 300] [--pages 500]
+import argparse
+import glob
+import random
+import string
+import time
+
+import config
+from utils.keyword_matcher import KeywordMatcher, ahocorasick
+
+
+def old_should_skip(text, skip_keywords):
+    return any(kw.lower() in text.lower() for kw in skip_keywords)
+
+
+def sample_pages(n_pages):
+    """Page texts from uploads/masked_docs if PyMuPDF is available, else synthetic legal-ish text."""
+    pages = []
+    try:
+        import fitz
+        for path in sorted(glob.glob("uploads/masked_docs/*.pdf")):
+            try:
+                with fitz.open(path) as doc:
+                    pages.extend(p.get_text("text") for p in doc)
+            except Exception:
+                continue  # a few samples are not valid PDFs
+    except ImportError:
+        pass
+    if not pages:
+        words = ["agreement", "party", "shall", "tenant", "landlord", "notice", "clause",
+                 "payment", "term", "hereby", "indemnify", "rent", "deposit", "the", "of"]
+        rng = random.Random(0)
+        pages = [" ".join(rng.choice(words) for _ in range(600)) for _ in range(50)]
+    return [pages[i % len(pages)] for i in range(n_pages)]
+
+
+def synthetic_keywords(n):
+    rng = random.Random(1)
+    extra = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 14)))
+             for _ in range(max(0, n - len(config.SKIP_KEYWORDS)))]
+    return list(config.SKIP_KEYWORDS) + extra
+
+
+def bench(label, fn, pages):
+    start = time.perf_counter()
+    hits = sum(1 for p in pages if fn(p))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms  ({elapsed / len(pages) * 1e6:8.1f} us/page, {hits} skipped)")
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keywords", type=int, default=300)
+    parser.add_argument("--pages", type=int, default=500)
+    args = parser.parse_args()
+
+    pages = sample_pages(args.pages)
+    print(f"{len(pages)} pages, matcher backend: {'pyahocorasick' if ahocorasick else 'regex'}")
+    for n in sorted({len(config.SKIP_KEYWORDS), args.keywords}):
+        keywords = synthetic_keywords(n)
+        print(f"\n--- {len(keywords)} keywords ---")
+        old = bench("old any(kw in text.lower())", lambda p: old_should_skip(p, keywords), pages)
+        build = time.perf_counter()
+        matcher = KeywordMatcher(keywords)
+        print(f"{'matcher build':<28} {(time.perf_counter() - build) * 1000:9.1f} ms")
+        new = bench("KeywordMatcher.find", matcher.find, pages)
+        print(f"speedup: {old / new:.1f}x")
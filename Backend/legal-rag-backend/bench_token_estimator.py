@@ -0,0 +1,57 @@
+# bench_token_estimator.py
+# Checks utils.tokens.estimate_tokens against real token counts on chunks of
+# the sample PDFs in uploads/masked_docs, and suggests TOKEN_ESTIMATE_SCALE.
+# Real counts come from Vertex AI count_tokens (needs credentials), or from the
+# local Gemini tokenizer with --local (pip install "google-cloud-aiplatform[tokenization]").
+#   python bench_token_estimator.py [--local] [--max-chunks 200] [--max-tokens 384]
+import argparse
+import time
+
+import config
+from bench_chunker import load_texts
+from utils.chunker import iter_chunks
+from utils.tokens import estimate_tokens
+
+
+def make_counter(local: bool):
+    if local:
+        from vertexai.preview import tokenization
+        tokenizer = tokenization.get_tokenizer_for_model(config.GEMINI_MODEL)
+        return lambda text: tokenizer.count_tokens(text).total_tokens
+
+    import vertexai
+    from vertexai.generative_models import GenerativeModel
+    vertexai.init(project=config.PROJECT_ID, location=config.VERTEX_AI_LOCATION)
+    model = GenerativeModel(config.GEMINI_MODEL)
+    return lambda text: model.count_tokens(text).total_tokens
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--local", action="store_true", help="count with the local tokenizer instead of the API")
+    parser.add_argument("--max-chunks", type=int, default=200)
+    parser.add_argument("--max-tokens", type=int, default=config.EMBEDDING_CHUNK_TOKENS)
+    args = parser.parse_args()
+
+    samples = []
+    for _, text in load_texts():
+        samples += [c["content"] for c in iter_chunks(text, max_tokens=args.max_tokens)]
+    samples = samples[:args.max_chunks]
+
+    start = time.perf_counter()
+    estimates = [estimate_tokens(s, scale=1.0) for s in samples]
+    est_ms = (time.perf_counter() - start) * 1000
+
+    count_tokens = make_counter(args.local)
+    actual = [count_tokens(s) for s in samples]
+
+    errors = sorted(abs(e - a) / a for e, a in zip(estimates, actual) if a)
+    scale = sum(actual) / sum(estimates)
+    print(f"{len(samples)} chunks, {sum(actual)} real tokens, estimator {est_ms:.1f} ms total")
+    print(f"unscaled error: mean {sum(errors) / len(errors):.1%}, p90 {errors[int(0.9 * (len(errors) - 1))]:.1%}, "
+          f"max {errors[-1]:.1%}")
+    scaled = [abs(e * scale - a) / a for e, a in zip(estimates, actual) if a]
+    print(f"with scale {scale:.3f}: mean error {sum(scaled) / len(scaled):.1%}")
+    print(f"suggested: TOKEN_ESTIMATE_SCALE={scale:.3f} (current {config.TOKEN_ESTIMATE_SCALE})")
+    over = sum(1 for e, a in zip(estimates, actual) if a > args.max_tokens)
+    print(f"chunks over the {args.max_tokens}-token budget by real count: {over}")
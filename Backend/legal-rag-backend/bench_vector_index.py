@@ -0,0 +1,64 @@
+# bench_vector_index.py
+# Top-k latency: LocalVectorIndex (matmul + argpartition) vs the old per-pair
+# cosine loop in retrieve_top_k, on random 768-d vectors.
+#   python bench_vector_index.py [--docs 200] [--chunks 100] [--queries 50]
+import argparse
+import time
+
+import numpy as np
+
+from utils.vector_index import LocalVectorIndex
+
+
+def legacy_top_k(query_emb, vector_store, k=5):
+    """retrieve_top_k as it was: one cosine similarity per pair, then a full sort."""
+    scores = []
+    for data in vector_store.values():
+        emb = data["embedding"]
+        sim = np.dot(query_emb, emb) / (np.linalg.norm(query_emb) * np.linalg.norm(emb))
+        scores.append((sim, data["text"]))
+    scores.sort(reverse=True, key=lambda x: x[0])
+    return [text for _, text in scores[:k]]
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=100, help="chunks per document")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=768)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    n = args.docs * args.chunks
+    vectors = rng.standard_normal((n, args.dim), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    index = LocalVectorIndex()
+    index.add([f"v{i}" for i in range(n)], vectors,
+              [{"user_id": "u", "doc_id": f"d{i // args.chunks}", "text": f"t{i}"} for i in range(n)])
+    store = {i: {"text": f"t{i}", "embedding": vectors[i]} for i in range(n)}
+    doc_store = {i: store[i] for i in range(args.chunks)}
+    doc_filter = {"user_id": "u", "doc_id": "d0"}
+
+    # Same answers as the old loop
+    for q in queries[:5]:
+        assert [m[2]["text"] for m in index.search(q, 5)] == legacy_top_k(q, store)
+        assert [m[2]["text"] for m in index.search(q, 5, doc_filter)] == legacy_top_k(q, doc_store)
+
+    print(f"{n} vectors ({args.docs} docs x {args.chunks} chunks), dim {args.dim}")
+    full_old = timed(lambda q: legacy_top_k(q, store), queries[:5])
+    full_new = timed(lambda q: index.search(q, 5), queries)
+    print(f"whole index:  legacy {full_old:8.2f} ms/query   LocalVectorIndex {full_new:6.3f} ms/query   "
+          f"({full_old / full_new:.0f}x)")
+    doc_old = timed(lambda q: legacy_top_k(q, doc_store), queries)
+    doc_new = timed(lambda q: index.search(q, 5, doc_filter), queries)
+    print(f"one document: legacy {doc_old:8.2f} ms/query   LocalVectorIndex {doc_new:6.3f} ms/query   "
+          f"({doc_old / doc_new:.0f}x)")
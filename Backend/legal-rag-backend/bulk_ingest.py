@@ -0,0 +1,164 @@
+# bulk_ingest.py
+# Bulk-ingest a folder of PDFs through the same pipeline as /upload
+# (extract_text_from_pdf -> chunk_text -> embed_texts_batch -> Pinecone -> save_processed_data),
+# without going through HTTP. Progress is checkpointed so an interrupted run resumes.
+#
+#   python bulk_ingest.py ./client_pdfs --user-id acme --doc-type auto --concurrency 8
+import os
+import sys
+import math
+import json
+import glob
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+import config
+from utils import clients
+from utils.ingest_pipeline import IngestPipeline, STAGES
+from utils.pdf_source import open_pdf
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class Checkpoint:
+    """Append-only JSONL log of finished files; files already logged as 'ok' are skipped on resume."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        record = json.loads(line)
+                        if record.get("status") == "ok":
+                            self.done[record["file"]] = record
+
+    def record(self, entry: dict) -> None:
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            if entry.get("status") == "ok":
+                self.done[entry["file"]] = entry
+
+
+def build_pipeline(use_pinecone: bool) -> IngestPipeline:
+    documentai_client = clients.documentai_client()
+    processor_name = documentai_client.processor_path(
+        config.PROJECT_ID, config.DOCUMENT_AI_LOCATION, config.PROCESSOR_ID
+    )
+
+    rag_index = None
+    if use_pinecone:
+        if not os.getenv("PINECONE_API_KEY"):
+            raise ValueError("PINECONE_API_KEY environment variable not set (use --no-pinecone to skip upserts).")
+        rag_index = clients.pinecone_index(config.RAG_INDEX_NAME)
+
+    return IngestPipeline(
+        documentai_client=documentai_client,
+        processor_name=processor_name,
+        rag_index=rag_index,
+        skip_keywords=config.SKIP_KEYWORDS,
+    )
+
+
+def ingest_one(pipeline: IngestPipeline, path: str, doc_type: str, user_id: str) -> dict:
+    with open_pdf(path) as doc:
+        pages = doc.page_count
+    start = time.perf_counter()
+    result = pipeline.run(path, doc_type, user_id)
+    return {
+        "file": os.path.abspath(path),
+        "status": "ok",
+        "doc_id": result["doc_id"],
+        "pages": pages,
+        "chunks": result["chunks"],
+        "vectors": result["vectors"],
+        "vectors_failed": result.get("vectors_failed", 0),
+        "cache_hit": result["cache_hit"],
+        "skipped_pages": result.get("skipped_pages"),
+        "pinecone_error": result["pinecone_error"],
+        "total_ms": round((time.perf_counter() - start) * 1000, 1),
+        "timings_ms": result["timings_ms"],
+    }
+
+
+def report(entries: list[dict], elapsed: float, failed: int) -> None:
+    minutes = max(elapsed, 1e-9) / 60
+    pages = sum(e["pages"] for e in entries)
+    print("\n===== Bulk ingest report =====")
+    print(f"Documents: {len(entries)} ingested, {failed} failed in {elapsed:.1f}s")
+    print(f"Throughput: {len(entries) / minutes:.1f} docs/min, {pages / minutes:.1f} pages/min")
+    print(f"{'stage':<10} {'n':>5} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10}")
+    for stage in STAGES + ("total",):
+        values = [e["total_ms"] if stage == "total" else e["timings_ms"][stage]
+                  for e in entries if stage == "total" or stage in e["timings_ms"]]
+        if values:
+            print(f"{stage:<10} {len(values):>5} {percentile(values, 50):>10.1f} "
+                  f"{percentile(values, 90):>10.1f} {percentile(values, 99):>10.1f}")
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Bulk-ingest PDFs into Pinecone/Firestore.")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories or glob patterns")
+    parser.add_argument("--user-id", required=True)
+    parser.add_argument("--doc-type", default="auto", choices=["electronic", "scanned", "auto"])
+    parser.add_argument("--concurrency", type=int, default=4, help="documents processed at once")
+    parser.add_argument("--checkpoint", default="bulk_ingest_checkpoint.jsonl")
+    parser.add_argument("--no-pinecone", action="store_true", help="skip embedding and Pinecone upserts")
+    args = parser.parse_args()
+
+    files = []
+    for item in args.inputs:
+        if os.path.isdir(item):
+            files.extend(glob.glob(os.path.join(item, "**", "*.pdf"), recursive=True))
+        else:
+            files.extend(p for p in glob.glob(item) if p.lower().endswith(".pdf"))
+    files = sorted(dict.fromkeys(os.path.abspath(f) for f in files))
+
+    checkpoint = Checkpoint(args.checkpoint)
+    todo = [f for f in files if f not in checkpoint.done]
+    print(f"[BULK] {len(files)} PDFs found, {len(files) - len(todo)} already done, {len(todo)} to ingest")
+    if not todo:
+        return
+
+    pipeline = build_pipeline(use_pinecone=not args.no_pinecone)
+    entries, failed = [], 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = {pool.submit(ingest_one, pipeline, f, args.doc_type, args.user_id): f for f in todo}
+        for n, future in enumerate(as_completed(futures), start=1):
+            path = futures[future]
+            try:
+                entry = future.result()
+                entries.append(entry)
+                print(f"[BULK] {n}/{len(todo)} ✅ {os.path.basename(path)} -> {entry['doc_id']} "
+                      f"({entry['pages']} pages, {entry['total_ms']:.0f} ms)")
+            except Exception as e:
+                failed += 1
+                entry = {"file": path, "status": "failed", "error": str(e)}
+                print(f"[BULK] {n}/{len(todo)} ❌ {os.path.basename(path)}: {e}")
+            checkpoint.record(entry)
+
+    report(entries, time.perf_counter() - started, failed)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import os
+
 PROJECT_ID = "hip-well-472414-c5"
 
 PROCESSOR_ID = "dbab5c8c3c8d83b"
@@ -11,3 +13,163 @@ GEMINI_MODEL = "gemini-2.5-flash"
 PINECONE_ENVIRONMENT = "us-east-1"  # or whatever environment your index is in
 RAG_INDEX_NAME= "legal-rag-index"
 SKIP_KEYWORDS = ["aadhaar", "passport", "voter id", "pan card", "self attested"]
+# Optional extra skip markers (e.g. ID-document phrases in other languages), one per line
+SKIP_KEYWORDS_FILE = os.getenv("SKIP_KEYWORDS_FILE")
+if SKIP_KEYWORDS_FILE and os.path.exists(SKIP_KEYWORDS_FILE):
+    with open(SKIP_KEYWORDS_FILE, encoding="utf-8") as _f:
+        SKIP_KEYWORDS += [line.strip() for line in _f if line.strip() and not line.startswith("#")]
+
+# PyMuPDF extraction: PDFs with at least this many pages are split into page
+# ranges and extracted in a process pool; shorter ones stay on the serial path.
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", os.cpu_count() or 1))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+
+# Document AI OCR: PDFs are split into shards of at most DOCUMENT_AI_SHARD_PAGES
+# pages (the online process_document limit) and sent concurrently.
+DOCUMENT_AI_SHARD_PAGES = int(os.getenv("DOCUMENT_AI_SHARD_PAGES", "15"))
+DOCUMENT_AI_MAX_IN_FLIGHT = int(os.getenv("DOCUMENT_AI_MAX_IN_FLIGHT", "4"))
+DOCUMENT_AI_MAX_RETRIES = int(os.getenv("DOCUMENT_AI_MAX_RETRIES", "3"))
+
+# Uploads are streamed to disk in UPLOAD_CHUNK_SIZE pieces and rejected as
+# soon as they pass MAX_UPLOAD_BYTES.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+EMBEDDING_MODEL = "text-embedding-004"
+
+# get_embeddings request limits for EMBEDDING_MODEL (texts and total tokens per
+# call; longer single inputs are truncated by the API). Batches run
+# concurrently, at most EMBEDDING_MAX_CONCURRENCY at a time.
+EMBEDDING_BATCH_MAX_TEXTS = int(os.getenv("EMBEDDING_BATCH_MAX_TEXTS", "250"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "20000"))
+EMBEDDING_MAX_INPUT_TOKENS = int(os.getenv("EMBEDDING_MAX_INPUT_TOKENS", "2048"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+
+# Interactive endpoints embed through a micro-batcher: single texts from
+# concurrent requests are held up to EMBEDDING_COALESCE_MAX_WAIT_MS and sent
+# together, at most EMBEDDING_COALESCE_MAX_BATCH per call.
+EMBEDDING_COALESCE_MAX_BATCH = int(os.getenv("EMBEDDING_COALESCE_MAX_BATCH", "64"))
+EMBEDDING_COALESCE_MAX_WAIT_MS = float(os.getenv("EMBEDDING_COALESCE_MAX_WAIT_MS", "5"))
+
+# Embedding cache keyed by (model, text hash): a per-process LRU capped at
+# EMBEDDING_CACHE_MAX_BYTES in front of a memory-mapped store under
+# EMBEDDING_CACHE_DIR that all workers share.
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "uploads/embedding_cache")
+
+# Content-addressed ingest cache (extracted text, chunks, embeddings, OCR'd pages)
+INGEST_CACHE_ENABLED = os.getenv("INGEST_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+INGEST_CACHE_DIR = os.getenv("INGEST_CACHE_DIR", "uploads/ingest_cache")
+
+# Ingest jobs (/upload). "memory" keeps the queue in the API process;
+# "firestore" stores it in Firestore so separate ingest_worker.py processes
+# can drain it (set INGEST_RUN_WORKERS_IN_API=false on the API then).
+INGEST_QUEUE_BACKEND = os.getenv("INGEST_QUEUE_BACKEND", "memory")
+INGEST_QUEUE_MAXSIZE = int(os.getenv("INGEST_QUEUE_MAXSIZE", "100"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_RUN_WORKERS_IN_API = os.getenv("INGEST_RUN_WORKERS_IN_API", "true").lower() not in ("0", "false", "no")
+INGEST_JOBS_COLLECTION = "ingest_jobs"
+# A Firestore job claimed by a worker is leased for INGEST_JOB_LEASE_SECONDS and
+# the lease is renewed while it runs; a job whose worker died is re-claimed
+# by another worker once its lease expires.
+INGEST_JOB_LEASE_SECONDS = float(os.getenv("INGEST_JOB_LEASE_SECONDS", "300"))
+
+# "auto" extraction: pages whose PyMuPDF text layer has fewer than this many
+# non-whitespace characters are treated as scanned and sent to Document AI.
+AUTO_OCR_MIN_PAGE_CHARS = int(os.getenv("AUTO_OCR_MIN_PAGE_CHARS", "25"))
+
+# Token budgets. CHUNK_MODE="tokens" sizes ingest chunks by estimated tokens
+# (EMBEDDING_CHUNK_TOKENS, well under text-embedding-004's 2048-token input
+# limit) instead of 1500 characters. PROMPT_CONTEXT_TOKENS caps the document
+# context packed into the /summarize, /clauses and /risks Gemini prompts.
+# TOKEN_ESTIMATE_SCALE corrects the local estimator (see bench_token_estimator.py).
+CHUNK_MODE = os.getenv("CHUNK_MODE", "chars")
+EMBEDDING_CHUNK_TOKENS = int(os.getenv("EMBEDDING_CHUNK_TOKENS", "384"))
+EMBEDDING_CHUNK_OVERLAP_TOKENS = int(os.getenv("EMBEDDING_CHUNK_OVERLAP_TOKENS", "48"))
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "200000"))
+TOKEN_ESTIMATE_SCALE = float(os.getenv("TOKEN_ESTIMATE_SCALE", "1.0"))
+
+# Local copy of the document vectors ingested by this API process's workers,
+# so /query can rank a document's chunks locally instead of asking Pinecone.
+# Each document's vectors are saved under LOCAL_DOC_INDEX_DIR and memory-mapped
+# on first query; at most LOCAL_DOC_INDEX_CACHE_DOCS documents stay loaded.
+# Only used when ingest workers run in the API process.
+LOCAL_DOC_INDEX_ENABLED = os.getenv("LOCAL_DOC_INDEX_ENABLED", "true").lower() not in ("0", "false", "no")
+LOCAL_DOC_INDEX_DIR = os.getenv("LOCAL_DOC_INDEX_DIR", "uploads/local_doc_index")
+LOCAL_DOC_INDEX_CACHE_DOCS = int(os.getenv("LOCAL_DOC_INDEX_CACHE_DOCS", "256"))
+
+# Rulebook (static reference vectors in Pinecone). rulebook_snapshot.py copies
+# it into RULEBOOK_MIRROR_DIR; the API then serves rulebook queries from that
+# local copy instead of Pinecone. The rulebook is small, so by default every
+# query is an exact scan. RULEBOOK_MIRROR_NPROBE > 0 switches to the IVF
+# layer (probing that many clusters), but only if its recall@k against the
+# exact scan on RULEBOOK_MIRROR_RECALL_QUERIES sampled queries is at least
+# RULEBOOK_MIRROR_MIN_RECALL when the snapshot loads; otherwise the exact
+# scan is kept.
+RULEBOOK_INDEX_NAME = "legal-doc-index"
+RULEBOOK_MIRROR_ENABLED = os.getenv("RULEBOOK_MIRROR_ENABLED", "true").lower() not in ("0", "false", "no")
+RULEBOOK_MIRROR_DIR = os.getenv("RULEBOOK_MIRROR_DIR", "uploads/rulebook_mirror")
+RULEBOOK_MIRROR_NPROBE = int(os.getenv("RULEBOOK_MIRROR_NPROBE", "0"))
+RULEBOOK_MIRROR_MIN_RECALL = float(os.getenv("RULEBOOK_MIRROR_MIN_RECALL", "0.95"))
+RULEBOOK_MIRROR_RECALL_QUERIES = int(os.getenv("RULEBOOK_MIRROR_RECALL_QUERIES", "100"))
+
+# Pinecone upserts are split into batches of at most PINECONE_UPSERT_BATCH_SIZE
+# vectors / PINECONE_UPSERT_MAX_BYTES (under the 2 MB request limit) and sent
+# concurrently; each batch is retried up to PINECONE_UPSERT_MAX_RETRIES times.
+PINECONE_UPSERT_BATCH_SIZE = int(os.getenv("PINECONE_UPSERT_BATCH_SIZE", "100"))
+PINECONE_UPSERT_MAX_BYTES = int(os.getenv("PINECONE_UPSERT_MAX_BYTES", str(1536 * 1024)))
+PINECONE_UPSERT_MAX_IN_FLIGHT = int(os.getenv("PINECONE_UPSERT_MAX_IN_FLIGHT", "4"))
+PINECONE_UPSERT_MAX_RETRIES = int(os.getenv("PINECONE_UPSERT_MAX_RETRIES", "3"))
+
+# Per-document BM25 indexes over the stored chunks, built at ingest. /query
+# fuses them with the vector results, or answers from them alone when the
+# question names a clause ("clause 7(b)") or quotes a term.
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "uploads/lexical_index")
+LEXICAL_INDEX_CACHE_ENTRIES = int(os.getenv("LEXICAL_INDEX_CACHE_ENTRIES", "256"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Fixed rulebook queries (utils/static_queries.py) are cached per rulebook
+# version. A Pinecone-served rulebook cannot report changes, so its cached
+# results are also refreshed after STATIC_QUERY_TTL_SECONDS (0 = never).
+STATIC_QUERY_TTL_SECONDS = float(os.getenv("STATIC_QUERY_TTL_SECONDS", "3600"))
+
+# /view-rulebook-source: at most TERM_EXPLANATION_MAX_CONCURRENCY Gemini calls
+# in flight per request; explanations are cached per (term, rulebook version).
+TERM_EXPLANATION_MAX_CONCURRENCY = int(os.getenv("TERM_EXPLANATION_MAX_CONCURRENCY", "5"))
+TERM_EXPLANATION_CACHE_ENTRIES = int(os.getenv("TERM_EXPLANATION_CACHE_ENTRIES", "4096"))
+
+# Per-document answer cache for /query and /query-rag: a question is served
+# from the cache when its normalized text matches a cached one, or when its
+# embedding's cosine similarity to a cached question's reaches
+# ANSWER_CACHE_SIMILARITY.
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+
+# /query-rag hedging: Vertex RAG answers first; the clauses-only Gemini call is
+# started only if RAG has not answered within its observed p95 latency
+# (clamped to HEDGE_MIN_DELAY_MS..HEDGE_MAX_DELAY_MS; HEDGE_DEFAULT_DELAY_MS
+# until HEDGE_MIN_SAMPLES calls have been timed).
+HEDGE_MIN_DELAY_MS = float(os.getenv("HEDGE_MIN_DELAY_MS", "300"))
+HEDGE_MAX_DELAY_MS = float(os.getenv("HEDGE_MAX_DELAY_MS", "8000"))
+HEDGE_DEFAULT_DELAY_MS = float(os.getenv("HEDGE_DEFAULT_DELAY_MS", "2000"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+QUERY_RAG_TIMEOUT_SECONDS = float(os.getenv("QUERY_RAG_TIMEOUT_SECONDS", "30"))
+QUERY_LLM_TIMEOUT_SECONDS = float(os.getenv("QUERY_LLM_TIMEOUT_SECONDS", "30"))
+
+# utils/clients.py shares one instance of each Google Cloud / Vertex /
+# Pinecone client per process. CLIENT_REUSE=false builds a new client on
+# every use instead (the old behaviour), e.g. to rule out stale connections.
+CLIENT_REUSE = os.getenv("CLIENT_REUSE", "true").lower() not in ("0", "false", "no")
+CLIENT_SCOPED_CACHE_SIZE = int(os.getenv("CLIENT_SCOPED_CACHE_SIZE", "256"))
+
+# Vertex RAG (/query-rag) retrieves only from the asking user's document: its
+# file in the corpus, from the rag_file_mapping saved by /upload-rag. With
+# RAG_REQUIRE_FILE_SCOPE=false, documents without a mapping fall back to
+# searching the whole corpus (other users' files included).
+RAG_REQUIRE_FILE_SCOPE = os.getenv("RAG_REQUIRE_FILE_SCOPE", "true").lower() not in ("0", "false", "no")
+# Documents whose rag_file_mapping is kept in memory (LRU) between /query-rag calls
+RAG_FILE_SCOPE_CACHE_SIZE = int(os.getenv("RAG_FILE_SCOPE_CACHE_SIZE", "4096"))
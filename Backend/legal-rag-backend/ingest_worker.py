@@ -0,0 +1,30 @@
+# ingest_worker.py
+# Standalone ingest worker for the durable (Firestore) job queue.
+# Run the API with INGEST_QUEUE_BACKEND=firestore INGEST_RUN_WORKERS_IN_API=false
+# and scale ingest separately with:  python ingest_worker.py --workers 4
+import argparse
+import asyncio
+
+import config
+from utils.ingest_jobs import IngestWorkerPool, make_job_queue
+from utils.ingest_pipeline import STAGES
+
+
+async def main(workers: int):
+    # app builds the Document AI / Pinecone clients and the ingest pipeline
+    from app import run_ingest_job
+
+    queue = make_job_queue("firestore", stages=STAGES)
+    pool = IngestWorkerPool(queue, run_ingest_job, concurrency=workers)
+    pool.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await pool.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drain the Firestore ingest job queue.")
+    parser.add_argument("--workers", type=int, default=config.INGEST_WORKERS)
+    args = parser.parse_args()
+    asyncio.run(main(args.workers))
@@ -0,0 +1,43 @@
+# rulebook_snapshot.py
+# Local mirror of the Pinecone rulebook index (legal-doc-index), served
+# in-process by the API (see utils/rulebook_mirror.py).
+#   python rulebook_snapshot.py snapshot            # first export
+#   python rulebook_snapshot.py refresh             # re-export; a running API picks it up
+#   python rulebook_snapshot.py recall [--k 5] [--queries 200] [--exact]
+import argparse
+
+import config
+from utils import clients
+from utils.ivf_index import IVFIndex
+from utils.rulebook_mirror import ExactScan, RulebookMirror, recall_at_k, sample_queries, snapshot_rulebook
+
+
+def pinecone_rulebook():
+    return clients.pinecone_index(config.RULEBOOK_INDEX_NAME)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["snapshot", "refresh", "recall"])
+    parser.add_argument("--path", default=config.RULEBOOK_MIRROR_DIR)
+    parser.add_argument("--nlist", type=int, default=None, help="IVF clusters (default ~4*sqrt(n))")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--nprobe", type=int, default=config.RULEBOOK_MIRROR_NPROBE or 8)
+    parser.add_argument("--exact", action="store_true", help="compare against an exact local scan, not Pinecone")
+    args = parser.parse_args()
+
+    if args.command in ("snapshot", "refresh"):
+        before = RulebookMirror(args.path).info
+        info = snapshot_rulebook(pinecone_rulebook(), args.path, nlist=args.nlist)
+        if before:
+            print(f"previous snapshot: {before['vectors']} vectors; now {info['vectors']}")
+        print(info)
+    else:
+        local = IVFIndex.load(args.path, nprobe=args.nprobe)
+        reference = ExactScan(local) if args.exact else pinecone_rulebook()
+        queries = sample_queries(local, args.queries, args.noise)
+        report = recall_at_k(local, reference, queries, k=args.k)
+        print(f"recall@{args.k} vs {'exact scan' if args.exact else 'Pinecone'} "
+              f"(nprobe={local.nprobe}, {len(local)} vectors): {report}")
@@ -0,0 +1,107 @@
+# Sharded Document AI OCR against a fake DocumentProcessorServiceClient.
+# Run with: python -m pytest test_document_ai_ocr.py
+import threading
+import time
+from types import SimpleNamespace
+
+import fitz  # PyMuPDF
+import pytest
+from google.api_core import exceptions as gexc
+
+from utils.document_ai_ocr import ocr_pdf_pages
+from utils.pdf_extraction import extract_text_from_pdf
+
+
+def _make_pdf(page_count: int) -> bytes:
+    doc = fitz.open()
+    for i in range(page_count):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"PAGE {i}")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def _segment(start: int, end: int):
+    return SimpleNamespace(start_index=start, end_index=end)
+
+
+class FakeDocumentAIClient:
+    """Echoes each shard page's text layer back as a one-paragraph Document AI page."""
+
+    def __init__(self, fail_first=0, delay=0.0):
+        self.calls = 0
+        self.shard_sizes = []
+        self.fail_first = fail_first
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def process_document(self, request):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            if call <= self.fail_first:
+                raise gexc.ServiceUnavailable("try again")
+
+            content = request["raw_document"]["content"]
+            with fitz.open(stream=content, filetype="pdf") as doc:
+                page_texts = [p.get_text("text").strip() for p in doc]
+            self.shard_sizes.append(len(page_texts))
+
+            text, pages = "", []
+            for page_text in page_texts:
+                start = len(text)
+                text += page_text
+                layout = SimpleNamespace(text_anchor=SimpleNamespace(text_segments=[_segment(start, len(text))]))
+                pages.append(SimpleNamespace(paragraphs=[SimpleNamespace(layout=layout)]))
+            return SimpleNamespace(document=SimpleNamespace(text=text, pages=pages))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def test_pages_are_sharded_and_stitched_in_order():
+    client = FakeDocumentAIClient(delay=0.02)
+    page_texts = ocr_pdf_pages(client, "processor", _make_pdf(37), shard_pages=10, max_in_flight=2)
+
+    assert client.shard_sizes and max(client.shard_sizes) <= 10
+    assert sorted(client.shard_sizes) == [7, 10, 10, 10]
+    assert client.max_in_flight <= 2
+    assert [page_texts[i] for i in range(37)] == [f"PAGE {i}" for i in range(37)]
+
+
+def test_page_subset_keeps_original_page_numbers():
+    client = FakeDocumentAIClient()
+    page_texts = ocr_pdf_pages(client, "processor", _make_pdf(8), page_numbers=[6, 1, 4], shard_pages=2)
+
+    assert page_texts == {1: "PAGE 1", 4: "PAGE 4", 6: "PAGE 6"}
+
+
+def test_failed_shard_is_retried_on_its_own(monkeypatch):
+    monkeypatch.setattr("utils.document_ai_ocr.time.sleep", lambda _: None)
+    client = FakeDocumentAIClient(fail_first=1)
+    page_texts = ocr_pdf_pages(client, "processor", _make_pdf(4), shard_pages=2, max_in_flight=1, max_retries=2)
+
+    assert client.calls == 3  # two shards + one retry
+    assert len(page_texts) == 4
+
+
+def test_retries_exhausted_raises(monkeypatch):
+    monkeypatch.setattr("utils.document_ai_ocr.time.sleep", lambda _: None)
+    client = FakeDocumentAIClient(fail_first=10)
+    with pytest.raises(gexc.ServiceUnavailable):
+        ocr_pdf_pages(client, "processor", _make_pdf(2), max_retries=1)
+
+
+def test_document_ai_method_applies_skip_keywords():
+    client = FakeDocumentAIClient()
+    text = extract_text_from_pdf(client, "processor", _make_pdf(3), method="document_ai",
+                                 skip_keywords=["page 1"])
+
+    assert text == "PAGE 0\n\nPAGE 2"
@@ -0,0 +1,53 @@
+# Clause labelling and exact clause lookup in the per-document lexical index.
+# Run with: python -m pytest test_lexical_index.py
+from utils.lexical_index import BM25Index, clause_labels, exact_references
+
+
+def test_clause_labels_numbered_headings():
+    texts = ["1. Definitions apply.", "(a) Tenant means the lessee.", "2) Rent is due monthly.", "continued text"]
+    assert clause_labels(texts) == ["1", "1(a)", "2", "2"]
+
+
+def test_clause_labels_capitalised_headings():
+    texts = [
+        "Clause 7. Termination by either party.",
+        "(b) Notice must be in writing.",
+        "Section 4.2 Payment terms apply.",
+        "ARTICLE 9 Governing law.",
+    ]
+    assert clause_labels(texts) == ["7", "7(b)", "4.2", "9"]
+
+
+def test_clause_labels_ignore_leading_plain_numbers():
+    texts = [
+        "12. Payment terms.",
+        "30 days after the invoice date the amount falls due.",
+        "2024 rates apply to renewals.",
+        "12.3 Late payment interest.",
+    ]
+    assert clause_labels(texts) == ["12", "12", "12", "12.3"]
+
+
+def test_exact_matches_ignores_continuation_starting_with_number():
+    texts = [
+        "12. Payment is due monthly.",
+        "30 days notice is required before any change.",
+        "Clause 30. Governing law is that of India.",
+    ]
+    index = BM25Index(texts)
+    question = "What does clause 30 say?"
+    hits = index.exact_matches(exact_references(question), question)
+    assert [i for i, _ in hits] == [2]
+
+
+def test_exact_matches_finds_capitalised_clause():
+    texts = [
+        "Section 4.2 Payment is due on the first day of each month.",
+        "Clause 7. Either party may terminate with notice.",
+        "(b) Notice must be given thirty days in advance.",
+        "Section 8. Disputes about termination under clause 7(b) go to arbitration.",
+    ]
+    index = BM25Index(texts)
+    question = "What does clause 7(b) say about notice?"
+    hits = index.exact_matches(exact_references(question), question)
+    assert [i for i, _ in hits] == [2, 3]
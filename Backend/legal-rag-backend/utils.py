@@ -1,6 +1,5 @@
 # utils.py
 
-import re
 import numpy as np
 from vertexai.language_models import TextEmbeddingModel
 from google.cloud import documentai
@@ -9,38 +8,11 @@ from google.cloud import documentai
 embedding_model = TextEmbeddingModel.from_pretrained("text-embedding-004")
 
 
-# --- Text Processing Functions ---
-
-def split_into_clauses(text: str) -> list[str]:
-    """Splits document text into clauses for embedding."""
-    # This regex splits by multiple newlines or by numbered lists (e.g., "1. ", "2. ")
-    splits = re.split(r'\n{2,}|(\d+\.\s)', text)
-    # Filter out None values and short/empty strings
-    clauses = [s.strip() for s in splits if s and len(s.strip()) > 50]
-    return clauses
-
 def embed_text(text: str) -> np.ndarray:
     """Generates an embedding vector for a given text."""
     embeddings = embedding_model.get_embeddings([text])
     return np.array(embeddings[0].values, dtype="float32")
 
-def retrieve_top_k(query_emb: np.ndarray, vector_store: dict, k: int = 5) -> list[str]:
-    """Retrieves top-k most similar clauses using cosine similarity."""
-    clauses = list(vector_store.values())
-    sims = []
-    for clause_data in clauses:
-        vec = clause_data["embedding"]
-        # Calculate cosine similarity
-        sim = np.dot(query_emb, vec) / (np.linalg.norm(query_emb) * np.linalg.norm(vec))
-        sims.append((clause_data["text"], sim))
-
-    # Sort by similarity score in descending order
-    sims.sort(key=lambda x: x[1], reverse=True)
-
-    # Return the text of the top k clauses
-    return [text for text, score in sims[:k]]
-
-
 # --- Document AI PDF Extraction ---
 
 def _get_text(layout: documentai.Document.Page.Layout, text: str) -> str:
@@ -0,0 +1,138 @@
+# answer_cache.py
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+import config
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+
+
+def normalize_question(question: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form used for exact matches."""
+    return " ".join(_PUNCT_RE.sub(" ", question.casefold()).split())
+
+
+def _percentiles(samples) -> dict:
+    if not samples:
+        return {"count": 0, "p50_ms": None, "p95_ms": None}
+    values = np.asarray(samples) * 1000
+    return {"count": len(values), "p50_ms": round(float(np.percentile(values, 50)), 1),
+            "p95_ms": round(float(np.percentile(values, 95)), 1)}
+
+
+class SemanticAnswerCache:
+    """
+    Answers to document questions, scoped per (user_id, doc_id, variant). The
+    variant is the endpoint plus whatever the answer depends on, such as the
+    document's chunk fingerprint. A question is answered from the cache when
+    its normalized text matches a cached one. Failing that, it is answered when
+    its embedding's cosine similarity to a cached question's is at least
+    `threshold`. Entries expire after `ttl` seconds, the least recently used go
+    beyond `max_entries`, and invalidate() drops a document's entries when it
+    is re-ingested.
+    """
+
+    def __init__(self, threshold: float = None, ttl: float = None, max_entries: int = None):
+        self.threshold = config.ANSWER_CACHE_SIMILARITY if threshold is None else threshold
+        self.ttl = config.ANSWER_CACHE_TTL_SECONDS if ttl is None else ttl
+        self.max_entries = max_entries or config.ANSWER_CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()  # (scope, normalized question) -> (embedding, answer, created_at)
+        self._scopes = {}              # scope -> set of entry keys
+        self._counts = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "invalidated": 0}
+        self._latency = {"hit": deque(maxlen=1000), "miss": deque(maxlen=1000)}
+        self._lock = threading.Lock()
+
+    def _drop(self, key) -> None:
+        self._entries.pop(key, None)
+        keys = self._scopes.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._scopes[key[0]]
+
+    def _expired(self, entry, now: float) -> bool:
+        return bool(self.ttl) and now - entry[2] > self.ttl
+
+    def get(self, scope: tuple, question: str, embedding=None):
+        """
+        (answer, similarity) for a cached question in `scope`, else None.
+        Without an embedding only the exact (normalized) match is tried.
+        """
+        key = (scope, normalize_question(question))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counts["exact_hits"] += 1
+                return entry[1], 1.0
+            if embedding is None:
+                return None
+
+            best_key, best = None, self.threshold
+            query = np.asarray(embedding, dtype="float32")
+            query = query / (np.linalg.norm(query) or 1.0)
+            for other in list(self._scopes.get(scope, ())):
+                cached = self._entries[other]
+                if self._expired(cached, now):
+                    self._drop(other)
+                    continue
+                if cached[0] is None:
+                    continue
+                similarity = float(np.dot(query, cached[0]))
+                if similarity >= best:
+                    best_key, best = other, similarity
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self._counts["semantic_hits"] += 1
+            return self._entries[best_key][1], best
+
+    def put(self, scope: tuple, question: str, answer, embedding=None) -> None:
+        key = (scope, normalize_question(question))
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype="float32")
+            embedding = embedding / (np.linalg.norm(embedding) or 1.0)
+        with self._lock:
+            self._entries[key] = (embedding, answer, time.time())
+            self._entries.move_to_end(key)
+            self._scopes.setdefault(scope, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, user_id: str, doc_id: str) -> int:
+        """Drop every cached answer for a document (all variants)."""
+        with self._lock:
+            scopes = [s for s in self._scopes if s[:2] == (user_id, doc_id)]
+            keys = [k for s in scopes for k in self._scopes[s]]
+            for key in keys:
+                self._drop(key)
+            self._counts["invalidated"] += len(keys)
+            return len(keys)
+
+    def record_latency(self, hit: bool, seconds: float) -> None:
+        """End-to-end request time, split by whether the answer came from the cache."""
+        with self._lock:
+            self._latency["hit" if hit else "miss"].append(seconds)
+            if not hit:
+                self._counts["misses"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counts,
+                "entries": len(self._entries),
+                "documents": len({s[:2] for s in self._scopes}),
+                "hit_latency": _percentiles(self._latency["hit"]),
+                "miss_latency": _percentiles(self._latency["miss"]),
+            }
+
+
+answer_cache = SemanticAnswerCache() if config.ANSWER_CACHE_ENABLED else None
@@ -1,64 +1,142 @@
 import re
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from typing import Iterator
+
+from utils.tokens import estimate_tokens
+
+# Clause headings: "\n1)", "\n1. ", "\na. ", "\nA. ", "\n(iv) "
+_HEADING_RE = re.compile(r'\n\d+\)|\n\d+\.\s|\n[a-z]\.\s|\n[A-Z]\.\s|\n\(\w+\)\s')
+
+# Preferred cut points inside an over-long clause, best first (never mid-word)
+_SEPARATORS = ("\n\n", "\n", ". ", "! ", "? ", " ")
+
+
+def _strip_span(text: str, start: int, end: int):
+    """Shrink [start, end) to exclude surrounding whitespace. None if nothing is left."""
+    segment = text[start:end]
+    stripped = segment.strip()
+    if not stripped:
+        return None
+    start += len(segment) - len(segment.lstrip())
+    return start, start + len(stripped)
+
+
+def iter_clauses(text: str) -> Iterator[tuple[str, int, int]]:
+    """
+    Single pass over `text` with the precompiled heading regex.
+    Yields (type, start, end) character spans: the "preamble" before the first
+    heading, then one "clause" per heading (heading included).
+    """
+    span_start, span_type = 0, "preamble"
+    for match in _HEADING_RE.finditer(text):
+        span = _strip_span(text, span_start, match.start())
+        if span:
+            yield span_type, span[0], span[1]
+        span_start, span_type = match.start() + 1, "clause"  # drop the heading's leading newline
+    span = _strip_span(text, span_start, len(text))
+    if span:
+        yield span_type, span[0], span[1]
+
 
 def split_into_clauses(text: str) -> list[dict]:
     """
     Splits document into logical clauses by detecting numbered or lettered headings.
     Returns list of dicts with 'content' and 'type' keys.
     """
-    # Regex for headings: numbers, letters, Roman numerals, etc.
-    pattern = r'(\n\d+\)|\n\d+\.\s|\n[a-z]\.\s|\n[A-Z]\.\s|\n\(\w+\)\s)'
-    
-    parts = re.split(pattern, text)
-    grouped_clauses = []
+    return [{"content": text[start:end], "type": type_} for type_, start, end in iter_clauses(text)]
+
+
+def _cut_point(text: str, start: int, limit: int, min_size: int) -> int:
+    """Last separator-aligned cut in (start + min_size, limit]; hard cut at limit if none."""
+    for sep in _SEPARATORS:
+        i = text.rfind(sep, start + min_size, limit)
+        if i != -1:
+            return i + len(sep)
+    return limit
 
-    # Preamble before the first heading
-    if parts and parts[0].strip():
-        grouped_clauses.append({"content": parts[0].strip(), "type": "preamble"})
 
-    for i in range(1, len(parts), 2):
-        heading = parts[i].strip() if i < len(parts) else ""
-        body = parts[i + 1].strip() if i + 1 < len(parts) else ""
-        if heading or body:
-            grouped_clauses.append({"content": f"{heading} {body}".strip(), "type": "clause"})
+def _split_span(text: str, start: int, end: int, chunk_size: int,
+                chunk_overlap: int) -> Iterator[tuple[int, int]]:
+    """Cut [start, end) into windows of at most chunk_size chars, overlapping by ~chunk_overlap."""
+    min_size = max(1, chunk_size // 4)  # don't cut off tiny fragments at an early separator
+    while end - start > chunk_size:
+        cut = _cut_point(text, start, start + chunk_size, min_size)
+        yield start, cut
+        next_start = max(cut - chunk_overlap, start + 1)
+        if next_start < cut:
+            # start the overlap on a word boundary
+            space = text.find(" ", next_start, cut)
+            if space != -1:
+                next_start = space + 1
+        start = next_start
+    yield start, end
 
-    return [c for c in grouped_clauses if c["content"]]
 
-def chunk_text(text: str, chunk_size: int = 1500, chunk_overlap: int = 200) -> list[dict]:
+def _split_span_tokens(text: str, start: int, end: int, max_tokens: int,
+                       overlap_tokens: int, tokens: int = None) -> Iterator[tuple[int, int, int]]:
+    """
+    Cut [start, end) into windows of at most max_tokens estimated tokens.
+    The char window comes from the span's own chars-per-token ratio; a
+    window that is still over budget (denser text) is re-cut smaller.
+    Yields (start, end, token estimate).
+    """
+    if tokens is None:
+        tokens = estimate_tokens(text[start:end])
+    if tokens <= max_tokens:
+        yield start, end, tokens
+        return
+    chars_per_token = (end - start) / tokens
+    window = max(1, int(max_tokens * chars_per_token))
+    overlap = int(overlap_tokens * chars_per_token)
+    for sub_start, sub_end in _split_span(text, start, end, window, overlap):
+        if sub_end - sub_start < end - start:
+            yield from _split_span_tokens(text, sub_start, sub_end, max_tokens, overlap_tokens)
+        else:
+            yield sub_start, sub_end, tokens  # can't shrink any further
+
+
+def iter_chunks(text: str, chunk_size: int = 1500, chunk_overlap: int = 200,
+                max_tokens: int = None, overlap_tokens: int = 0) -> Iterator[dict]:
+    """
+    Streaming clause chunker: one pass over the text, chunks yielded as they
+    are found. Clauses longer than chunk_size are cut at the best separator
+    with ~chunk_overlap characters of overlap.
+    Token mode: pass max_tokens (and overlap_tokens) to budget chunks in
+    estimated tokens instead of characters; chunk_size is ignored then.
+    Yields dicts with 'chunk_id', 'content', 'type', 'token_count' and the
+    chunk's 'start' / 'end' character offsets in `text`.
+    """
+    chunk_id = 0
+    for type_, start, end in iter_clauses(text):
+        if max_tokens:
+            pieces = _split_span_tokens(text, start, end, max_tokens, overlap_tokens)
+        else:
+            pieces = ((s, e, None) for s, e in _split_span(text, start, end, chunk_size, chunk_overlap))
+        for sub_start, sub_end, tokens in pieces:
+            span = _strip_span(text, sub_start, sub_end)
+            if not span:
+                continue
+            content = text[span[0]:span[1]]
+            if tokens is None or span != (sub_start, sub_end):
+                tokens = estimate_tokens(content)
+            yield {
+                "chunk_id": chunk_id,
+                "content": content,
+                "type": type_,
+                "token_count": tokens,
+                "start": span[0],
+                "end": span[1],
+            }
+            chunk_id += 1
+
+
+def chunk_text(text: str, chunk_size: int = 1500, chunk_overlap: int = 200,
+               max_tokens: int = None, overlap_tokens: int = 0) -> list[dict]:
     """
     Splits legal text into semantically consistent chunks.
     Step 1: Clause-level split.
-    Step 2: Further splits long clauses with RecursiveCharacterTextSplitter.
-    Returns list of dicts with 'content', 'type', 'chunk_id'.
+    Step 2: Further splits long clauses at separator boundaries, with overlap
+    (in characters, or in estimated tokens when max_tokens is given).
+    Returns list of dicts with 'content', 'type', 'chunk_id', 'token_count', 'start', 'end'.
+    Use iter_chunks() to stream chunks instead.
     """
-    clauses = split_into_clauses(text)
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        separators=["\n\n", "\n", ". ", "! ", "? "]  # avoid splitting mid-word
-    )
-
-    final_chunks = []
-    chunk_counter = 0
-    for c in clauses:
-        content = c["content"]
-        type_ = c["type"]
-
-        if len(content) > chunk_size:
-            sub_chunks = splitter.split_text(content)
-            for sc in sub_chunks:
-                final_chunks.append({
-                    "chunk_id": chunk_counter,
-                    "content": sc.strip(),
-                    "type": type_
-                })
-                chunk_counter += 1
-        else:
-            final_chunks.append({
-                "chunk_id": chunk_counter,
-                "content": content.strip(),
-                "type": type_
-            })
-            chunk_counter += 1
-
-    return final_chunks
+    return list(iter_chunks(text, chunk_size, chunk_overlap, max_tokens, overlap_tokens))
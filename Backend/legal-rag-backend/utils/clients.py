@@ -0,0 +1,193 @@
+# clients.py
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+
+class ClientRegistry:
+    """
+    Process-wide Google Cloud / Vertex / Pinecone clients, each created on
+    first use and then shared (clients are thread-safe and keep their
+    connection pools). Creation time is recorded per client. Per-document
+    objects (e.g. a RAG tool scoped to one file) are registered with
+    scoped=True and kept in an LRU of config.CLIENT_SCOPED_CACHE_SIZE. With
+    reuse=False (config.CLIENT_REUSE) every call builds a fresh client, as the
+    code did before the registry existed.
+    """
+
+    def __init__(self, reuse: bool = None):
+        self.reuse = config.CLIENT_REUSE if reuse is None else reuse
+        self._clients = {}
+        self._scoped = OrderedDict()
+        self._key_locks = {}
+        self._timings = {}  # key -> {"inits", "last_init_ms", "total_init_ms"}
+        self._lock = threading.Lock()
+
+    def _record(self, key, seconds: float) -> None:
+        with self._lock:
+            timing = self._timings.setdefault(key, {"inits": 0, "last_init_ms": 0.0, "total_init_ms": 0.0})
+            timing["inits"] += 1
+            timing["last_init_ms"] = round(seconds * 1000, 1)
+            timing["total_init_ms"] = round(timing["total_init_ms"] + seconds * 1000, 1)
+
+    def _build(self, key, factory):
+        start = time.perf_counter()
+        client = factory()
+        elapsed = time.perf_counter() - start
+        self._record(key, elapsed)
+        print(f"[CLIENTS] Created {_label(key)} in {elapsed * 1000:.0f} ms")
+        return client
+
+    def get(self, key: tuple, factory, scoped: bool = False):
+        """The client for `key`, built with factory() the first time."""
+        if not self.reuse:
+            return self._build(key, factory)
+        if scoped:
+            return self._get_scoped(key, factory)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # One lock per client, so a slow init does not hold up the others
+        with key_lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._build(key, factory)
+                self._clients[key] = client
+            return client
+
+    def _get_scoped(self, key: tuple, factory):
+        with self._lock:
+            client = self._scoped.get(key)
+            if client is not None:
+                self._scoped.move_to_end(key)
+                return client
+        # Cheap local objects: build outside the lock, last writer wins
+        start = time.perf_counter()
+        client = factory()
+        self._record(key[0], time.perf_counter() - start)
+        with self._lock:
+            self._scoped[key] = client
+            while len(self._scoped) > config.CLIENT_SCOPED_CACHE_SIZE:
+                self._scoped.popitem(last=False)
+        return client
+
+    def reset(self, key: tuple = None) -> None:
+        """Drop one cached client (or all); the next get() builds it again."""
+        with self._lock:
+            if key is None:
+                self._clients.clear()
+                self._scoped.clear()
+            else:
+                self._clients.pop(key, None)
+                self._scoped.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "reuse": self.reuse,
+                "cached": sorted(_label(k) for k in self._clients),
+                "scoped_cached": len(self._scoped),
+                "init_timings": {_label(k): dict(v) for k, v in self._timings.items()},
+            }
+
+
+def _label(key: tuple) -> str:
+    return ":".join(str(part) for part in key if part not in (None, ()))
+
+
+registry = ClientRegistry()
+
+
+def rag_retrieval_tool(rag_corpus: str, similarity_top_k: int = 5, vector_distance_threshold: float = 0.5,
+                       rag_file_ids: tuple = ()):
+    """Vertex RAG retrieval tool over a corpus, or only over the given files of it."""
+    def build():
+        from vertexai.generative_models import Tool
+        from vertexai.preview import rag
+        if rag_file_ids:
+            resource = rag.RagResource(rag_corpus=rag_corpus, rag_file_ids=list(rag_file_ids))
+        else:
+            resource = rag.RagResource(rag_corpus=rag_corpus)
+        return Tool.from_retrieval(
+            retrieval=rag.Retrieval(
+                source=rag.VertexRagStore(
+                    rag_resources=[resource],
+                    similarity_top_k=similarity_top_k,
+                    vector_distance_threshold=vector_distance_threshold,
+                )
+            )
+        )
+    key = ("rag_tool", rag_corpus, similarity_top_k, vector_distance_threshold, tuple(rag_file_ids))
+    return registry.get(key, build, scoped=bool(rag_file_ids))
+
+
+def gemini_model(model_name: str = config.GEMINI_MODEL, rag_corpus: str = None, similarity_top_k: int = 5,
+                 vector_distance_threshold: float = 0.5, rag_file_ids: tuple = ()):
+    """
+    GenerativeModel, optionally grounded on a Vertex RAG corpus, or on just
+    rag_file_ids within it (vertexai.init must have run).
+    """
+    def build():
+        from vertexai.generative_models import GenerativeModel
+        if rag_corpus:
+            tool = rag_retrieval_tool(rag_corpus, similarity_top_k, vector_distance_threshold, rag_file_ids)
+            return GenerativeModel(model_name, tools=[tool])
+        return GenerativeModel(model_name)
+    key = ("gemini", model_name, rag_corpus, similarity_top_k if rag_corpus else None,
+           vector_distance_threshold if rag_corpus else None, tuple(rag_file_ids))
+    return registry.get(key, build, scoped=bool(rag_file_ids))
+
+
+def pinecone():
+    def build():
+        from pinecone import Pinecone
+        api_key = os.getenv("PINECONE_API_KEY")
+        if not api_key:
+            raise ValueError("PINECONE_API_KEY environment variable not set.")
+        return Pinecone(api_key=api_key)
+    return registry.get(("pinecone",), build)
+
+
+def pinecone_index(name: str, dimension: int = None):
+    """
+    Handle for a Pinecone index. With `dimension`, a missing index is created
+    first (cosine, serverless aws/us-east-1).
+    """
+    def build():
+        pc = pinecone()
+        if dimension and name not in pc.list_indexes().names():
+            from pinecone import ServerlessSpec
+            pc.create_index(
+                name=name,
+                dimension=dimension,
+                metric="cosine",
+                spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+            )
+        return pc.Index(name)
+    return registry.get(("pinecone_index", name), build)
+
+
+def storage_client():
+    def build():
+        from google.cloud import storage
+        return storage.Client()
+    return registry.get(("gcs",), build)
+
+
+def firestore_client():
+    def build():
+        from google.cloud import firestore
+        return firestore.Client()
+    return registry.get(("firestore",), build)
+
+
+def documentai_client():
+    def build():
+        from google.cloud import documentai
+        return documentai.DocumentProcessorServiceClient()
+    return registry.get(("documentai",), build)
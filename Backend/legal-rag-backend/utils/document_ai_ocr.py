@@ -0,0 +1,129 @@
+# document_ai_ocr.py
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz  # PyMuPDF
+from google.api_core import exceptions as gexc
+from google.cloud import documentai
+
+import config
+from utils.pdf_source import open_pdf
+
+# Errors worth retrying on a single shard; anything else fails the whole OCR.
+RETRYABLE_ERRORS = (
+    gexc.ServiceUnavailable,
+    gexc.DeadlineExceeded,
+    gexc.ResourceExhausted,
+    gexc.InternalServerError,
+    gexc.TooManyRequests,
+)
+
+
+def _get_text(layout: documentai.Document.Page.Layout, text: str) -> str:
+    """Extract text from a Document AI layout segment."""
+    response = ""
+    for segment in layout.text_anchor.text_segments:
+        start = int(segment.start_index)
+        end = int(segment.end_index)
+        response += text[start:end]
+    return response
+
+
+def document_page_texts(document) -> list[str]:
+    """Rebuild each page of a Document AI result paragraph by paragraph."""
+    page_texts = []
+    for page in document.pages:
+        page_text_segments = []
+        for paragraph in page.paragraphs:
+            text = _get_text(paragraph.layout, document.text)
+            if text.strip():
+                page_text_segments.append(text)
+        page_texts.append("\n".join(page_text_segments))
+    return page_texts
+
+
+def split_into_shards(source, page_numbers: list[int] = None,
+                      shard_pages: int = None) -> list[tuple[list[int], bytes]]:
+    """
+    Split a PDF into standalone PDFs of at most `shard_pages` pages.
+    `page_numbers` (0-based) limits the split to a subset of pages.
+    Returns [(original page numbers, shard pdf bytes), ...] in page order.
+    """
+    shard_pages = shard_pages or config.DOCUMENT_AI_SHARD_PAGES
+    shards = []
+    with open_pdf(source) as src:
+        if page_numbers is None:
+            page_numbers = list(range(src.page_count))
+        page_numbers = sorted(page_numbers)
+
+        for i in range(0, len(page_numbers), shard_pages):
+            pages = page_numbers[i:i + shard_pages]
+            with fitz.open() as shard:
+                for page_num in pages:
+                    shard.insert_pdf(src, from_page=page_num, to_page=page_num)
+                shards.append((pages, shard.tobytes()))
+    return shards
+
+
+def _process_shard(documentai_client, processor_name: str, shard: bytes,
+                   max_retries: int) -> list[str]:
+    """OCR one shard, retrying transient errors with jittered exponential backoff."""
+    attempt = 0
+    while True:
+        try:
+            result = documentai_client.process_document(
+                request={
+                    "name": processor_name,
+                    "raw_document": {"content": shard, "mime_type": "application/pdf"},
+                }
+            )
+            return document_page_texts(result.document)
+        except RETRYABLE_ERRORS as e:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            delay = min(2 ** attempt, 30) * (0.5 + random.random() / 2)
+            print(f"[DOCUMENT AI] Shard failed ({e.__class__.__name__}), retry {attempt}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def ocr_pdf_pages(
+    documentai_client: documentai.DocumentProcessorServiceClient,
+    processor_name: str,
+    content,
+    page_numbers: list[int] = None,
+    shard_pages: int = None,
+    max_in_flight: int = None,
+    max_retries: int = None,
+) -> dict[int, str]:
+    """
+    OCR a PDF (bytes or file path), or the subset `page_numbers`, with Document AI.
+
+    The PDF is split into shards that fit the processor's page limit and the
+    shards are sent concurrently, at most `max_in_flight` at a time. Each
+    shard is retried on its own. Returns {0-based page number: page text}.
+    """
+    max_in_flight = max_in_flight or config.DOCUMENT_AI_MAX_IN_FLIGHT
+    if max_retries is None:
+        max_retries = config.DOCUMENT_AI_MAX_RETRIES
+
+    shards = split_into_shards(content, page_numbers, shard_pages)
+    if not shards:
+        return {}
+
+    page_texts = {}
+    with ThreadPoolExecutor(max_workers=min(max_in_flight, len(shards))) as pool:
+        futures = [
+            (pages, pool.submit(_process_shard, documentai_client, processor_name, shard, max_retries))
+            for pages, shard in shards
+        ]
+        for pages, future in futures:
+            texts = future.result()
+            if len(texts) != len(pages):
+                print(f"[DOCUMENT AI] Shard returned {len(texts)} pages, expected {len(pages)}")
+            for page_num, text in zip(pages, texts):
+                page_texts[page_num] = text
+
+    print(f"[DOCUMENT AI] OCR'd {len(page_texts)} pages in {len(shards)} shards")
+    return page_texts
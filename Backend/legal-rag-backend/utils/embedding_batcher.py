@@ -0,0 +1,80 @@
+# embedding_batcher.py
+import asyncio
+import threading
+
+import numpy as np
+
+import config
+from utils.embeddings import embed_texts_batch
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces embedding requests from concurrent handlers. Texts queued within
+    max_wait_ms of the first pending one (or until max_batch texts are waiting)
+    go to Vertex in a single embed_texts_batch call, and each caller gets its
+    own vector back. Call from inside the event loop.
+    """
+
+    def __init__(self, max_batch: int = None, max_wait_ms: float = None, embed_fn=embed_texts_batch):
+        self.max_batch = max_batch or config.EMBEDDING_COALESCE_MAX_BATCH
+        self.max_wait = (config.EMBEDDING_COALESCE_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self.embed_fn = embed_fn
+        self._pending = []   # [(text, future)]
+        self._timer = None
+        self._tasks = set()  # keep in-flight batch tasks referenced
+        self._counts = {"requests": 0, "batches": 0, "max_batch_size": 0, "full_batches": 0}
+        self._lock = threading.Lock()  # stats() may be read from other threads
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Normalized embedding of one text, sent along with whatever else is queued."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush(full=True)
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    async def embed_many(self, texts: list[str]) -> list[np.ndarray]:
+        return list(await asyncio.gather(*(self.embed(t) for t in texts)))
+
+    def _flush(self, full: bool = False) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            with self._lock:
+                self._counts["requests"] += len(batch)
+                self._counts["batches"] += 1
+                self._counts["full_batches"] += full
+                self._counts["max_batch_size"] = max(self._counts["max_batch_size"], len(batch))
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch) -> None:
+        try:
+            vectors = await asyncio.to_thread(self.embed_fn, [text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vec in zip(batch, vectors):
+            if not future.done():  # caller may have been cancelled
+                future.set_result(vec)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            **counts,
+            "avg_batch_size": round(counts["requests"] / counts["batches"], 2) if counts["batches"] else None,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+embedding_batcher = EmbeddingBatcher()
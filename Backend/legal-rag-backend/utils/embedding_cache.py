@@ -0,0 +1,211 @@
+# embedding_cache.py
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import config
+
+try:
+    import fcntl  # cross-process lock for the disk tier (POSIX)
+except ImportError:
+    fcntl = None
+
+
+def embedding_key(text: str, model: str) -> str:
+    """Content hash of one input text under one embedding model."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class MemoryTier:
+    """LRU of key -> float32 vector, evicting least recently used entries past max_bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            vec = self._entries.get(key)
+            if vec is not None:
+                self._entries.move_to_end(key)
+            return vec
+
+    def put(self, key: str, vec: np.ndarray) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = vec
+            self.bytes += vec.nbytes
+            while self.bytes > self.max_bytes and self._entries:
+                _, old = self._entries.popitem(last=False)
+                self.bytes -= old.nbytes
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskTier:
+    """
+    Append-only store for one model, shared by every worker process:
+      vectors.f32  rows of float32 vectors, read through np.memmap
+      index.tsv    "<key>\\t<row>" lines, appended after the row is written
+      dim          vector width, written with the first row
+    Writers hold an flock on .lock; readers pick up other processes' rows
+    by reading the index past the offset they have already seen.
+    """
+
+    def __init__(self, root: str, model: str):
+        self.dir = os.path.join(root, model.replace("/", "_"))
+        os.makedirs(self.dir, exist_ok=True)
+        self.vectors_path = os.path.join(self.dir, "vectors.f32")
+        self.index_path = os.path.join(self.dir, "index.tsv")
+        self.dim_path = os.path.join(self.dir, "dim")
+        self.lock_path = os.path.join(self.dir, ".lock")
+        self.dim = None
+        self._rows = {}
+        self._index_offset = 0
+        self._mmap = None
+        self._lock = threading.Lock()
+
+    def _refresh_index(self) -> None:
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # ignore a line another process is still writing
+        for line in data[:end].decode("utf-8").splitlines():
+            key, row = line.split("\t")
+            self._rows[key] = int(row)
+        self._index_offset += end
+
+    def _vectors(self, row: int):
+        if self._mmap is None or row >= self._mmap.shape[0]:
+            rows = os.path.getsize(self.vectors_path) // (self.dim * 4)
+            self._mmap = np.memmap(self.vectors_path, dtype="float32", mode="r", shape=(rows, self.dim))
+        return self._mmap
+
+    def _read_dim(self):
+        if self.dim is None and os.path.exists(self.dim_path):
+            with open(self.dim_path) as f:
+                self.dim = int(f.read())
+        return self.dim
+
+    def get_many(self, keys: list[str]) -> dict:
+        """Returns {key: vector} for the keys on disk."""
+        with self._lock:
+            if any(k not in self._rows for k in keys):
+                self._refresh_index()
+            found = {k: self._rows[k] for k in keys if k in self._rows}
+            if not found or not self._read_dim():
+                return {}
+            vectors = self._vectors(max(found.values()))
+            return {k: np.array(vectors[row]) for k, row in found.items()}
+
+    def put_many(self, items: dict) -> None:
+        if not items:
+            return
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh_index()
+                new = {k: v for k, v in items.items() if k not in self._rows}
+                if not new:
+                    return
+                matrix = np.stack([np.asarray(v, dtype="float32") for v in new.values()])
+                if not self._read_dim():
+                    with open(self.dim_path, "w") as f:
+                        f.write(str(matrix.shape[1]))
+                    self.dim = matrix.shape[1]
+                row_bytes = self.dim * 4
+                with open(self.vectors_path, "ab") as f:
+                    first_row = f.seek(0, os.SEEK_END) // row_bytes
+                    f.truncate(first_row * row_bytes)  # drop a torn row left by a crashed writer
+                    f.write(matrix.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                lines = "".join(f"{k}\t{first_row + i}\n" for i, k in enumerate(new))
+                with open(self.index_path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+                self._refresh_index()
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def __len__(self):
+        return len(self._rows)
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of normalized embeddings keyed by (model, text hash):
+    a per-process LRU capped at max_bytes in front of a DiskTier per model.
+    Switching config.EMBEDDING_MODEL changes every key, so nothing stale is served.
+    """
+
+    def __init__(self, max_bytes: int = None, root: str = None, model: str = None, use_disk: bool = True):
+        self.model = model or config.EMBEDDING_MODEL
+        self.memory = MemoryTier(max_bytes or config.EMBEDDING_CACHE_MAX_BYTES)
+        self.disk = DiskTier(root or config.EMBEDDING_CACHE_DIR, self.model) if use_disk else None
+        self.counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    def get_many(self, texts: list[str]) -> dict:
+        """Returns {index in texts: vector} for every cached text."""
+        hits, missing = {}, {}
+        for i, text in enumerate(texts):
+            key = embedding_key(text, self.model)
+            vec = self.memory.get(key)
+            if vec is not None:
+                hits[i] = vec
+            else:
+                missing.setdefault(key, []).append(i)
+        memory_hits = len(hits)
+
+        if self.disk is not None and missing:
+            for key, vec in self.disk.get_many(list(missing)).items():
+                vec.setflags(write=False)
+                self.memory.put(key, vec)
+                for i in missing.pop(key):
+                    hits[i] = vec
+
+        with self._lock:
+            self.counts["memory_hits"] += memory_hits
+            self.counts["disk_hits"] += len(hits) - memory_hits
+            self.counts["misses"] += len(texts) - len(hits)
+        return hits
+
+    def put_many(self, texts: list[str], vectors) -> None:
+        items = {}
+        for text, vec in zip(texts, vectors):
+            vec = np.asarray(vec, dtype="float32")
+            vec.setflags(write=False)
+            key = embedding_key(text, self.model)
+            self.memory.put(key, vec)
+            items[key] = vec
+        if self.disk is not None:
+            self.disk.put_many(items)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        lookups = sum(counts.values())
+        return {
+            "model": self.model,
+            **counts,
+            "hit_rate": round((counts["memory_hits"] + counts["disk_hits"]) / lookups, 4) if lookups else None,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.bytes,
+            "memory_max_bytes": self.memory.max_bytes,
+            "disk_entries": len(self.disk) if self.disk is not None else 0,
+        }
+
+
+embedding_cache = EmbeddingCache() if config.EMBEDDING_CACHE_ENABLED else None
@@ -1,15 +1,110 @@
 #embeddings.py
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
+from google.api_core import exceptions as gexc
 from vertexai.language_models import TextEmbeddingModel
 
+import config
+from utils.embedding_cache import embedding_cache
+from utils.tokens import estimate_tokens
+
 # Init embedding model once
-embedding_model = TextEmbeddingModel.from_pretrained("text-embedding-004")
-
-def embed_texts_batch(texts: list[str]) -> list[np.ndarray]:
-    """Generate normalized embeddings for a list of texts."""
-    embeddings = embedding_model.get_embeddings(texts)
-    vectors = []
-    for emb in embeddings:
-        vec = np.array(emb.values, dtype="float32")
-        vectors.append(vec / np.linalg.norm(vec))
-    return vectors
+embedding_model = TextEmbeddingModel.from_pretrained(config.EMBEDDING_MODEL)
+
+# Quota errors pause every in-flight batch, not just the one that hit them
+QUOTA_ERRORS = (gexc.ResourceExhausted, gexc.TooManyRequests)
+RETRYABLE_ERRORS = QUOTA_ERRORS + (gexc.ServiceUnavailable, gexc.DeadlineExceeded, gexc.InternalServerError)
+
+_quota_lock = threading.Lock()
+_quota_resume_at = 0.0
+
+
+def split_batches(texts: list[str], max_texts: int = None, max_tokens: int = None) -> list[tuple[int, int]]:
+    """
+    Cut texts into consecutive [start, end) batches that stay within the
+    per-request text count and (estimated) token limits of get_embeddings.
+    """
+    max_texts = max_texts or config.EMBEDDING_BATCH_MAX_TEXTS
+    max_tokens = max_tokens or config.EMBEDDING_BATCH_MAX_TOKENS
+    batches, start, tokens = [], 0, 0
+    for i, text in enumerate(texts):
+        # Inputs past the per-text limit are truncated by the API, so count at most that much
+        cost = min(estimate_tokens(text), config.EMBEDDING_MAX_INPUT_TOKENS)
+        if i > start and (i - start >= max_texts or tokens + cost > max_tokens):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += cost
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def _wait_for_quota() -> None:
+    delay = _quota_resume_at - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def _embed_batch(texts: list[str], max_retries: int) -> np.ndarray:
+    """One get_embeddings call, retried with jittered exponential backoff on quota/transient errors."""
+    global _quota_resume_at
+    attempt = 0
+    while True:
+        _wait_for_quota()
+        try:
+            embeddings = embedding_model.get_embeddings(texts)
+            return np.array([emb.values for emb in embeddings], dtype="float32")
+        except RETRYABLE_ERRORS as e:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            delay = min(2 ** attempt, 60) * (0.5 + random.random() / 2)
+            if isinstance(e, QUOTA_ERRORS):
+                with _quota_lock:
+                    _quota_resume_at = max(_quota_resume_at, time.monotonic() + delay)
+            print(f"[EMBEDDINGS] Batch of {len(texts)} failed ({e.__class__.__name__}), "
+                  f"retry {attempt}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _embed_uncached(texts: list[str], max_concurrency: int = None, max_retries: int = None) -> np.ndarray:
+    """Embed texts in limit-sized batches, at most max_concurrency in flight; rows in input order."""
+    max_concurrency = max_concurrency or config.EMBEDDING_MAX_CONCURRENCY
+    if max_retries is None:
+        max_retries = config.EMBEDDING_MAX_RETRIES
+    batches = split_batches(texts)
+    if len(batches) == 1:
+        matrix = _embed_batch(texts, max_retries)
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(batches))) as pool:
+            futures = [pool.submit(_embed_batch, texts[start:end], max_retries) for start, end in batches]
+            matrix = np.concatenate([f.result() for f in futures])
+        print(f"[EMBEDDINGS] Embedded {len(texts)} texts in {len(batches)} batches")
+    # Normalize every row at once
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def embed_texts_batch(texts: list[str], use_cache: bool = True) -> list[np.ndarray]:
+    """
+    Generate normalized embeddings for a list of texts, in input order.
+    Texts already in the embedding cache are not sent to Vertex; duplicates are embedded once.
+    Cached vectors are shared, so treat the returned arrays as read-only.
+    """
+    if not texts:
+        return []
+    if not use_cache or embedding_cache is None:
+        return list(_embed_uncached(texts))
+
+    vectors = embedding_cache.get_many(texts)
+    missing = list(dict.fromkeys(t for i, t in enumerate(texts) if i not in vectors))
+    if missing:
+        fresh = dict(zip(missing, _embed_uncached(missing)))
+        embedding_cache.put_many(list(fresh), list(fresh.values()))
+        for i, text in enumerate(texts):
+            if i not in vectors:
+                vectors[i] = fresh[text]
+    return [vectors[i] for i in range(len(texts))]
@@ -1,8 +1,7 @@
 from google.cloud import firestore
 from datetime import datetime
 
-# Initialize Firestore client
-db = firestore.Client()
+from utils.clients import firestore_client
 
 VALID_DATA_TYPES = ["full_text_chunks", "summary", "clauses", "risks"]
 
@@ -14,7 +13,7 @@ def save_processed_data(user_id: str, doc_id: str, data_type: str, data):
     if not all([user_id, doc_id, data_type]):
         raise ValueError("user_id, doc_id, and data_type must be provided.")
 
-    doc_ref = db.collection("processed_docs").document(f"{user_id}_{doc_id}")
+    doc_ref = firestore_client().collection("processed_docs").document(f"{user_id}_{doc_id}")
     doc_ref.set({data_type: data}, merge=True)
 
 
@@ -26,7 +25,7 @@ def get_processed_data(user_id: str, doc_id: str, data_type: str):
     if not all([user_id, doc_id, data_type]):
         raise ValueError("user_id, doc_id, and data_type must be provided.")
 
-    doc_ref = db.collection("processed_docs").document(f"{user_id}_{doc_id}")
+    doc_ref = firestore_client().collection("processed_docs").document(f"{user_id}_{doc_id}")
     doc_snapshot = doc_ref.get()
     if doc_snapshot.exists:
         return doc_snapshot.to_dict().get(data_type)
@@ -39,5 +38,5 @@ def delete_processed_data(user_id: str, doc_id: str, data_type: str):
     if data_type not in VALID_DATA_TYPES:
         raise ValueError(f"Invalid data_type: {data_type}")
 
-    doc_ref = db.collection("users").document(user_id).collection("documents").document(doc_id)
+    doc_ref = firestore_client().collection("users").document(user_id).collection("documents").document(doc_id)
     doc_ref.update({data_type: firestore.DELETE_FIELD})
\ No newline at end of file
@@ -0,0 +1,131 @@
+# hedging.py
+import asyncio
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+import config
+
+
+class BackendStats:
+    """Latency samples and outcome counters for one backend of a hedged call."""
+
+    def __init__(self, window: int = 500):
+        self.latencies = deque(maxlen=window)
+        self.counts = {"calls": 0, "wins": 0, "errors": 0, "timeouts": 0, "rejected": 0, "cancelled": 0}
+
+    def p95(self):
+        return float(np.percentile(self.latencies, 95)) if self.latencies else None
+
+    def summary(self) -> dict:
+        samples = np.asarray(self.latencies) * 1000 if self.latencies else None
+        calls = self.counts["calls"]
+        return {
+            **self.counts,
+            "win_rate": round(self.counts["wins"] / calls, 3) if calls else None,
+            "p50_ms": round(float(np.percentile(samples, 50)), 1) if samples is not None else None,
+            "p95_ms": round(float(np.percentile(samples, 95)), 1) if samples is not None else None,
+        }
+
+
+class HedgedCall:
+    """
+    Runs a primary backend and, only if it has not produced an acceptable
+    answer after a hedge delay, a secondary one; the first acceptable answer
+    wins and the other call is cancelled. The delay is the primary's observed
+    p95 latency, clamped to [min_delay, max_delay]; until min_samples calls
+    have been seen, default_delay is used. Each backend has its own timeout.
+    Backends are coroutine functions that do non-blocking I/O (e.g.
+    generate_content_async), so cancellation stops the request.
+    """
+
+    def __init__(self, primary: str, secondary: str, timeouts: dict = None, min_delay: float = None,
+                 max_delay: float = None, default_delay: float = None, min_samples: int = None):
+        self.primary, self.secondary = primary, secondary
+        self.timeouts = timeouts or {}
+        # delays in seconds
+        self.min_delay = config.HEDGE_MIN_DELAY_MS / 1000 if min_delay is None else min_delay
+        self.max_delay = config.HEDGE_MAX_DELAY_MS / 1000 if max_delay is None else max_delay
+        self.default_delay = config.HEDGE_DEFAULT_DELAY_MS / 1000 if default_delay is None else default_delay
+        self.min_samples = config.HEDGE_MIN_SAMPLES if min_samples is None else min_samples
+        self.backends = {primary: BackendStats(), secondary: BackendStats()}
+        self.counts = {"requests": 0, "hedged": 0, "no_acceptable_answer": 0}
+        self._lock = threading.Lock()
+
+    def hedge_delay(self) -> float:
+        stats = self.backends[self.primary]
+        with self._lock:
+            if len(stats.latencies) < self.min_samples:
+                return self.default_delay
+            return min(max(stats.p95(), self.min_delay), self.max_delay)
+
+    def _count(self, name: str, field: str, latency: float = None) -> None:
+        with self._lock:
+            self.backends[name].counts[field] += 1
+            if latency is not None:
+                self.backends[name].latencies.append(latency)
+
+    async def _timed(self, name: str, call):
+        """(result, error) of one backend call; records its latency."""
+        self._count(name, "calls")
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(call(), timeout=self.timeouts.get(name))
+        except asyncio.TimeoutError:
+            self._count(name, "timeouts", time.perf_counter() - start)
+            return None, f"{name} timed out"
+        except asyncio.CancelledError:
+            # The loser's elapsed time is a lower bound on its latency; keep it so
+            # that p95 is not biased towards fast calls
+            self._count(name, "cancelled", time.perf_counter() - start)
+            raise
+        except Exception as e:
+            self._count(name, "errors", time.perf_counter() - start)
+            return None, f"{name}: {e.__class__.__name__}: {e}"
+        with self._lock:
+            self.backends[name].latencies.append(time.perf_counter() - start)
+        return result, None
+
+    async def run(self, calls: dict, acceptable):
+        """
+        `calls` maps each backend name to a zero-argument coroutine function.
+        Returns (result, winner). winner is None when neither backend produced an
+        acceptable answer; result is then the last non-empty answer, if any.
+        """
+        with self._lock:
+            self.counts["requests"] += 1
+        tasks = {asyncio.create_task(self._timed(self.primary, calls[self.primary])): self.primary}
+        fallback, hedge_at = None, time.monotonic() + self.hedge_delay()
+        try:
+            while tasks:
+                started_secondary = self.secondary in tasks.values()
+                timeout = None if started_secondary else max(0.0, hedge_at - time.monotonic())
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = tasks.pop(task)
+                    result, error = task.result()
+                    if error is None and acceptable(result):
+                        self._count(name, "wins")
+                        return result, name
+                    if error is None:
+                        self._count(name, "rejected")
+                    fallback = result or fallback
+                if not started_secondary and (not done or not tasks):
+                    # Primary is slower than its p95 (or gave no usable answer): hedge
+                    with self._lock:
+                        self.counts["hedged"] += 1
+                    tasks[asyncio.create_task(self._timed(self.secondary, calls[self.secondary]))] = self.secondary
+            with self._lock:
+                self.counts["no_acceptable_answer"] += 1
+            return fallback, None
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+            backends = {name: stats.summary() for name, stats in self.backends.items()}
+        return {**counts, "hedge_delay_ms": round(self.hedge_delay() * 1000, 1), "backends": backends}
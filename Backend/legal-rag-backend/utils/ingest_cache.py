@@ -0,0 +1,126 @@
+# ingest_cache.py
+import os
+import json
+import hashlib
+import tempfile
+
+import numpy as np
+
+import config
+from utils.pdf_source import open_pdf
+
+
+def sha256_file(path: str, chunk_size: int = None) -> str:
+    """SHA-256 of a file on disk, read in chunks."""
+    chunk_size = chunk_size or config.UPLOAD_CHUNK_SIZE
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def page_fingerprints(source) -> list[str]:
+    """
+    One SHA-256 per page, over the page's content stream, the raw bytes of the
+    images it draws and its geometry. A rescan that only changes one page
+    changes only that page's key.
+    """
+    fingerprints = []
+    with open_pdf(source) as doc:
+        for page in doc:
+            digest = hashlib.sha256()
+            digest.update(page.read_contents())
+            for image in page.get_images(full=True):
+                digest.update(doc.xref_stream_raw(image[0]) or b"")
+            digest.update(f"{tuple(page.rect)}:{page.rotation}".encode())
+            fingerprints.append(digest.hexdigest())
+    return fingerprints
+
+
+class IngestCache:
+    """
+    On-disk, content-addressed cache for the ingest pipeline.
+
+    docs/   keyed by PDF SHA-256 + extraction/chunking parameters:
+            extracted text, chunk_text output and (per embedding model) embeddings
+    pages/  keyed by page fingerprint: OCR text of a single page
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root or config.INGEST_CACHE_DIR
+        os.makedirs(os.path.join(self.root, "docs"), exist_ok=True)
+        os.makedirs(os.path.join(self.root, "pages"), exist_ok=True)
+
+    # --- keys / paths ---
+
+    @staticmethod
+    def document_key(pdf_sha256: str, **params) -> str:
+        """Cache key for a document under a given set of ingest parameters."""
+        payload = json.dumps({"sha256": pdf_sha256, **params}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, kind: str, key: str, suffix: str) -> str:
+        directory = os.path.join(self.root, kind, key[:2])
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, key + suffix)
+
+    @staticmethod
+    def _atomic_write(path: str, write) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    # --- whole document ---
+
+    def get_document(self, key: str):
+        """Returns {"text", "chunks", "skipped_pages"} or None ("skipped_pages" may be missing in old entries)."""
+        path = self._path("docs", key, ".json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def put_document(self, key: str, text: str, chunks: list, skipped_pages: list = None) -> None:
+        data = json.dumps({"text": text, "chunks": chunks, "skipped_pages": skipped_pages},
+                          ensure_ascii=False).encode("utf-8")
+        self._atomic_write(self._path("docs", key, ".json"), lambda f: f.write(data))
+
+    def get_embeddings(self, key: str, model: str = None):
+        """Returns the cached embeddings as a list of float32 vectors, or None."""
+        path = self._path("docs", key, f".{model or config.EMBEDDING_MODEL}.npy")
+        if not os.path.exists(path):
+            return None
+        return list(np.load(path))
+
+    def put_embeddings(self, key: str, embeddings, model: str = None) -> None:
+        matrix = np.asarray(embeddings, dtype="float32")
+        self._atomic_write(
+            self._path("docs", key, f".{model or config.EMBEDDING_MODEL}.npy"),
+            lambda f: np.save(f, matrix),
+        )
+
+    # --- single pages ---
+
+    def get_pages(self, page_keys: list[str]) -> dict[int, str]:
+        """Look up OCR text for each page key. Returns {page index: text} for hits."""
+        hits = {}
+        for page_num, page_key in enumerate(page_keys):
+            path = self._path("pages", page_key, ".txt")
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    hits[page_num] = f.read()
+        return hits
+
+    def put_page(self, page_key: str, text: str) -> None:
+        data = text.encode("utf-8")
+        self._atomic_write(self._path("pages", page_key, ".txt"), lambda f: f.write(data))
+
+
+ingest_cache = IngestCache() if config.INGEST_CACHE_ENABLED else None
@@ -0,0 +1,263 @@
+# ingest_jobs.py
+import time
+import uuid
+import asyncio
+import threading
+import traceback
+from collections import OrderedDict
+
+import config
+
+# How many finished jobs the in-process backend remembers for status lookups
+JOB_HISTORY_LIMIT = 1000
+
+
+class QueueFullError(Exception):
+    """Raised by submit() when the queue already holds `maxsize` queued jobs."""
+
+
+def _new_job(params: dict) -> dict:
+    return {
+        "job_id": str(uuid.uuid4()),
+        "status": "queued",
+        "params": params,
+        "stages": {},
+        "progress": 0.0,
+        "result": None,
+        "error": None,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+    }
+
+
+def _stage_entry(previous: dict, status: str, info: dict) -> dict:
+    entry = dict(previous or {})
+    entry.update(info)
+    entry["status"] = status
+    now = time.time()
+    if status == "running":
+        entry["started_at"] = now
+    else:
+        entry["finished_at"] = now
+    return entry
+
+
+class InProcessJobQueue:
+    """Bounded asyncio queue with job records kept in memory. Single process only."""
+
+    def __init__(self, maxsize: int = None, stages: tuple = ()):
+        self.stages = stages
+        self._queue = asyncio.Queue(maxsize=maxsize or config.INGEST_QUEUE_MAXSIZE)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def submit(self, params: dict) -> dict:
+        job = _new_job(params)
+        with self._lock:
+            try:
+                self._queue.put_nowait(job["job_id"])
+            except asyncio.QueueFull:
+                raise QueueFullError(f"Ingest queue is full ({self._queue.maxsize} jobs).")
+            self._jobs[job["job_id"]] = job
+            self._evict_finished()
+        return dict(job)
+
+    async def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else {**job, "stages": dict(job["stages"])}
+
+    async def next_job(self) -> dict:
+        job_id = await self._queue.get()
+        with self._lock:
+            return dict(self._jobs[job_id])
+
+    def mark(self, job_id: str, status: str, **fields) -> None:
+        with self._lock:
+            self._jobs[job_id].update(status=status, **fields)
+
+    def renew_lease(self, job_id: str) -> None:
+        """Jobs in memory die with the process, so there is no lease to renew."""
+
+    def update_stage(self, job_id: str, stage: str, status: str, info: dict) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            job["stages"][stage] = _stage_entry(job["stages"].get(stage), status, info)
+            if self.stages:
+                finished = sum(1 for s in job["stages"].values() if s["status"] in ("done", "skipped"))
+                job["progress"] = round(finished / len(self.stages), 2)
+
+    def _evict_finished(self) -> None:
+        finished = [jid for jid, j in self._jobs.items() if j["status"] in ("succeeded", "failed")]
+        for jid in finished[:max(0, len(finished) - JOB_HISTORY_LIMIT)]:
+            del self._jobs[jid]
+
+
+class FirestoreJobQueue:
+    """
+    Durable queue: one Firestore document per job. Workers in any process
+    claim queued jobs with a transaction, so ingest can run in dedicated
+    worker processes (ingest_worker.py) and scale apart from the API. A claim
+    holds a lease (lease_expires_at) that renew_lease() and stage updates
+    extend; a "running" job whose lease has expired (its worker crashed) is
+    claimed again. Needs composite indexes on (status, created_at) and
+    (status, lease_expires_at).
+    """
+
+    def __init__(self, maxsize: int = None, stages: tuple = (), collection: str = None,
+                 poll_interval: float = 1.0, lease_seconds: float = None):
+        from google.cloud import firestore
+        from utils.clients import firestore_client
+        db = firestore_client()
+
+        self._firestore = firestore
+        self.stages = stages
+        self.maxsize = maxsize or config.INGEST_QUEUE_MAXSIZE
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds or config.INGEST_JOB_LEASE_SECONDS
+        self._collection = db.collection(collection or config.INGEST_JOBS_COLLECTION)
+        self._db = db
+
+    def _queued_count(self) -> int:
+        result = self._collection.where("status", "==", "queued").count().get()
+        return int(result[0][0].value)
+
+    async def submit(self, params: dict) -> dict:
+        if await asyncio.to_thread(self._queued_count) >= self.maxsize:
+            raise QueueFullError(f"Ingest queue is full ({self.maxsize} jobs).")
+        job = _new_job(params)
+        await asyncio.to_thread(self._collection.document(job["job_id"]).set, job)
+        return job
+
+    async def get(self, job_id: str):
+        snapshot = await asyncio.to_thread(self._collection.document(job_id).get)
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def _claim_next(self):
+        now = time.time()
+        queued = (
+            self._collection.where("status", "==", "queued")
+            .order_by("created_at")
+            .limit(5)
+            .stream()
+        )
+        expired = (
+            self._collection.where("status", "==", "running")
+            .where("lease_expires_at", "<", now)
+            .order_by("lease_expires_at")
+            .limit(5)
+            .stream()
+        )
+
+        @self._firestore.transactional
+        def claim(txn, ref):
+            snapshot = ref.get(transaction=txn)
+            if not snapshot.exists:
+                return None
+            job = snapshot.to_dict()
+            claim_time = time.time()
+            if job.get("status") == "running" and (job.get("lease_expires_at") or 0) < claim_time:
+                print(f"[INGEST] Re-claiming job {job['job_id']}: its worker's lease expired")
+            elif job.get("status") != "queued":
+                return None
+            txn.update(ref, {"status": "running", "started_at": claim_time,
+                             "lease_expires_at": claim_time + self.lease_seconds,
+                             "attempts": job.get("attempts", 0) + 1})
+            return job
+
+        for candidates in (queued, expired):
+            for candidate in candidates:
+                job = claim(self._db.transaction(), candidate.reference)
+                if job:
+                    return job
+        return None
+
+    async def next_job(self) -> dict:
+        while True:
+            job = await asyncio.to_thread(self._claim_next)
+            if job:
+                return job
+            await asyncio.sleep(self.poll_interval)
+
+    def mark(self, job_id: str, status: str, **fields) -> None:
+        self._collection.document(job_id).update({"status": status, **fields})
+
+    def renew_lease(self, job_id: str) -> None:
+        self._collection.document(job_id).update({"lease_expires_at": time.time() + self.lease_seconds})
+
+    def update_stage(self, job_id: str, stage: str, status: str, info: dict) -> None:
+        # One write, no read: each stage field is set by path, so the entry's
+        # earlier fields (e.g. started_at) are kept
+        update = {f"stages.{stage}.{field}": value for field, value in _stage_entry({}, status, info).items()}
+        update["lease_expires_at"] = time.time() + self.lease_seconds
+        if self.stages and stage in self.stages and status in ("done", "skipped"):
+            # Stages run in order, so this one finishing means the ones before it have too
+            update["progress"] = round((self.stages.index(stage) + 1) / len(self.stages), 2)
+        self._collection.document(job_id).update(update)
+
+
+def make_job_queue(backend: str = None, **kwargs):
+    """Build the queue backend named by config.INGEST_QUEUE_BACKEND ('memory' or 'firestore')."""
+    backend = (backend or config.INGEST_QUEUE_BACKEND).lower()
+    if backend == "memory":
+        return InProcessJobQueue(**kwargs)
+    if backend == "firestore":
+        return FirestoreJobQueue(**kwargs)
+    raise ValueError("INGEST_QUEUE_BACKEND must be 'memory' or 'firestore'.")
+
+
+class IngestWorkerPool:
+    """
+    `concurrency` asyncio workers pulling jobs from `queue`. Each job runs
+    `handler(params, on_stage)` in a thread; on_stage(stage, status, info)
+    updates the job's per-stage progress and timings.
+    """
+
+    def __init__(self, queue, handler, concurrency: int = None):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency or config.INGEST_WORKERS
+        self._tasks = []
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        print(f"[INGEST] Started {self.concurrency} ingest workers")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, n: int) -> None:
+        while True:
+            job = await self.queue.next_job()
+            await self._run(job)
+
+    async def _run(self, job: dict) -> None:
+        job_id = job["job_id"]
+        await asyncio.to_thread(self.queue.mark, job_id, "running", started_at=time.time())
+
+        def on_stage(stage, status, info):
+            self.queue.update_stage(job_id, stage, status, info)
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            result = await asyncio.to_thread(self.handler, job["params"], on_stage)
+            await asyncio.to_thread(self.queue.mark, job_id, "succeeded", result=result, finished_at=time.time())
+        except Exception as e:
+            traceback.print_exc()
+            await asyncio.to_thread(self.queue.mark, job_id, "failed", error=str(e), finished_at=time.time())
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job_id: str) -> None:
+        """Renew the job's lease while a long stage runs without reporting progress."""
+        interval = getattr(self.queue, "lease_seconds", config.INGEST_JOB_LEASE_SECONDS) / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.queue.renew_lease, job_id)
+            except Exception as e:
+                print(f"[INGEST] Could not renew lease of job {job_id}: {e}")
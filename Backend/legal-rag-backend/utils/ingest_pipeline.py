@@ -0,0 +1,360 @@
+# ingest_pipeline.py
+import re
+import time
+import uuid
+import hashlib
+
+import config
+from utils.chunker import chunk_text
+from utils.embeddings import embed_texts_batch
+from utils.firestore_utils import save_processed_data, get_processed_data
+from utils.ingest_cache import ingest_cache, sha256_file
+from utils.answer_cache import answer_cache
+from utils.lexical_index import lexical_indexes
+from utils.pdf_extraction import extract_text_from_pdf
+from utils.pinecone_upsert import delete_vectors, fetch_vectors, upsert_vectors
+from utils.tokens import estimate_tokens
+
+STAGES = ("extract", "chunk", "diff", "embed", "upsert", "persist")
+
+# Stored analysis outputs that are derived from a document's chunks
+ANALYSIS_SECTIONS = ("summary", "clauses", "risks", "full_analysis")
+
+
+def chunk_content_hash(content: str) -> str:
+    """Whitespace-insensitive SHA-256 of a chunk's text, used to diff document versions."""
+    normalized = re.sub(r"\s+", " ", content or "").strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def diff_chunks(old_chunks: list[dict], new_chunks: list[dict], user_id: str, doc_id: str) -> dict:
+    """
+    Match new chunks to stored ones by content hash (duplicates matched one-to-one).
+    Returns {"unchanged": [(new index, old chunk)], "added": [new index], "removed": [old chunk]}.
+    Old chunks stored before hashes/vector ids were recorded get them derived here.
+    """
+    pool = {}
+    for old in old_chunks:
+        if not isinstance(old, dict):
+            old = {"content": str(old)}
+        old = dict(old)
+        old.setdefault("content_hash", chunk_content_hash(old.get("content", "")))
+        old.setdefault("vector_id", f"{user_id}_{doc_id}_chunk_{old.get('chunk_id')}")
+        pool.setdefault(old["content_hash"], []).append(old)
+
+    unchanged, added = [], []
+    for i, chunk in enumerate(new_chunks):
+        matches = pool.get(chunk["content_hash"])
+        if matches:
+            unchanged.append((i, matches.pop(0)))
+        else:
+            added.append(i)
+    removed = [old for matches in pool.values() for old in matches]
+    return {"unchanged": unchanged, "added": added, "removed": removed}
+
+
+def _upsert_counts(report: dict) -> dict:
+    """Upsert report fields shown on the "upsert" stage of a job."""
+    return {k: report[k] for k in ("upserted", "failed", "batches", "failed_batches")}
+
+
+class IngestPipeline:
+    """
+    The /upload ingest flow as separate stages: extract -> chunk -> diff -> embed -> upsert -> persist.
+
+    Clients are passed in so the same pipeline runs inside the API process,
+    in an ingest worker or from a script. Pass rag_index=None to skip the
+    Pinecone stages. Upserted vectors are also stored in `local_index`
+    (a LocalDocIndexStore) when one is given, and "persist" builds the document's
+    BM25 index (utils/lexical_index.py). "diff" only runs when ingesting a new version of an
+    existing doc_id. With config.CHUNK_MODE="tokens" (or max_tokens passed)
+    chunks are budgeted in estimated tokens instead of characters.
+    """
+
+    def __init__(self, documentai_client=None, processor_name: str = None, rag_index=None,
+                 skip_keywords: list[str] = None, cache=ingest_cache,
+                 chunk_size: int = 1500, chunk_overlap: int = 200,
+                 max_tokens: int = None, overlap_tokens: int = None, local_index=None):
+        self.documentai_client = documentai_client
+        self.processor_name = processor_name
+        self.rag_index = rag_index
+        self.local_index = local_index
+        self.skip_keywords = skip_keywords
+        self.cache = cache
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        if max_tokens is None and config.CHUNK_MODE == "tokens":
+            max_tokens = config.EMBEDDING_CHUNK_TOKENS
+        if overlap_tokens is None:
+            overlap_tokens = config.EMBEDDING_CHUNK_OVERLAP_TOKENS
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    @property
+    def chunk_params(self) -> dict:
+        """chunk_text() sizing arguments; also part of the ingest cache key."""
+        if self.max_tokens:
+            return {"max_tokens": self.max_tokens, "overlap_tokens": self.overlap_tokens}
+        return {"chunk_size": self.chunk_size, "chunk_overlap": self.chunk_overlap}
+
+    # --- stages ---
+
+    def extract(self, file_path: str, doc_type: str, skip_report: list = None) -> str:
+        """PDF text; pages dropped for a skip keyword are appended to skip_report."""
+        if doc_type == "electronic":
+            return extract_text_from_pdf(None, None, file_path, method="pymupdf",
+                                         skip_keywords=self.skip_keywords, skip_report=skip_report)
+        if doc_type == "scanned":
+            return extract_text_from_pdf(self.documentai_client, self.processor_name, file_path,
+                                         method="document_ai", skip_keywords=self.skip_keywords,
+                                         page_cache=self.cache, skip_report=skip_report)
+        if doc_type == "auto":
+            return extract_text_from_pdf(self.documentai_client, self.processor_name, file_path,
+                                         method="auto", skip_keywords=self.skip_keywords,
+                                         page_cache=self.cache, skip_report=skip_report)
+        raise ValueError("doc_type must be 'scanned', 'electronic' or 'auto'.")
+
+    def chunk(self, text: str) -> list[dict]:
+        return chunk_text(text, **self.chunk_params)
+
+    def diff(self, user_id: str, doc_id: str, chunks: list[dict]) -> dict:
+        old_chunks = get_processed_data(user_id, doc_id, "full_text_chunks") or []
+        return diff_chunks(old_chunks, chunks, user_id, doc_id)
+
+    def embed(self, chunk_texts: list[str]) -> list:
+        return embed_texts_batch(chunk_texts)
+
+    def upsert(self, vectors: list[dict]) -> dict:
+        """Batched, concurrent upsert; returns the upsert_vectors report (upserted / failed counts)."""
+        return upsert_vectors(self.rag_index, vectors)
+
+    def persist(self, user_id: str, doc_id: str, chunks: list[dict]) -> int:
+        store_chunks = [
+            {"content": c.get("content", ""), "chunk_id": c.get("chunk_id"), "type": c.get("type"),
+             "token_count": c.get("token_count"), "content_hash": c.get("content_hash"),
+             "vector_id": c.get("vector_id")}
+            for c in chunks
+        ]
+        save_processed_data(user_id, doc_id, "full_text_chunks", store_chunks)
+        try:
+            # BM25 index for /query's lexical retrieval, keyed by this version's chunks
+            lexical_indexes.build(user_id, doc_id, store_chunks)
+        except Exception as e:
+            print(f"[LEXICAL] Could not build index for {doc_id}: {e}")
+        if answer_cache:
+            # Answers about the previous chunks are stale (another process's cache expires via TTL)
+            answer_cache.invalidate(user_id, doc_id)
+        return len(store_chunks)
+
+    @staticmethod
+    def _vector(vector_id: str, user_id: str, doc_id: str, chunk: dict, emb) -> dict:
+        return {
+            "id": vector_id,
+            "values": emb,
+            "metadata": {"user_id": user_id, "doc_id": doc_id, "chunk_id": chunk["chunk_id"],
+                         "snippet": chunk["content"][:150]},
+        }
+
+    def _sync_version_vectors(self, user_id: str, doc_id: str, version: int, chunks: list[dict],
+                              changes: dict, embeddings) -> dict:
+        """
+        Upsert added chunks, drop removed ones, renumber moved ones. Returns the
+        upsert report of the added and renumbered vectors.
+        """
+        vectors = [
+            self._vector(chunks[i]["vector_id"], user_id, doc_id, chunks[i], emb)
+            for i, emb in zip(changes["added"], embeddings)
+        ]
+
+        # Unchanged text at a new position only needs its chunk_id metadata changed:
+        # its stored values are fetched and re-sent with the new metadata in the same
+        # batched upsert, instead of one update call per moved chunk
+        moved = [(i, old) for i, old in changes["unchanged"] if old.get("chunk_id") != chunks[i]["chunk_id"]]
+        renumbered = []
+        if moved:
+            stored = fetch_vectors(self.rag_index, [old["vector_id"] for _, old in moved])
+            renumbered = [self._vector(old["vector_id"], user_id, doc_id, chunks[i], stored[old["vector_id"]][0])
+                          for i, old in moved if old["vector_id"] in stored]
+            if len(renumbered) < len(moved):
+                print(f"[VERSION] {len(moved) - len(renumbered)} moved vectors not found in the index; not renumbered")
+        report = self.upsert(vectors + renumbered)
+
+        removed_ids = [old["vector_id"] for old in changes["removed"]]
+        if removed_ids:
+            delete_vectors(self.rag_index, removed_ids)
+        print(f"[VERSION] v{version}: upserted {len(vectors)} new and {len(renumbered)} renumbered, "
+              f"deleted {len(removed_ids)}, kept {len(changes['unchanged'])} vectors")
+        return report
+
+    def _mark_analysis_stale(self, user_id: str, doc_id: str, version: int, changes: dict) -> list[str]:
+        """Flag stored analysis sections that were computed from the previous version's chunks."""
+        if not changes["added"] and not changes["removed"]:
+            return []
+        stale = [s for s in ANALYSIS_SECTIONS if get_processed_data(user_id, doc_id, s)]
+        if stale:
+            save_processed_data(user_id, doc_id, "analysis_status", {
+                section: {
+                    "stale": True,
+                    "since_version": version,
+                    "added_chunk_ids": list(changes["added"]),
+                    "removed_chunk_ids": [old.get("chunk_id") for old in changes["removed"]],
+                }
+                for section in stale
+            })
+        return stale
+
+    # --- driver ---
+
+    def run(self, file_path: str, doc_type: str, user_id: str, doc_id: str = None,
+            on_stage=None, version_of: str = None) -> dict:
+        """
+        Run every stage for one PDF. `on_stage(stage, status, info)` is called
+        with status "running", then "done" / "skipped" / "failed"; "done" and
+        "failed" info carry duration_ms.
+
+        With `version_of=<doc_id>` the PDF is ingested as a new version of that
+        document: chunks are diffed against the stored ones by content hash,
+        only new/changed chunks are embedded and upserted, vectors of removed
+        chunks are deleted and stale analysis sections are flagged.
+
+        Returns {"doc_id", "chunks", "vectors", "vectors_failed", "cache_hit",
+        "skipped_pages", "pinecone_error", "timings_ms"} plus "version" / "changes" / "stale_sections" for versions.
+        """
+        doc_type = doc_type.lower()
+        doc_id = version_of or doc_id or str(uuid.uuid4())
+        timings = {}
+
+        def stage(name, fn, *args, skip=False, result_info=None, **info):
+            if skip:
+                if on_stage:
+                    on_stage(name, "skipped", info)
+                return None
+            if on_stage:
+                on_stage(name, "running", {})
+            start = time.perf_counter()
+            try:
+                result = fn(*args)
+            except Exception as e:
+                if on_stage:
+                    on_stage(name, "failed", {"duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                                              "error": str(e)})
+                raise
+            timings[name] = round((time.perf_counter() - start) * 1000, 1)
+            if result_info:
+                info.update(result_info(result))
+            if on_stage:
+                on_stage(name, "done", {"duration_ms": timings[name], **info})
+            return result
+
+        cache_key = None
+        cached = None
+        if self.cache:
+            cache_key = self.cache.document_key(sha256_file(file_path), doc_type=doc_type,
+                                                skip_keywords=self.skip_keywords,
+                                                **self.chunk_params)
+            cached = self.cache.get_document(cache_key)
+
+        if cached:
+            print(f"[INGEST CACHE] HIT for {file_path}: reusing extracted text and chunks")
+            text, chunks = cached["text"], cached["chunks"]
+            skipped_pages = cached.get("skipped_pages")
+            stage("extract", None, skip=True, reason="cache_hit")
+            stage("chunk", None, skip=True, reason="cache_hit")
+        else:
+            skipped_pages = []
+            text = stage("extract", self.extract, file_path, doc_type, skipped_pages,
+                         result_info=lambda _: {"skipped_pages": skipped_pages})
+            print(f"[PARSER DEBUG] Extracted Text Length: {len(text)} characters.")
+            chunks = stage("chunk", self.chunk, text)
+            if self.cache:
+                self.cache.put_document(cache_key, text, chunks, skipped_pages)
+
+        # Chunks cached before token counts were recorded get them estimated here
+        chunks = [{**c, "content_hash": chunk_content_hash(c["content"]),
+                   "token_count": c.get("token_count") or estimate_tokens(c["content"])} for c in chunks]
+        chunk_texts = [c["content"] for c in chunks]
+
+        # New version of an existing document: work out what actually changed
+        version = None
+        changes = None
+        if version_of:
+            version = int((get_processed_data(user_id, doc_id, "version_info") or {}).get("version", 1)) + 1
+            changes = stage("diff", self.diff, user_id, doc_id, chunks)
+            for i, old in changes["unchanged"]:
+                chunks[i]["vector_id"] = old["vector_id"]
+            for i in changes["added"]:
+                chunks[i]["vector_id"] = f"{user_id}_{doc_id}_v{version}_chunk_{i}"
+        else:
+            stage("diff", None, skip=True, reason="new_document")
+            for i, c in enumerate(chunks):
+                c["vector_id"] = f"{user_id}_{doc_id}_chunk_{i}"
+
+        upserted = 0
+        upsert_failed = 0
+        pinecone_error = None
+        if self.rag_index is None:
+            stage("embed", None, skip=True, reason="pinecone_disabled")
+            stage("upsert", None, skip=True, reason="pinecone_disabled")
+        else:
+            # As before, a Pinecone failure does not stop the chunks from being stored
+            try:
+                embeddings = self.cache.get_embeddings(cache_key) if cached else None
+                to_embed = list(range(len(chunks))) if changes is None else changes["added"]
+                if embeddings is not None:
+                    embeddings = [embeddings[i] for i in to_embed]
+                    stage("embed", None, skip=True, reason="cache_hit")
+                elif to_embed:
+                    embeddings = stage("embed", self.embed, [chunk_texts[i] for i in to_embed])
+                    if self.cache and changes is None:
+                        self.cache.put_embeddings(cache_key, embeddings)
+                else:
+                    embeddings = []
+                    stage("embed", None, skip=True, reason="no_changed_chunks")
+
+                if changes is None:
+                    vectors = [self._vector(c["vector_id"], user_id, doc_id, c, emb)
+                               for c, emb in zip(chunks, embeddings)]
+                    report = stage("upsert", self.upsert, vectors, result_info=_upsert_counts)
+                else:
+                    report = stage("upsert", self._sync_version_vectors, user_id, doc_id, version,
+                                   chunks, changes, embeddings, result_info=_upsert_counts)
+                upserted, upsert_failed = report["upserted"], report["failed"]
+                if self.local_index is not None:
+                    # Versions only embed changed chunks and partial upserts leave gaps:
+                    # in both cases /query falls back to Pinecone for this doc
+                    if changes is None and not upsert_failed:
+                        self.local_index.put(user_id, doc_id, vectors)
+                    else:
+                        self.local_index.remove(user_id, doc_id)
+                if upsert_failed:
+                    pinecone_error = (f"{upsert_failed} of {upserted + upsert_failed} vectors failed to upsert: "
+                                      + "; ".join(report["errors"]))
+                    print(f"[PINECONE ERROR]: {pinecone_error}")
+                else:
+                    print(f"[PINECONE] SUCCESS: Upserted {upserted} vectors")
+            except Exception as e:
+                print(f"[PINECONE ERROR]: {e}")
+                pinecone_error = str(e)
+
+        stored = stage("persist", self.persist, user_id, doc_id, chunks)
+
+        result = {
+            "doc_id": doc_id,
+            "chunks": stored,
+            "vectors": upserted,
+            "vectors_failed": upsert_failed,
+            "cache_hit": bool(cached),
+            "skipped_pages": skipped_pages,
+            "pinecone_error": pinecone_error,
+            "timings_ms": timings,
+        }
+        if version_of:
+            save_processed_data(user_id, doc_id, "version_info", {"version": version, "updated_at": time.time()})
+            result["version"] = version
+            result["changes"] = {
+                "added": len(changes["added"]),
+                "removed": len(changes["removed"]),
+                "unchanged": len(changes["unchanged"]),
+            }
+            result["stale_sections"] = self._mark_analysis_stale(user_id, doc_id, version, changes)
+        return result
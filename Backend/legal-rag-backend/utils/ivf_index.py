@@ -0,0 +1,126 @@
+# ivf_index.py
+import os
+
+import numpy as np
+
+from utils.vector_index import LocalVectorIndex
+
+
+class IVFIndex(LocalVectorIndex):
+    """
+    LocalVectorIndex with an inverted-file (IVF) layer for approximate search
+    over large static sets such as the rulebook. build() clusters the vectors
+    with spherical k-means. A query then scores only the rows in the
+    `nprobe` clusters whose centroids are closest to it.
+
+    Writes drop the clusters, and queries fall back to the exact scan until
+    build() runs again. Filtered queries always use the exact scan, over the
+    filtered rows only.
+    """
+
+    def __init__(self, dim: int = None, filter_fields=("user_id", "doc_id"), nprobe: int = 8):
+        super().__init__(dim=dim, filter_fields=filter_fields)
+        self.nprobe = nprobe
+        self._centroids = None
+        self._order = None      # row numbers grouped by cluster
+        self._offsets = None    # cluster c owns _order[_offsets[c]:_offsets[c + 1]]
+
+    def _invalidate(self) -> None:
+        self._centroids = self._order = self._offsets = None
+
+    def add(self, ids, vectors, metadata=None) -> int:
+        with self._lock:
+            self._invalidate()
+            return super().add(ids, vectors, metadata)
+
+    def update(self, id: str, set_metadata: dict = None, values=None, **kwargs) -> None:
+        with self._lock:
+            if values is not None:
+                self._invalidate()
+            super().update(id, set_metadata=set_metadata, values=values, **kwargs)
+
+    def delete(self, ids=None, filter=None, **kwargs) -> int:
+        with self._lock:
+            deleted = super().delete(ids=ids, filter=filter, **kwargs)
+            if deleted:
+                self._invalidate()
+            return deleted
+
+    def build(self, nlist: int = None, iterations: int = 10, seed: int = 0, block: int = 65536) -> None:
+        """Cluster the vectors into `nlist` lists (default ~4*sqrt(n)) with spherical k-means."""
+        with self._lock:
+            n = self._size
+            if n == 0:
+                return
+            data = self._matrix[:n]
+            nlist = max(1, min(nlist or int(4 * np.sqrt(n)), n))
+            rng = np.random.default_rng(seed)
+            centroids = np.array(data[rng.choice(n, nlist, replace=False)])
+
+            def assign(c):
+                out = np.empty(n, dtype=np.int64)
+                for start in range(0, n, block):
+                    out[start:start + block] = np.argmax(data[start:start + block] @ c.T, axis=1)
+                return out
+
+            for _ in range(iterations):
+                labels = assign(centroids)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, data)
+                counts = np.bincount(labels, minlength=nlist)
+                empty = counts == 0
+                if empty.any():  # reseed empty clusters from random rows
+                    sums[empty] = data[rng.choice(n, int(empty.sum()), replace=False)]
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                centroids = (sums / norms).astype("float32")
+
+            labels = assign(centroids)
+            self._centroids = centroids
+            self._order = np.argsort(labels, kind="stable")
+            self._offsets = np.searchsorted(labels[self._order], np.arange(nlist + 1))
+
+    def search(self, query, k: int = 5, filter: dict = None, nprobe: int = None):
+        with self._lock:
+            if filter or self._centroids is None:
+                return super().search(query, k, filter)
+            query = np.asarray(query, dtype="float32").ravel()
+            norm = np.linalg.norm(query)
+            if norm == 0 or k <= 0:
+                return []
+            query = query / norm
+            nprobe = min(nprobe or self.nprobe, len(self._centroids))
+            probe = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+            rows = np.concatenate([self._order[self._offsets[c]:self._offsets[c + 1]] for c in probe])
+            if len(rows) == 0:
+                return []
+            scores = self._matrix[rows] @ query
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[rows[i]], float(scores[i]), self._metadata[rows[i]]) for i in top]
+
+    def save(self, path: str) -> None:
+        with self._lock:
+            super().save(path)
+            ivf_path = os.path.join(path, "ivf.npz")
+            if self._centroids is not None:
+                with open(ivf_path + ".tmp", "wb") as f:
+                    np.savez(f, centroids=self._centroids, order=self._order, offsets=self._offsets)
+                os.replace(ivf_path + ".tmp", ivf_path)
+            elif os.path.exists(ivf_path):
+                os.remove(ivf_path)
+
+    @classmethod
+    def load(cls, path: str, nprobe: int = None) -> "IVFIndex":
+        """Load vectors (memory-mapped) and, if saved, the clusters; else build() is needed for IVF search."""
+        index = super().load(path)
+        if nprobe:
+            index.nprobe = nprobe
+        ivf_path = os.path.join(path, "ivf.npz")
+        if os.path.exists(ivf_path):
+            with np.load(ivf_path) as ivf:
+                index._centroids = ivf["centroids"]
+                index._order = ivf["order"]
+                index._offsets = ivf["offsets"]
+        return index
@@ -0,0 +1,97 @@
+# keyword_matcher.py
+import re
+from functools import lru_cache
+
+try:
+    import ahocorasick  # pyahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+# Below this many keywords a plain substring loop over the casefolded text beats the regex
+SMALL_KEYWORD_SET = 16
+
+
+def _trie_pattern(keywords) -> str:
+    """
+    Regex for a keyword trie, e.g. ["pan card", "passport"] -> "pa(?:n\\ card|ssport)".
+    Shared prefixes are matched once, so cost grows with text length rather
+    than with the number of keywords (the same idea as Aho-Corasick).
+    """
+    trie = {}
+    for kw in keywords:
+        node = trie
+        for ch in kw:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node) -> str:
+        is_end = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not is_end:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        # Greedy optional group: the longest keyword wins when one is a prefix of another
+        return group + "?" if is_end else group
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    Case-insensitive multi-keyword matcher, compiled once.
+
+    Uses an Aho-Corasick automaton (pyahocorasick) when installed. Otherwise
+    the keywords are compiled into a single trie-shaped regex, which also
+    scans the text once however many keywords there are; for a handful of
+    keywords a substring loop over the casefolded text is used instead.
+    """
+
+    def __init__(self, keywords):
+        # casefold handles non-English markers (e.g. German ß) better than lower()
+        self.keywords = tuple(dict.fromkeys(kw.casefold() for kw in keywords if kw and kw.strip()))
+        self._automaton = None
+        self._pattern = None
+        if not self.keywords:
+            return
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for kw in self.keywords:
+                self._automaton.add_word(kw, kw)
+            self._automaton.make_automaton()
+        else:
+            self._pattern = re.compile(_trie_pattern(self.keywords))
+
+    def __bool__(self) -> bool:
+        return bool(self.keywords)
+
+    def find(self, text: str):
+        """First keyword found in `text`, or None."""
+        if not self.keywords or not text:
+            return None
+        folded = text.casefold()
+        if self._automaton is not None:
+            for _, kw in self._automaton.iter(folded):
+                return kw
+            return None
+        if len(self.keywords) <= SMALL_KEYWORD_SET:
+            return next((kw for kw in self.keywords if kw in folded), None)
+        match = self._pattern.search(folded)
+        return match.group(0) if match else None
+
+
+@lru_cache(maxsize=32)
+def _compiled(keywords: tuple) -> KeywordMatcher:
+    return KeywordMatcher(keywords)
+
+
+def get_matcher(skip_keywords) -> KeywordMatcher:
+    """
+    KeywordMatcher for a keyword list, built once per distinct list and reused
+    (also inside process-pool workers). Accepts a ready matcher or None.
+    """
+    if isinstance(skip_keywords, KeywordMatcher):
+        return skip_keywords
+    return _compiled(tuple(skip_keywords or ()))
@@ -0,0 +1,209 @@
+# lexical_index.py
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+import config
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Leading clause headings as produced by the chunker: "7.", "7)", "7.2", "Clause 7", "Section 7.2",
+# "(b)", "b.", "(iv)". A bare number needs punctuation, so text like "30 days ..." is not a heading.
+_NUMBER_HEADING_RE = re.compile(
+    r"^(?:(?:clause|section|article)\s*(\d+(?:\.\d+)*)[.)]?|(\d+(?:\.\d+)+)[.)]?|(\d+)[.)])\s",
+    re.IGNORECASE,
+)
+_SUB_HEADING_RE = re.compile(r"^\(?([a-z]{1,4}|\d{1,2})\)\s|^([a-z])\.\s", re.IGNORECASE)
+
+# Exact references in a question: "clause 7(b)", "section 4.2", "7(b)" and "quoted terms"
+_CLAUSE_REF_RE = re.compile(
+    r"\b(?:clause|section|article|para(?:graph)?|sub-?clause)\s*(\d+(?:\.\d+)*)(?:\s*\(\s*(\w{1,4})\s*\))?"
+    r"|\b(\d+(?:\.\d+)*)\s*\(\s*([a-z]{1,4})\s*\)",
+    re.IGNORECASE,
+)
+_CITATION_PREFIX = r"\b(?:clause|section|article|para(?:graph)?|sub-?clause)s?\s*"
+_QUOTED_RE = re.compile(r"\"([^\"]{2,})\"|“([^”]{2,})”")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.casefold())
+
+
+def exact_references(question: str) -> dict:
+    """Clause labels like "7(b)" / "4.2" and quoted phrases found in a question."""
+    clauses = []
+    for m in _CLAUSE_REF_RE.finditer(question):
+        number, sub = (m.group(1), m.group(2)) if m.group(1) else (m.group(3), m.group(4))
+        clauses.append(f"{number}({sub.lower()})" if sub else number)
+    quoted = [(a or b).strip() for a, b in _QUOTED_RE.findall(question) if (a or b).strip()]
+    return {"clauses": list(dict.fromkeys(clauses)), "quoted": list(dict.fromkeys(quoted))}
+
+
+def clause_labels(texts: list[str]) -> list[str]:
+    """
+    Clause label of each chunk in document order, from its leading heading:
+    "7" for a "7." chunk, "7(b)" for a "(b)" chunk under it. Chunks without a
+    heading (continuations of a long clause) keep the previous label.
+    """
+    labels, number, label = [], "", ""
+    for text in texts:
+        head = text.lstrip()[:40]
+        m = _NUMBER_HEADING_RE.match(head)
+        if m:
+            number = label = m.group(1) or m.group(2) or m.group(3)
+        else:
+            m = _SUB_HEADING_RE.match(head)
+            if m and number:
+                label = f"{number}({(m.group(1) or m.group(2)).lower()})"
+        labels.append(label)
+    return labels
+
+
+def chunks_fingerprint(chunks: list) -> str:
+    """Identifies one version of a document's chunks (content hashes if stored, else the texts)."""
+    h = hashlib.sha256()
+    for c in chunks:
+        if isinstance(c, dict):
+            h.update(str(c.get("content_hash") or c.get("content", "")).encode("utf-8"))
+        else:
+            h.update(str(c).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class BM25Index:
+    """Okapi BM25 over one document's chunks, plus the clause label of each chunk."""
+
+    def __init__(self, texts: list[str], chunk_ids: list = None, k1: float = 1.5, b: float = 0.75):
+        self.texts = list(texts)
+        self.chunk_ids = list(chunk_ids) if chunk_ids is not None else list(range(len(self.texts)))
+        self.k1, self.b = k1, b
+        self.labels = clause_labels(self.texts)
+        self.positions = {cid: i for i, cid in enumerate(self.chunk_ids)}
+        self._folded = [t.casefold() for t in self.texts]
+        self.term_freqs = [Counter(tokenize(t)) for t in self.texts]
+        self.doc_lens = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_len = (sum(self.doc_lens) / len(self.doc_lens)) if self.doc_lens else 0.0
+        df = Counter(term for tf in self.term_freqs for term in tf)
+        n = len(self.texts)
+        self.idf = {term: math.log(1 + (n - d + 0.5) / (d + 0.5)) for term, d in df.items()}
+
+    def scores(self, query: str) -> list[float]:
+        terms = [t for t in tokenize(query) if t in self.idf]
+        out = []
+        for tf, length in zip(self.term_freqs, self.doc_lens):
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_len or 1))
+            out.append(sum(self.idf[t] * tf[t] * (self.k1 + 1) / (tf[t] + norm) for t in terms if t in tf))
+        return out
+
+    def search(self, query: str, k: int = 5) -> list[tuple[int, float]]:
+        """Top-k (chunk position, BM25 score) with a positive score, best first."""
+        scored = [(i, s) for i, s in enumerate(self.scores(query)) if s > 0]
+        return sorted(scored, key=lambda x: x[1], reverse=True)[:k]
+
+    def exact_matches(self, refs: dict, query: str, k: int = 5) -> list[tuple[int, float]]:
+        """
+        Chunks that match a clause reference or contain every quoted phrase. The
+        clause's own chunks (by label) come first, then chunks that cite it in
+        the text ("under clause 7(b)"); each group is ranked by BM25.
+        """
+        labelled, matched = set(), set()
+        for ref in refs.get("clauses", []):
+            # "clause 7" also covers 7(a), 7(b), ...
+            own = {i for i, label in enumerate(self.labels) if label == ref or label.startswith(ref + "(")}
+            labelled |= own
+            # A bare "30" only cites the clause after a keyword ("under clause 30"), not in "30 days"
+            prefix = r"\b" if "(" in ref else _CITATION_PREFIX + r"\b"
+            pattern = re.compile(prefix + re.escape(ref).replace(r"\(", r"\s*\(") + r"(?!\w)", re.IGNORECASE)
+            matched |= own | {i for i, text in enumerate(self.texts) if pattern.search(text)}
+        quoted = [q.casefold() for q in refs.get("quoted", [])]
+        if quoted:
+            has_quoted = {i for i, text in enumerate(self._folded) if all(q in text for q in quoted)}
+            matched = (matched & has_quoted) if refs.get("clauses") else has_quoted
+        if not matched:
+            return []
+        scores = self.scores(query)
+        return sorted(((i, scores[i]) for i in matched), key=lambda x: (x[0] not in labelled, -x[1], x[0]))[:k]
+
+    def to_dict(self) -> dict:
+        return {"texts": self.texts, "chunk_ids": self.chunk_ids, "k1": self.k1, "b": self.b}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BM25Index":
+        return cls(data["texts"], data["chunk_ids"], data.get("k1", 1.5), data.get("b", 0.75))
+
+
+def _chunk_texts_and_ids(chunks: list):
+    texts, ids = [], []
+    for i, c in enumerate(chunks):
+        if isinstance(c, dict):
+            texts.append(str(c.get("content", c.get("text", ""))))
+            ids.append(c.get("chunk_id", i))
+        else:
+            texts.append(str(c))
+            ids.append(i)
+    return texts, ids
+
+
+class LexicalIndexCache:
+    """
+    Per-document BM25 indexes keyed by (user_id, doc_id, chunks fingerprint):
+    an in-process LRU in front of JSON files under `root`. A new version of a
+    document has a different fingerprint, so its old index is never served.
+    """
+
+    def __init__(self, root: str = None, max_entries: int = None):
+        self.root = root or config.LEXICAL_INDEX_DIR
+        self.max_entries = max_entries or config.LEXICAL_INDEX_CACHE_ENTRIES
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        directory = os.path.join(self.root, key[:2])
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, key + ".json")
+
+    @staticmethod
+    def _key(user_id: str, doc_id: str, chunks: list) -> str:
+        return hashlib.sha256(f"{user_id}\0{doc_id}\0{chunks_fingerprint(chunks)}".encode()).hexdigest()
+
+    def _remember(self, key: str, index: BM25Index) -> None:
+        with self._lock:
+            self._entries[key] = index
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def build(self, user_id: str, doc_id: str, chunks: list) -> BM25Index:
+        """Build (at ingest) and store the index for this version of the document's chunks."""
+        key = self._key(user_id, doc_id, chunks)
+        index = BM25Index(*_chunk_texts_and_ids(chunks))
+        path = self._path(key)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(index.to_dict(), f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+        self._remember(key, index)
+        return index
+
+    def get(self, user_id: str, doc_id: str, chunks: list) -> BM25Index:
+        """Cached index for these chunks; loaded from disk or rebuilt if missing."""
+        key = self._key(user_id, doc_id, chunks)
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                return index
+        path = self._path(key)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                index = BM25Index.from_dict(json.load(f))
+            self._remember(key, index)
+            return index
+        return self.build(user_id, doc_id, chunks)
+
+
+lexical_indexes = LexicalIndexCache()
@@ -0,0 +1,83 @@
+# local_doc_index.py
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import config
+from utils.vector_index import LocalVectorIndex
+
+
+class LocalDocIndexStore:
+    """
+    One LocalVectorIndex per ingested document, saved under `root` at ingest
+    (vectors.f32 + index.json, see LocalVectorIndex.save) and memory-mapped
+    back on first use after a restart. At most `max_docs` documents stay
+    loaded; the least recently queried are dropped from memory, not from disk.
+    """
+
+    def __init__(self, root: str = None, max_docs: int = None):
+        self.root = root or config.LOCAL_DOC_INDEX_DIR
+        self.max_docs = max_docs or config.LOCAL_DOC_INDEX_CACHE_DOCS
+        self._entries = OrderedDict()  # (user_id, doc_id) -> LocalVectorIndex
+        self._counts = {"hits": 0, "loads": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    def _path(self, user_id: str, doc_id: str) -> str:
+        key = hashlib.sha256(f"{user_id}\0{doc_id}".encode()).hexdigest()
+        return os.path.join(self.root, key[:2], key)
+
+    def _remember(self, key: tuple, index: LocalVectorIndex) -> None:
+        with self._lock:
+            self._entries[key] = index
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_docs:
+                self._entries.popitem(last=False)
+                self._counts["evictions"] += 1
+
+    def put(self, user_id: str, doc_id: str, vectors: list[dict]) -> None:
+        """Replace the document's vectors (Pinecone-style [{"id", "values", "metadata"}]) on disk and in memory."""
+        if not vectors:
+            self.remove(user_id, doc_id)
+            return
+        index = LocalVectorIndex()
+        index.upsert(vectors=vectors)
+        index.save(self._path(user_id, doc_id))
+        self._remember((user_id, doc_id), index)
+
+    def remove(self, user_id: str, doc_id: str) -> None:
+        with self._lock:
+            self._entries.pop((user_id, doc_id), None)
+        shutil.rmtree(self._path(user_id, doc_id), ignore_errors=True)
+
+    def get(self, user_id: str, doc_id: str):
+        """The document's index, loaded from disk if needed; None if it was not stored here."""
+        key = (user_id, doc_id)
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                self._counts["hits"] += 1
+                return index
+        path = self._path(user_id, doc_id)
+        try:
+            index = LocalVectorIndex.load(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._counts["misses"] += 1
+            return None
+        except Exception as e:
+            print(f"[LOCAL INDEX] Could not load {path}: {e}")
+            with self._lock:
+                self._counts["misses"] += 1
+            return None
+        with self._lock:
+            self._counts["loads"] += 1
+        self._remember(key, index)
+        return index
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counts, "loaded_docs": len(self._entries),
+                    "loaded_vectors": sum(len(i) for i in self._entries.values())}
@@ -7,6 +7,8 @@ import re
 import tempfile
 import os
 
+from utils import clients
+
 router = APIRouter()
 analyzer = AnalyzerEngine()
 anonymizer = AnonymizerEngine()
@@ -87,12 +89,9 @@ async def mask_pdf(pdf_path: str):
 
         # ✅ Upload masked PDF to RAG GCS bucket for persistence across Cloud Run instances
         try:
-            from google.cloud import storage
-            
             rag_bucket_name = os.getenv("RAG_GCS_BUCKET_NAME")
             if rag_bucket_name:
-                storage_client = storage.Client()
-                bucket = storage_client.bucket(rag_bucket_name)
+                bucket = clients.storage_client().bucket(rag_bucket_name)
                 
                 # Upload to masked_docs/ folder in RAG bucket
                 blob_name = f"masked_docs/{os.path.basename(masked_pdf_path)}"
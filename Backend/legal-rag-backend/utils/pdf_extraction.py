@@ -1,71 +1,210 @@
 # pdf_extraction.py
-import fitz  # PyMuPDF
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 from google.cloud import documentai
 
-def _get_text(layout: documentai.Document.Page.Layout, text: str) -> str:
-    """Extract text from a Document AI layout segment."""
-    response = ""
-    for segment in layout.text_anchor.text_segments:
-        start = int(segment.start_index)
-        end = int(segment.end_index)
-        response += text[start:end]
-    return response
+import config
+from utils.document_ai_ocr import ocr_pdf_pages
+from utils.ingest_cache import page_fingerprints
+from utils.keyword_matcher import get_matcher
+from utils.pdf_source import open_pdf
+
+_process_pool = None
+_process_pool_workers = 0
+
+
+def _record_skip(skip_report, page_num: int, keyword: str) -> None:
+    """Log (and optionally collect) a page dropped for containing a skip keyword."""
+    print(f"[SKIP] page {page_num + 1}: matched '{keyword}'")
+    if skip_report is not None:
+        skip_report.append({"page": page_num + 1, "keyword": keyword})
+
+
+def _extract_page_range(source, start: int, end: int, skip_keywords=(),
+                        ocr_min_chars: int = None) -> list[tuple[int, str, str]]:
+    """
+    Extract pages [start, end) with PyMuPDF. Runs inside the process pool,
+    so empty pages are dropped and skip keywords matched here, not on the caller.
+    Returns [(page number, text, matched skip keyword or None), ...]; skipped
+    pages come back with empty text. With `ocr_min_chars` set, pages whose
+    text layer is shorter than that come back with text None so the caller
+    can OCR them instead of dropping them.
+    """
+    matcher = get_matcher(skip_keywords)
+    doc = open_pdf(source)
+    try:
+        pages = []
+        for page_num in range(start, end):
+            text = doc[page_num].get_text("text").strip()
+            # Pages without a usable text layer: hand back for OCR, or skip if empty
+            if ocr_min_chars is not None and len("".join(text.split())) < ocr_min_chars:
+                pages.append((page_num, None, None))
+                continue
+            if not text:
+                continue
+            # Skip pages containing skip_keywords
+            keyword = matcher.find(text)
+            pages.append((page_num, "" if keyword else text, keyword))
+        return pages
+    finally:
+        doc.close()
+
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """Process-wide pool for page-sharded extraction, rebuilt if the size changes."""
+    global _process_pool, _process_pool_workers
+    if _process_pool is None or _process_pool_workers != workers:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False)
+        # spawn, not fork: the parent holds gRPC clients that are not fork-safe
+        _process_pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        _process_pool_workers = workers
+    return _process_pool
+
+
+def _page_ranges(page_count: int, shards: int) -> list[tuple[int, int]]:
+    """Split [0, page_count) into at most `shards` contiguous ranges."""
+    size = -(-page_count // shards)  # ceil division
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def _extract_pymupdf(source, skip_keywords=(), workers: int = None,
+                     parallel_min_pages: int = None, ocr_min_chars: int = None) -> list[tuple[int, str, str]]:
+    """
+    PyMuPDF extraction. Small documents are read serially; documents with at
+    least `parallel_min_pages` pages are fanned out to the process pool in
+    page ranges and reassembled in page order.
+    """
+    workers = workers if workers is not None else config.PDF_EXTRACTION_WORKERS
+    if parallel_min_pages is None:
+        parallel_min_pages = config.PDF_PARALLEL_MIN_PAGES
+
+    with open_pdf(source) as doc:
+        page_count = doc.page_count
+
+    if workers <= 1 or page_count < parallel_min_pages:
+        return _extract_page_range(source, 0, page_count, skip_keywords, ocr_min_chars)
+
+    # Two ranges per worker evens out pages that are slower to parse
+    ranges = _page_ranges(page_count, workers * 2)
+    pool = _get_process_pool(workers)
+    futures = [
+        pool.submit(_extract_page_range, source, start, end, skip_keywords, ocr_min_chars)
+        for start, end in ranges
+    ]
+    print(f"[PDF EXTRACTION] {page_count} pages split into {len(ranges)} ranges across {workers} workers")
+
+    extracted_pages = []
+    for future in futures:  # submission order == page order
+        extracted_pages.extend(future.result())
+    return extracted_pages
+
+
+def _ocr_pages(documentai_client, processor_name: str, source, page_cache=None,
+               page_numbers: list[int] = None) -> dict[int, str]:
+    """
+    OCR every page (or only `page_numbers`), skipping pages whose fingerprint
+    is already in `page_cache`.
+    """
+    if page_cache is None:
+        return ocr_pdf_pages(documentai_client, processor_name, source, page_numbers=page_numbers)
+
+    page_keys = page_fingerprints(source)
+    wanted = list(range(len(page_keys))) if page_numbers is None else list(page_numbers)
+    wanted_set = set(wanted)
+    page_texts = {i: text for i, text in page_cache.get_pages(page_keys).items() if i in wanted_set}
+    missing = [i for i in wanted if i not in page_texts]
+    print(f"[INGEST CACHE] {len(page_texts)}/{len(wanted)} pages cached, OCR'ing {len(missing)}")
+
+    if missing:
+        ocr_texts = ocr_pdf_pages(documentai_client, processor_name, source, page_numbers=missing)
+        for page_num, text in ocr_texts.items():
+            page_cache.put_page(page_keys[page_num], text)
+        page_texts.update(ocr_texts)
+    return page_texts
+
 
 def extract_text_from_pdf(
     documentai_client: documentai.DocumentProcessorServiceClient,
     processor_name: str,
-    content: bytes,
+    content,
     method: str = "document_ai",
-    skip_keywords: list[str] = None
+    skip_keywords: list[str] = None,
+    workers: int = None,
+    parallel_min_pages: int = None,
+    page_cache=None,
+    skip_report: list = None,
 ) -> str:
     """
     Extract text from PDF.
 
-    method: 'document_ai' or 'pymupdf'
-    skip_keywords: list of keywords to identify pages to skip (e.g., ID proofs)
+    content: PDF bytes or a file path. Prefer a path for large files: the
+        process pool then reopens it instead of receiving a pickled copy.
+    method: 'document_ai', 'pymupdf' or 'auto' (per page: text layer if it
+        has one, Document AI for the pages that don't)
+    skip_keywords: list of keywords (or a KeywordMatcher) to identify pages
+        to skip (e.g., ID proofs); compiled once per keyword list
+    workers / parallel_min_pages: 'pymupdf' only; override
+        config.PDF_EXTRACTION_WORKERS / config.PDF_PARALLEL_MIN_PAGES
+    page_cache: 'document_ai' / 'auto'; an IngestCache. Pages seen before are
+        served from it and only the remaining pages are sent to OCR.
+    skip_report: optional list; each skipped page is appended as
+        {"page": 1-based page number, "keyword": matched keyword} for auditing.
     """
+    matcher = get_matcher(skip_keywords)
+
     if method == "pymupdf":
         # Fast path for fully electronic PDFs
-        doc = fitz.open(stream=content, filetype="pdf")
         extracted_pages = []
-
-        for page_num, page in enumerate(doc, start=1):
-            text = page.get_text("text").strip()
-            # Skip empty pages
-            if not text:
-                continue
-            # Skip pages containing skip_keywords
-            if skip_keywords and any(kw.lower() in text.lower() for kw in skip_keywords):
+        for page_num, text, keyword in _extract_pymupdf(content, matcher.keywords, workers, parallel_min_pages):
+            if keyword:
+                _record_skip(skip_report, page_num, keyword)
                 continue
             extracted_pages.append(text)
+        return "\n\n".join(extracted_pages)
 
+    elif method == "auto":
+        # Mixed PDFs: keep the text layer where there is one, OCR only the rest
+        pages = _extract_pymupdf(content, matcher.keywords, workers, parallel_min_pages,
+                                 ocr_min_chars=config.AUTO_OCR_MIN_PAGE_CHARS)
+        ocr_page_numbers = [page_num for page_num, text, _ in pages if text is None]
+        print(f"[PDF EXTRACTION] auto: {len(pages) - len(ocr_page_numbers)} text-layer pages, "
+              f"{len(ocr_page_numbers)} pages to OCR")
+
+        ocr_texts = {}
+        if ocr_page_numbers:
+            ocr_texts = _ocr_pages(documentai_client, processor_name, content, page_cache, ocr_page_numbers)
+
+        extracted_pages = []
+        for page_num, text, keyword in pages:
+            if text is None:
+                text = ocr_texts.get(page_num, "")
+                if not text.strip():
+                    continue
+                keyword = matcher.find(text)
+            if keyword:
+                _record_skip(skip_report, page_num, keyword)
+                continue
+            extracted_pages.append(text)
         return "\n\n".join(extracted_pages)
 
     elif method == "document_ai":
-        # OCR path for scanned PDFs
-        result = documentai_client.process_document(
-            request={
-                "name": processor_name,
-                "raw_document": {"content": content, "mime_type": "application/pdf"},
-            }
-        )
-        document = result.document
+        # OCR path for scanned PDFs: sharded, concurrent Document AI calls
+        page_texts = _ocr_pages(documentai_client, processor_name, content, page_cache)
         extracted_pages = []
 
-        for page in document.pages:
-            page_text_segments = []
-            # Reconstruct paragraphs
-            for paragraph in page.paragraphs:
-                text = _get_text(paragraph.layout, document.text)
-                if text.strip():
-                    page_text_segments.append(text)
-            page_text = "\n".join(page_text_segments)
-
+        for page_num in sorted(page_texts):
+            page_text = page_texts[page_num]
             # Skip empty pages
             if not page_text.strip():
                 continue
             # Skip pages containing skip_keywords
-            if skip_keywords and any(kw.lower() in page_text.lower() for kw in skip_keywords):
+            keyword = matcher.find(page_text)
+            if keyword:
+                _record_skip(skip_report, page_num, keyword)
                 continue
 
             extracted_pages.append(page_text)
@@ -73,5 +212,4 @@ def extract_text_from_pdf(
         return "\n\n".join(extracted_pages)
 
     else:
-        raise ValueError("Invalid extraction method. Use 'pymupdf' or 'document_ai'.")
-
+        raise ValueError("Invalid extraction method. Use 'pymupdf', 'document_ai' or 'auto'.")
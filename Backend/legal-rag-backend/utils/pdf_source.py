@@ -0,0 +1,12 @@
+# pdf_source.py
+import os
+
+import fitz  # PyMuPDF
+
+
+def open_pdf(source) -> fitz.Document:
+    """Open a PDF given as a file path or as bytes / a buffer (e.g. an mmap view)."""
+    if isinstance(source, (str, os.PathLike)):
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
@@ -1,18 +1,10 @@
-import os
-from pinecone import Pinecone, ServerlessSpec
 import config
+from utils import clients
 
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+pc = clients.pinecone()
 
-# Initialize or connect to RAG index
-if config.RAG_INDEX_NAME not in pc.list_indexes().names():
-    pc.create_index(
-        name=config.RAG_INDEX_NAME,
-        dimension=1536,
-        metric="cosine",
-        spec=ServerlessSpec(cloud="aws", region="us-east-1")
-    )
-rag_index = pc.Index(config.RAG_INDEX_NAME)
+# Initialize or connect to RAG index (text-embedding-004 vectors, as in app.py)
+rag_index = clients.pinecone_index(config.RAG_INDEX_NAME, dimension=768)
 
 # Connect to existing rulebook index
-rulebook_index = pc.Index(config.RULEBOOK_INDEX_NAME)
+rulebook_index = clients.pinecone_index(config.RULEBOOK_INDEX_NAME)
@@ -0,0 +1,135 @@
+# pinecone_upsert.py
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+# Rough serialized size of one float in an upsert request (JSON worst case)
+BYTES_PER_VALUE = 20
+
+
+def _vector_bytes(vector: dict) -> int:
+    return (len(vector["values"]) * BYTES_PER_VALUE + len(str(vector["id"]))
+            + len(json.dumps(vector.get("metadata") or {}, ensure_ascii=False, default=str)) + 64)
+
+
+def _as_request_vector(vector: dict) -> dict:
+    """numpy values -> plain floats, which every Pinecone SDK version accepts."""
+    values = vector["values"]
+    if hasattr(values, "tolist"):
+        vector = {**vector, "values": values.tolist()}
+    return vector
+
+
+def batch_vectors(vectors: list[dict], max_vectors: int = None, max_bytes: int = None) -> list[list[dict]]:
+    """Split vectors into consecutive batches under the per-request vector count and size limits."""
+    max_vectors = max_vectors or config.PINECONE_UPSERT_BATCH_SIZE
+    max_bytes = max_bytes or config.PINECONE_UPSERT_MAX_BYTES
+    batches, current, size = [], [], 0
+    for vector in vectors:
+        cost = _vector_bytes(vector)
+        if current and (len(current) >= max_vectors or size + cost > max_bytes):
+            batches.append(current)
+            current, size = [], 0
+        current.append(vector)
+        size += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _retryable(e: Exception) -> bool:
+    """Retry throttling, server errors and network errors; not other 4xx (bad request, auth)."""
+    status = getattr(e, "status", None) or getattr(e, "status_code", None)
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return True
+    return status == 429 or status >= 500
+
+
+def _field(obj, name, default=None):
+    """Pinecone responses are dicts or objects depending on the SDK version."""
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def call_with_retries(fn, what: str, max_retries: int = None):
+    """fn() retried with jittered exponential backoff on retryable Pinecone errors."""
+    if max_retries is None:
+        max_retries = config.PINECONE_UPSERT_MAX_RETRIES
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            attempt += 1
+            if attempt > max_retries or not _retryable(e):
+                raise
+            delay = min(2 ** attempt, 30) * (0.5 + random.random() / 2)
+            print(f"[PINECONE] {what} failed ({e.__class__.__name__}), retry {attempt}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _upsert_batch(index, batch: list[dict], max_retries: int, namespace: str = None) -> None:
+    if namespace:
+        call_with_retries(lambda: index.upsert(vectors=batch, namespace=namespace),
+                          f"Upsert batch of {len(batch)}", max_retries)
+    else:
+        call_with_retries(lambda: index.upsert(vectors=batch), f"Upsert batch of {len(batch)}", max_retries)
+
+
+def delete_vectors(index, ids: list[str], batch_size: int = 1000, max_retries: int = None) -> int:
+    """Delete vectors by id in batches (Pinecone takes at most 1000 ids per request), each retried."""
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        call_with_retries(lambda: index.delete(ids=batch), f"Delete of {len(batch)} vectors", max_retries)
+    return len(ids)
+
+
+def fetch_vectors(index, ids: list[str], batch_size: int = 100, max_retries: int = None) -> dict:
+    """{id: (values, metadata)} for the ids that exist, fetched in batches, each retried."""
+    found = {}
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        fetched = call_with_retries(lambda: index.fetch(ids=batch), f"Fetch of {len(batch)} vectors", max_retries)
+        for vec_id, vec in (_field(fetched, "vectors") or {}).items():
+            found[vec_id] = (list(_field(vec, "values")), dict(_field(vec, "metadata") or {}))
+    return found
+
+
+def upsert_vectors(index, vectors: list[dict], max_in_flight: int = None, max_retries: int = None,
+                   namespace: str = None) -> dict:
+    """
+    Upsert vectors in size-bounded batches, at most max_in_flight requests at a
+    time; each batch is retried on its own. A batch that still fails does not
+    stop the others.
+    Returns {"upserted", "failed", "batches", "failed_batches", "failed_ids", "errors"}.
+    """
+    max_in_flight = max_in_flight or config.PINECONE_UPSERT_MAX_IN_FLIGHT
+    if max_retries is None:
+        max_retries = config.PINECONE_UPSERT_MAX_RETRIES
+    report = {"upserted": 0, "failed": 0, "batches": 0, "failed_batches": 0, "failed_ids": [], "errors": []}
+    if not vectors:
+        return report
+
+    batches = batch_vectors([_as_request_vector(v) for v in vectors])
+    report["batches"] = len(batches)
+    with ThreadPoolExecutor(max_workers=min(max_in_flight, len(batches))) as pool:
+        futures = [(batch, pool.submit(_upsert_batch, index, batch, max_retries, namespace)) for batch in batches]
+        for batch, future in futures:
+            try:
+                future.result()
+                report["upserted"] += len(batch)
+            except Exception as e:
+                report["failed"] += len(batch)
+                report["failed_batches"] += 1
+                report["failed_ids"] += [v["id"] for v in batch]
+                if len(report["errors"]) < 5:
+                    report["errors"].append(f"{e.__class__.__name__}: {e}")
+    print(f"[PINECONE] Upserted {report['upserted']}/{len(vectors)} vectors in {len(batches)} batches"
+          + (f", {report['failed']} failed" if report["failed"] else ""))
+    return report
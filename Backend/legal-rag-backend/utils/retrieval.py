@@ -1,7 +1,31 @@
 # utils/retrieval.py
+import asyncio
+from dataclasses import dataclass, field
 from typing import List, Optional, Any
 import numpy as np
 
+from utils.vector_index import LocalVectorIndex
+
+
+@dataclass
+class RetrievalHit:
+    """One match from a vector index."""
+    id: str
+    score: float
+    chunk_id: Optional[int]
+    text: str
+    source: str = ""
+    metadata: dict = field(default_factory=dict, repr=False)
+
+
+@dataclass
+class RetrievalTarget:
+    """One index to search in a fan-out: top k matches, optional metadata filter and score cut-off."""
+    index: Any
+    k: int = 5
+    filter_dict: Optional[dict] = None
+    min_score: Optional[float] = None
+
 def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
     """Compute cosine similarity between two vectors."""
     denom = (np.linalg.norm(vec1) * np.linalg.norm(vec2))
@@ -9,66 +33,124 @@ def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
         return 0.0
     return float(np.dot(vec1, vec2) / denom)
 
-def retrieve_top_k(query_emb: np.ndarray, vector_store: dict, k: int = 5) -> List[str]:
+def retrieve_top_k(query_emb: np.ndarray, vector_store: LocalVectorIndex, k: int = 5,
+                   filter_dict: Optional[dict] = None) -> List[str]:
     """
-    Retrieve top-k most similar clauses from a local vector store (dict).
-    vector_store format: {idx: {"text": clause_text, "embedding": np.array}}
+    Retrieve top-k most similar clauses from a LocalVectorIndex (texts in
+    metadata["text"] / ["snippet"]). Build it once, e.g. with
+    LocalVectorIndex.from_store() for the legacy {idx: {"text", "embedding"}}
+    dict, and reuse it across queries.
     """
-    import numpy as _np
-    scores = []
-    for idx, data in vector_store.items():
-        emb = data.get("embedding")
-        if emb is None:
-            continue
-        sim = cosine_similarity(query_emb, emb)
-        scores.append((sim, data["text"]))
-    scores.sort(reverse=True, key=lambda x: x[0])
-    return [text for _, text in scores[:k]]
+    if isinstance(vector_store, dict):
+        raise TypeError("retrieve_top_k takes a LocalVectorIndex; build one once with "
+                        "LocalVectorIndex.from_store(vector_store) instead of passing the dict per query.")
+    hits = vector_store.search(query_emb, k, filter_dict)
+    return [meta.get("text") or meta.get("snippet") or "" for _, _, meta in hits]
 
-def retrieve_top_k_pinecone(query_emb: Any, pinecone_index, k: int = 5, filter_dict: Optional[dict] = None) -> List[str]:
-    """
-    Retrieve top-k texts from a Pinecone index.
-    Accepts:
+def _match_field(match, name, default=None):
+    # matches can be dicts or objects depending on the Pinecone client
+    if isinstance(match, dict):
+        return match.get(name, default)
+    return getattr(match, name, default)
 
-      - query_emb: list or numpy array embedding
-      - pinecone_index: Pinecone Index object
-      - k: top k
-      - filter_dict: optional metadata filter for Pinecone
+def _match_text(meta) -> Optional[str]:
+    # prefer snippet, then text, then any metadata field that looks useful
+    if isinstance(meta, dict):
+        return meta.get("snippet") or meta.get("text") or meta.get("content") or meta.get("chunk")
+    # if metadata is an object, try attributes
+    return getattr(meta, "snippet", None) or getattr(meta, "text", None)
 
-    Returns a list of textual snippets (fallback order: snippet -> text -> metadata fields).
+def query_index(query_emb: Any, index, k: int = 5, filter_dict: Optional[dict] = None,
+                source: str = "") -> List[RetrievalHit]:
+    """
+    Top-k matches from a Pinecone index (or anything with the same .query, e.g.
+    LocalVectorIndex) as RetrievalHits, best first. Matches without text are dropped.
     """
     # convert numpy arrays to lists
     if hasattr(query_emb, "tolist"):
         query_emb = query_emb.tolist()
 
     # Newer Pinecone SDK uses 'filter' param name. Some wrappers use filter_dict. Use filter.
-    response = pinecone_index.query(
+    response = index.query(
         vector=query_emb,
         top_k=k,
         include_metadata=True,
         filter=filter_dict or {}
     )
-
     # response can be dict-like or object with .matches depending on Pinecone client
-    matches = []
-    if isinstance(response, dict):
-        matches = response.get("matches", [])
-    else:
-        # object returned (older/newer SDKs). attempt to read attribute
-        matches = getattr(response, "matches", []) or []
-
-    top_texts = []
+    matches = _match_field(response, "matches", []) or []
+
+    hits = []
     for m in matches:
-        meta = m.get("metadata") if isinstance(m, dict) else getattr(m, "metadata", None)
-        if not meta:
+        meta = _match_field(m, "metadata")
+        text = _match_text(meta) if meta else None
+        if not text:
             continue
-        # prefer snippet, then text, then any metadata field that looks useful
-        text_candidate = None
-        if isinstance(meta, dict):
-            text_candidate = meta.get("snippet") or meta.get("text") or meta.get("content") or meta.get("chunk")
-        else:
-            # if metadata is an object, try attributes
-            text_candidate = getattr(meta, "snippet", None) or getattr(meta, "text", None)
-        if text_candidate:
-            top_texts.append(text_candidate)
-    return top_texts
+        meta = dict(meta) if isinstance(meta, dict) else {}
+        chunk_id = meta.get("chunk_id")
+        hits.append(RetrievalHit(
+            id=_match_field(m, "id"),
+            score=float(_match_field(m, "score", 0.0) or 0.0),
+            chunk_id=int(chunk_id) if isinstance(chunk_id, (int, float)) else chunk_id,
+            text=text,
+            source=source,
+            metadata=meta,
+        ))
+    return hits
+
+def retrieve_top_k_pinecone(query_emb: Any, pinecone_index, k: int = 5, filter_dict: Optional[dict] = None) -> List[str]:
+    """
+    Retrieve top-k texts from a Pinecone index.
+    Accepts:
+
+      - query_emb: list or numpy array embedding
+      - pinecone_index: Pinecone Index object
+      - k: top k
+      - filter_dict: optional metadata filter for Pinecone
+
+    Returns a list of textual snippets (fallback order: snippet -> text -> metadata fields).
+    Use query_index() for ids and scores.
+    """
+    return [hit.text for hit in query_index(query_emb, pinecone_index, k, filter_dict)]
+
+async def fan_out_retrieval(query_embs: list, targets: dict) -> dict:
+    """
+    Search every target index with every query vector, all at once (each lookup
+    in its own thread), so latency is the slowest lookup rather than the sum.
+    `targets` maps a name to a RetrievalTarget; targets whose index is None are
+    skipped. With several query vectors, hits are merged per target by id
+    (best score kept).
+    Returns {name: [RetrievalHit, ...]} with at most target.k hits, best first.
+    """
+    jobs = [
+        (name, target, asyncio.to_thread(query_index, emb, target.index, target.k, target.filter_dict, name))
+        for name, target in targets.items() if target.index is not None
+        for emb in query_embs
+    ]
+    results = await asyncio.gather(*(job for _, _, job in jobs))
+
+    merged = {name: {} for name in targets}
+    for (name, target, _), hits in zip(jobs, results):
+        best = merged[name]
+        for hit in hits:
+            if target.min_score is not None and hit.score < target.min_score:
+                continue
+            if hit.id not in best or hit.score > best[hit.id].score:
+                best[hit.id] = hit
+    return {
+        name: sorted(merged[name].values(), key=lambda h: h.score, reverse=True)[:target.k]
+        for name, target in targets.items()
+    }
+
+def reciprocal_rank_fusion(rankings: List[list], k: int = 60, limit: Optional[int] = None) -> List[tuple]:
+    """
+    Fuse several best-first rankings of keys (e.g. chunk ids from vector and
+    BM25 search): each key scores sum(1 / (k + rank)) over the rankings it is in.
+    Returns [(key, fused_score), ...], best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+    ordered = sorted(fused.items(), key=lambda x: x[1], reverse=True)
+    return ordered[:limit] if limit is not None else ordered
@@ -0,0 +1,212 @@
+# rulebook_mirror.py
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+import config
+from utils.ivf_index import IVFIndex
+from utils.pinecone_upsert import _field
+from utils.vector_index import LocalVectorIndex
+
+
+def export_pinecone_index(pinecone_index, batch_size: int = 100):
+    """Yield (id, values, metadata) for every vector in a Pinecone serverless index."""
+    for ids in pinecone_index.list():
+        ids = list(ids)
+        for start in range(0, len(ids), batch_size):
+            fetched = pinecone_index.fetch(ids=ids[start:start + batch_size])
+            for vec_id, vec in (_field(fetched, "vectors") or {}).items():
+                yield vec_id, _field(vec, "values"), dict(_field(vec, "metadata") or {})
+
+
+def snapshot_rulebook(pinecone_index, path: str = None, nlist: int = None, index_name: str = None) -> dict:
+    """
+    Copy every rulebook vector and its metadata from Pinecone into an IVFIndex
+    under `path`. The snapshot is written next to the live one and swapped in
+    at the end, so a running API never sees a half-written snapshot.
+    """
+    path = path or config.RULEBOOK_MIRROR_DIR
+    start = time.perf_counter()
+    ids, vectors, metadata = [], [], []
+    for vec_id, values, meta in export_pinecone_index(pinecone_index):
+        ids.append(vec_id)
+        vectors.append(values)
+        metadata.append(meta)
+    if not ids:
+        raise ValueError("Rulebook index returned no vectors; refusing to write an empty snapshot.")
+
+    index = IVFIndex(filter_fields=())
+    index.add(ids, np.asarray(vectors, dtype="float32"), metadata)
+    index.build(nlist=nlist)
+
+    staging = path.rstrip("/\\") + ".new"
+    shutil.rmtree(staging, ignore_errors=True)
+    index.save(staging)
+    info = {
+        "index_name": index_name or config.RULEBOOK_INDEX_NAME,
+        "vectors": len(index),
+        "dim": index.dim,
+        "nlist": int(len(index._centroids)),
+        "created_at": time.time(),
+        "export_seconds": round(time.perf_counter() - start, 1),
+    }
+    with open(os.path.join(staging, "snapshot.json"), "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+
+    old = path.rstrip("/\\") + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(staging, path)
+    shutil.rmtree(old, ignore_errors=True)
+    print(f"[RULEBOOK MIRROR] Snapshot of {info['vectors']} vectors written to {path}")
+    return info
+
+
+def recall_at_k(local_index, reference_index, queries, k: int = 5) -> dict:
+    """
+    Mean recall@k of local_index against reference_index (e.g. the Pinecone
+    rulebook): the fraction of the reference's top-k ids the local index returns.
+    """
+    recalls = []
+    local_ms = []
+    for query in queries:
+        expected = {_field(m, "id") for m in _field(reference_index.query(
+            vector=np.asarray(query).tolist(), top_k=k, include_metadata=False), "matches") or []}
+        if not expected:
+            continue
+        start = time.perf_counter()
+        got = {_field(m, "id") for m in local_index.query(vector=query, top_k=k)["matches"]}
+        local_ms.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(expected & got) / len(expected))
+    return {
+        "queries": len(recalls),
+        "k": k,
+        "recall": round(float(np.mean(recalls)), 4) if recalls else None,
+        "min_recall": round(float(np.min(recalls)), 4) if recalls else None,
+        "local_p50_ms": round(float(np.percentile(local_ms, 50)), 3) if local_ms else None,
+    }
+
+
+class ExactScan:
+    """A local index searched exhaustively (its IVF layer, if any, bypassed), as a recall reference."""
+
+    def __init__(self, index: LocalVectorIndex):
+        self.index = index
+
+    def query(self, vector, top_k=5, **_):
+        hits = LocalVectorIndex.search(self.index, vector, top_k)
+        return {"matches": [{"id": vec_id} for vec_id, _, _ in hits]}
+
+
+def sample_queries(index: LocalVectorIndex, n: int, noise: float = 0.02, seed: int = 0) -> np.ndarray:
+    """Stored rulebook vectors plus gaussian noise, as stand-ins for real query embeddings."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(index), min(n, len(index)), replace=False)
+    queries = np.asarray(index._matrix[rows]) + rng.normal(0, noise, (len(rows), index.dim)).astype("float32")
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def load_mirror_index(path: str, nprobe: int = None, min_recall: float = None, k: int = 10):
+    """
+    (index, search info) for a snapshot. With nprobe <= 0 the snapshot is
+    served by exact scan. Otherwise the IVF layer is used only if its recall@k
+    against the exact scan reaches min_recall.
+    """
+    nprobe = config.RULEBOOK_MIRROR_NPROBE if nprobe is None else nprobe
+    min_recall = config.RULEBOOK_MIRROR_MIN_RECALL if min_recall is None else min_recall
+    if nprobe <= 0:
+        return LocalVectorIndex.load(path), {"search": "exact"}
+    index = IVFIndex.load(path, nprobe=nprobe)
+    if index._centroids is None:
+        return index, {"search": "exact", "reason": "snapshot has no IVF clusters"}
+    queries = sample_queries(index, config.RULEBOOK_MIRROR_RECALL_QUERIES)
+    report = recall_at_k(index, ExactScan(index), queries, k=k)
+    if report["recall"] is None or report["recall"] < min_recall:
+        print(f"[RULEBOOK MIRROR] IVF recall@{k} {report['recall']} (nprobe={nprobe}) is below "
+              f"{min_recall}; serving exact scan")
+        return LocalVectorIndex.load(path), {"search": "exact", "ivf_recall": report}
+    return index, {"search": "ivf", "nprobe": nprobe, "ivf_recall": report}
+
+
+class RulebookMirror:
+    """
+    The loaded rulebook snapshot, searched as load_mirror_index() decides.
+    `index` is None until a snapshot exists. get() checks for a refresh (a new
+    snapshot.json) at most every `check_interval` seconds and loads it in a
+    background thread; callers keep getting the current snapshot until the new
+    one is swapped in, so a reload never blocks a request.
+    """
+
+    def __init__(self, path: str = None, check_interval: float = 60.0):
+        self.path = path or config.RULEBOOK_MIRROR_DIR
+        self.check_interval = check_interval
+        self._current = (None, None)  # (index, info), replaced as a whole
+        self._loaded_mtime = None
+        self._next_check = 0.0
+        self._reloading = False
+        self._lock = threading.Lock()
+        self.reload_if_changed(force=True)
+
+    @property
+    def index(self):
+        return self._current[0]
+
+    @property
+    def info(self):
+        return self._current[1]
+
+    def _snapshot_mtime(self):
+        try:
+            return os.path.getmtime(os.path.join(self.path, "snapshot.json"))
+        except OSError:
+            return None
+
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """Load the snapshot now if it changed (blocking); True when a new one was swapped in."""
+        with self._lock:
+            self._next_check = time.monotonic() + self.check_interval
+            mtime = self._snapshot_mtime()
+            if mtime is None or mtime == self._loaded_mtime and not force:
+                return False
+        try:
+            index, search = load_mirror_index(self.path)
+            with open(os.path.join(self.path, "snapshot.json"), encoding="utf-8") as f:
+                info = json.load(f)
+            info.update(search)
+        except Exception as e:
+            print(f"[RULEBOOK MIRROR] Could not load snapshot from {self.path}: {e}")
+            return False
+        with self._lock:
+            self._current, self._loaded_mtime = (index, info), mtime
+        print(f"[RULEBOOK MIRROR] Loaded {len(index)} rulebook vectors from {self.path} ({search['search']} search)")
+        return True
+
+    def _reload_in_background(self) -> None:
+        try:
+            self.reload_if_changed()
+        finally:
+            with self._lock:
+                self._reloading = False
+
+    def current(self) -> tuple:
+        """
+        (index, info) of the snapshot being served, or (None, None). Starts a
+        background reload when a check is due; never waits for one.
+        """
+        with self._lock:
+            if not self._reloading and time.monotonic() >= self._next_check:
+                self._next_check = time.monotonic() + self.check_interval
+                if self._snapshot_mtime() != self._loaded_mtime:
+                    self._reloading = True
+                    threading.Thread(target=self._reload_in_background, name="rulebook-mirror-reload",
+                                     daemon=True).start()
+            return self._current
+
+    def get(self):
+        """The local rulebook index, or None if no snapshot is available."""
+        return self.current()[0]
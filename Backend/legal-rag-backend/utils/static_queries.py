@@ -0,0 +1,81 @@
+# static_queries.py
+import asyncio
+import threading
+import time
+
+import config
+from utils.embeddings import embed_texts_batch
+from utils.retrieval import query_index
+
+
+class StaticQueryRegistry:
+    """
+    Fixed retrieval queries (e.g. /summarize's "Identify key legal terms")
+    against the rulebook. Each query is embedded once; its top-k results are
+    kept in memory per rulebook version and recomputed only when the version
+    changes (a new mirror snapshot) or, for indexes that cannot report a
+    version, after ttl seconds.
+    """
+
+    def __init__(self, embed_fn=embed_texts_batch, ttl: float = None):
+        self.embed_fn = embed_fn
+        self.ttl = config.STATIC_QUERY_TTL_SECONDS if ttl is None else ttl
+        self._queries = {}      # name -> (text, k)
+        self._embeddings = {}   # name -> vector
+        self._results = {}      # name -> (version, computed_at, [RetrievalHit])
+        self._locks = {}
+        self._counts = {"hits": 0, "misses": 0}
+        self._stats_lock = threading.Lock()
+
+    def register(self, name: str, text: str, k: int = 5) -> None:
+        self._queries[name] = (text, k)
+        self._embeddings.pop(name, None)
+        self._results.pop(name, None)
+        self._locks.setdefault(name, asyncio.Lock())
+
+    def _fresh(self, name: str, version) -> bool:
+        entry = self._results.get(name)
+        if entry is None or entry[0] != version:
+            return False
+        return not self.ttl or time.monotonic() - entry[1] < self.ttl
+
+    async def get(self, name: str, index, version) -> list:
+        """Top-k RetrievalHits of a registered query; [] when index is None."""
+        if index is None:
+            return []
+        if self._fresh(name, version):
+            with self._stats_lock:
+                self._counts["hits"] += 1
+            return self._results[name][2]
+        async with self._locks[name]:
+            if not self._fresh(name, version):  # another request may have refreshed it meanwhile
+                text, k = self._queries[name]
+                if name not in self._embeddings:
+                    self._embeddings[name] = (await asyncio.to_thread(self.embed_fn, [text]))[0]
+                hits = await asyncio.to_thread(query_index, self._embeddings[name], index, k, None, "rulebook")
+                self._results[name] = (version, time.monotonic(), hits)
+                with self._stats_lock:
+                    self._counts["misses"] += 1
+                print(f"[STATIC QUERY] {name}: {len(hits)} rulebook hits cached (version {version})")
+                return hits
+        with self._stats_lock:
+            self._counts["hits"] += 1
+        return self._results[name][2]
+
+    async def warm(self, index, version) -> None:
+        """Compute every registered query up front (e.g. at startup); failures are retried on first use."""
+        for name in self._queries:
+            try:
+                await self.get(name, index, version)
+            except Exception as e:
+                print(f"[STATIC QUERY] Could not warm {name}: {e}")
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            counts = dict(self._counts)
+        counts["queries"] = len(self._queries)
+        counts["versions"] = {name: entry[0] for name, entry in self._results.items()}
+        return counts
+
+
+static_queries = StaticQueryRegistry()
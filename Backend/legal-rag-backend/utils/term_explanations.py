@@ -0,0 +1,56 @@
+# term_explanations.py
+import threading
+from collections import OrderedDict
+
+import config
+
+
+def normalize_term(term: str) -> str:
+    """Case- and whitespace-insensitive form of a key term, shared by callers and the cache key."""
+    return " ".join(str(term).casefold().split())
+
+
+def _key(term: str, version, top_k: int) -> tuple:
+    return (normalize_term(term), version, top_k)
+
+
+class TermExplanationCache:
+    """
+    LRU of /view-rulebook-source explanations keyed by (term, rulebook version,
+    top_k). Terms are compared case- and whitespace-insensitively, so the same
+    key term from another document is answered without any Vertex/Gemini call.
+    A new rulebook snapshot changes the version, so older entries stop matching
+    and age out.
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries or config.TERM_EXPLANATION_CACHE_ENTRIES
+        self._entries = OrderedDict()
+        self._counts = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    def get(self, term: str, version, top_k: int):
+        key = _key(term, version, top_k)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._counts["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counts["hits"] += 1
+            return value
+
+    def put(self, term: str, version, top_k: int, explanation: dict) -> None:
+        key = _key(term, version, top_k)
+        with self._lock:
+            self._entries[key] = explanation
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counts, "entries": len(self._entries)}
+
+
+term_explanations = TermExplanationCache()
@@ -0,0 +1,49 @@
+# tokens.py
+import math
+import re
+
+import config
+
+# Pieces a SentencePiece-style tokenizer (Gemini, text-embedding-004) splits
+# legal text into, counted in one C-level regex scan: a sub-word per 8 letters,
+# one token per digit, per symbol and per line break / whitespace run.
+_PIECE_RE = re.compile(r"[^\W\d_]{1,8}|\d|[^\w\s]|_|\n|\s{2,}")
+
+
+def estimate_tokens(text: str, scale: float = None) -> int:
+    """
+    Fast local token estimate for `text`, no API call.
+    `scale` (default config.TOKEN_ESTIMATE_SCALE) corrects the raw estimate;
+    calibrate it against real counts with bench_token_estimator.py.
+    """
+    if not text:
+        return 0
+    raw = len(_PIECE_RE.findall(text))
+    return max(1, math.ceil(raw * (scale or config.TOKEN_ESTIMATE_SCALE)))
+
+
+def chunk_tokens(chunk) -> int:
+    """Token count of a stored chunk: the recorded 'token_count' if present, else estimated."""
+    if isinstance(chunk, dict):
+        if chunk.get("token_count") is not None:
+            return int(chunk["token_count"])
+        return estimate_tokens(str(chunk.get("content", chunk.get("text", ""))))
+    return estimate_tokens(str(chunk))
+
+
+def pack_chunks(chunks: list, texts: list[str], budget_tokens: int,
+                separator: str = "\n\n") -> tuple[str, int, int]:
+    """
+    Join chunk texts in order until the next one would exceed `budget_tokens`.
+    `chunks` are the stored chunks (for their recorded token counts) and
+    `texts` their contents. Returns (packed text, chunks used, tokens used).
+    """
+    sep_tokens = estimate_tokens(separator)
+    used, tokens = 0, 0
+    for chunk in chunks:
+        cost = chunk_tokens(chunk) + (sep_tokens if used else 0)
+        if tokens + cost > budget_tokens:
+            break
+        tokens += cost
+        used += 1
+    return separator.join(texts[:used]), used, tokens
@@ -0,0 +1,57 @@
+# upload_stream.py
+import os
+import hashlib
+from dataclasses import dataclass
+
+from fastapi import HTTPException, UploadFile
+
+import config
+
+
+@dataclass
+class SpooledUpload:
+    """An upload that has been streamed to disk; consumers open it by path."""
+    path: str
+    sha256: str
+    size: int
+
+
+async def spool_upload(
+    upload: UploadFile,
+    dest_path: str,
+    max_bytes: int = None,
+    chunk_size: int = None,
+) -> SpooledUpload:
+    """
+    Stream `upload` to `dest_path` in fixed-size chunks, hashing as it goes.
+    Raises 413 as soon as the upload passes `max_bytes`; nothing partial is left behind.
+    """
+    max_bytes = max_bytes or config.MAX_UPLOAD_BYTES
+    chunk_size = chunk_size or config.UPLOAD_CHUNK_SIZE
+
+    # Starlette knows the size up front for most multipart uploads
+    if upload.size is not None and upload.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File too large. Limit is {max_bytes} bytes.")
+
+    digest = hashlib.sha256()
+    size = 0
+    part_path = f"{dest_path}.part"
+    try:
+        with open(part_path, "wb") as out:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"File too large. Limit is {max_bytes} bytes.")
+                digest.update(chunk)
+                out.write(chunk)
+        os.replace(part_path, dest_path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    return SpooledUpload(path=dest_path, sha256=digest.hexdigest(), size=size)
+
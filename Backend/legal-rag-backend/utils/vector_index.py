@@ -0,0 +1,239 @@
+# vector_index.py
+import json
+import os
+import threading
+
+import numpy as np
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _filter_values(condition) -> set:
+    """Pinecone-style condition -> accepted values: "x", {"$eq": "x"} or {"$in": [...]}."""
+    if isinstance(condition, dict):
+        if "$eq" in condition:
+            return {condition["$eq"]}
+        if "$in" in condition:
+            return set(condition["$in"])
+        raise ValueError(f"Unsupported filter condition: {condition}")
+    return {condition}
+
+
+class LocalVectorIndex:
+    """
+    In-process cosine-similarity index over a contiguous float32 matrix of
+    pre-normalized vectors. A query is one matmul plus np.argpartition.
+
+    Rows are found by id, and metadata fields listed in `filter_fields` are
+    indexed so that a filter like {"user_id": ..., "doc_id": ...} only scores
+    the matching rows. The upsert / delete / update / query methods take the
+    same arguments as a Pinecone Index, so it can stand in for one (e.g. in
+    retrieve_top_k_pinecone). save() / load() persist it; load() memory-maps
+    the vectors.
+    """
+
+    def __init__(self, dim: int = None, filter_fields=("user_id", "doc_id")):
+        self.dim = dim
+        self.filter_fields = tuple(filter_fields)
+        self._matrix = np.zeros((0, dim or 0), dtype="float32")
+        self._size = 0                      # rows in use (deleted rows are compacted away)
+        self._ids = []
+        self._metadata = []
+        self._rows = {}                     # id -> row
+        self._postings = {}                 # (field, value) -> set of rows
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self._size
+
+    # --- writes ---
+
+    def _grow(self, needed: int) -> None:
+        if needed <= self._matrix.shape[0]:
+            return
+        capacity = max(needed, 2 * self._matrix.shape[0], 64)
+        matrix = np.zeros((capacity, self.dim), dtype="float32")
+        matrix[:self._size] = self._matrix[:self._size]
+        self._matrix = matrix
+
+    def _index_row(self, row: int, metadata: dict, add: bool) -> None:
+        for field in self.filter_fields:
+            if field in metadata:
+                rows = self._postings.setdefault((field, metadata[field]), set())
+                if add:
+                    rows.add(row)
+                else:
+                    rows.discard(row)
+
+    def add(self, ids: list[str], vectors, metadata: list[dict] = None) -> int:
+        """Insert or replace vectors by id. Vectors are normalized on the way in."""
+        if not ids:
+            return 0
+        matrix = _normalize(np.asarray(vectors, dtype="float32").reshape(len(ids), -1))
+        metadata = metadata or [{} for _ in ids]
+        with self._lock:
+            if self.dim is None or self._size == 0 and self._matrix.shape[1] != matrix.shape[1]:
+                self.dim = matrix.shape[1]
+                self._matrix = np.zeros((0, self.dim), dtype="float32")
+            if matrix.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {matrix.shape[1]} does not match index dimension {self.dim}")
+            self._grow(self._size + len(ids))
+            for vec_id, vec, meta in zip(ids, matrix, metadata):
+                meta = dict(meta or {})
+                row = self._rows.get(vec_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._ids.append(vec_id)
+                    self._metadata.append(meta)
+                    self._rows[vec_id] = row
+                else:
+                    self._index_row(row, self._metadata[row], add=False)
+                    self._metadata[row] = meta
+                self._matrix[row] = vec
+                self._index_row(row, meta, add=True)
+        return len(ids)
+
+    def upsert(self, vectors: list[dict], **_) -> dict:
+        """Pinecone-style upsert of [{"id", "values", "metadata"}]."""
+        count = self.add([v["id"] for v in vectors], [v["values"] for v in vectors],
+                         [v.get("metadata") or {} for v in vectors])
+        return {"upserted_count": count}
+
+    def update(self, id: str, set_metadata: dict = None, values=None, **_) -> None:
+        with self._lock:
+            row = self._rows.get(id)
+            if row is None:
+                return
+            if values is not None:
+                self._matrix[row] = _normalize(np.asarray(values, dtype="float32").reshape(1, -1))[0]
+            if set_metadata:
+                self._index_row(row, self._metadata[row], add=False)
+                self._metadata[row] = {**self._metadata[row], **set_metadata}
+                self._index_row(row, self._metadata[row], add=True)
+
+    def delete(self, ids: list[str] = None, filter: dict = None, **_) -> int:
+        """Delete by ids and/or metadata filter. Remaining rows are compacted. Returns rows deleted."""
+        with self._lock:
+            doomed = {self._rows[i] for i in ids or () if i in self._rows}
+            if filter:
+                doomed |= set(self._filter_rows(filter).tolist())
+            if not doomed:
+                return 0
+            mask = np.ones(self._size, dtype=bool)
+            mask[list(doomed)] = False
+            keep = np.flatnonzero(mask)
+            self._matrix = np.ascontiguousarray(self._matrix[keep])
+            self._ids = [self._ids[r] for r in keep]
+            self._metadata = [self._metadata[r] for r in keep]
+            self._size = len(keep)
+            self._reindex()
+            return len(doomed)
+
+    def _reindex(self) -> None:
+        self._rows = {vec_id: row for row, vec_id in enumerate(self._ids)}
+        self._postings = {}
+        for row, meta in enumerate(self._metadata):
+            self._index_row(row, meta, add=True)
+
+    # --- reads ---
+
+    def _filter_rows(self, filter: dict) -> np.ndarray:
+        """Rows matching every condition in `filter` (indexed fields use postings, others a scan)."""
+        indexed, scanned = [], []
+        for field, condition in filter.items():
+            values = _filter_values(condition)
+            if field in self.filter_fields:
+                postings = [self._postings.get((field, v), set()) for v in values]
+                indexed.append(postings[0] if len(postings) == 1 else set().union(*postings))
+            else:
+                scanned.append((field, values))
+        if indexed:
+            # Intersect starting from the most selective posting list; the shared sets are not copied
+            indexed.sort(key=len)
+            rows = indexed[0].intersection(*indexed[1:]) if len(indexed) > 1 else indexed[0]
+        else:
+            rows = range(self._size)
+        for field, values in scanned:
+            rows = [r for r in rows if self._metadata[r].get(field) in values]
+        return np.fromiter(sorted(rows), dtype=np.int64)
+
+    def search(self, query, k: int = 5, filter: dict = None) -> list[tuple[str, float, dict]]:
+        """Top-k (id, score, metadata) by cosine similarity, best first."""
+        query = np.asarray(query, dtype="float32").ravel()
+        norm = np.linalg.norm(query)
+        if norm == 0 or k <= 0:
+            return []
+        query = query / norm
+        with self._lock:
+            if self._size == 0:
+                return []
+            if filter:
+                rows = self._filter_rows(filter)
+                if len(rows) == 0:
+                    return []
+                scores = self._matrix[rows] @ query
+            else:
+                rows = np.arange(self._size)
+                scores = self._matrix[:self._size] @ query
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[rows[i]], float(scores[i]), self._metadata[rows[i]]) for i in top]
+
+    def query(self, vector, top_k: int = 5, filter: dict = None, include_metadata: bool = True, **_) -> dict:
+        """Pinecone-style query: {"matches": [{"id", "score", "metadata"}]}."""
+        matches = [
+            {"id": vec_id, "score": score, **({"metadata": meta} if include_metadata else {})}
+            for vec_id, score, meta in self.search(vector, top_k, filter or None)
+        ]
+        return {"matches": matches}
+
+    # --- persistence ---
+
+    def save(self, path: str) -> None:
+        """Write vectors.f32 (raw float32 rows) and index.json (dim, ids, metadata) under `path`."""
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            vectors_path = os.path.join(path, "vectors.f32")
+            if self._size:
+                out = np.memmap(vectors_path + ".tmp", dtype="float32", mode="w+", shape=(self._size, self.dim))
+                out[:] = self._matrix[:self._size]
+                out.flush()
+                del out
+            else:
+                open(vectors_path + ".tmp", "wb").close()
+            with open(os.path.join(path, "index.json.tmp"), "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim, "filter_fields": list(self.filter_fields),
+                           "ids": self._ids, "metadata": self._metadata}, f)
+            os.replace(vectors_path + ".tmp", vectors_path)
+            os.replace(os.path.join(path, "index.json.tmp"), os.path.join(path, "index.json"))
+
+    @classmethod
+    def load(cls, path: str) -> "LocalVectorIndex":
+        """Load an index written by save(). The vectors stay memory-mapped until the next write."""
+        with open(os.path.join(path, "index.json"), encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(dim=data["dim"], filter_fields=data["filter_fields"])
+        index._ids = data["ids"]
+        index._metadata = data["metadata"]
+        index._size = len(index._ids)
+        if index._size:
+            index._matrix = np.memmap(os.path.join(path, "vectors.f32"), dtype="float32", mode="c",
+                                      shape=(index._size, index.dim))
+        index._reindex()
+        return index
+
+    @classmethod
+    def from_store(cls, vector_store: dict) -> "LocalVectorIndex":
+        """Build from the legacy {idx: {"text": ..., "embedding": ...}} dict."""
+        index = cls(filter_fields=())
+        items = [(str(k), v) for k, v in vector_store.items() if v.get("embedding") is not None]
+        if items:
+            index.add([k for k, _ in items], [v["embedding"] for _, v in items],
+                      [{"text": v.get("text")} for _, v in items])
+        return index